@@ -1,13 +1,18 @@
 # app/streamlit_app.py
+import hashlib
 import io
 import os
-import json
-from typing import List, Dict, Any
+import time
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-from medlex.pipeline import build_variant_bank, process_text
+from medlex.bankcache import load_variant_bank
+from medlex.batch import BatchResult, process_batch
+
+# notes per chunk between progress updates
+CHUNK_ROWS = 5_000
 
 st.set_page_config(page_title="MedLex Spotter", page_icon="🩺", layout="wide")
 st.title("🩺 MedLex Spotter")
@@ -33,20 +38,21 @@ run_btn = st.sidebar.button("Run extraction", type="primary")
 
 
 # --- Helpers -----------------------------------------------------------------
-def _read_notes(upload) -> pd.DataFrame:
+def _read_notes(upload, nrows=None) -> pd.DataFrame:
     """Read CSV/TSV with columns note_id,text."""
     if upload is None:
         raise ValueError("No file uploaded.")
     name = upload.name.lower()
     sep = "\t" if name.endswith(".tsv") else ","
+    upload.seek(0)
     try:
-        df = pd.read_csv(upload, sep=sep)
+        df = pd.read_csv(upload, sep=sep, nrows=nrows)
     except Exception:
         # Fallback: sniff delimiter
         upload.seek(0)
         txt = upload.read()
         upload.seek(0)
-        df = pd.read_csv(io.BytesIO(txt), sep=None, engine="python")
+        df = pd.read_csv(io.BytesIO(txt), sep=None, engine="python", nrows=nrows)
 
     # Normalize columns
     cols = {c.strip().lower(): c for c in df.columns}
@@ -56,30 +62,62 @@ def _read_notes(upload) -> pd.DataFrame:
     return df
 
 
-def _resolve_cfg_path(upload) -> str:
-    """Return a filesystem path for the YAML: uploaded temp file or repo default."""
+def _cfg_bytes(upload) -> bytes:
+    """YAML content: the uploaded file or the repo default."""
     if upload is None:
         default_path = os.path.join("configs", "example_targets.yaml")
         if not os.path.exists(default_path):
             raise FileNotFoundError(
                 "Default config 'configs/example_targets.yaml' not found. Upload a YAML in the sidebar."
             )
-        return default_path
+        with open(default_path, "rb") as f:
+            return f.read()
+    return bytes(upload.getbuffer())
+
+
+def _inputs_key(notes, cfg) -> tuple:
+    """The sidebar inputs a result is computed from: notes upload and YAML content."""
+    try:
+        cfg_hash = hashlib.sha256(_cfg_bytes(cfg)).hexdigest()
+    except OSError:
+        cfg_hash = None
+    return (None if notes is None else notes.file_id, cfg_hash)
+
 
-    # Persist upload to a temp file on disk for the pipeline
+@st.cache_resource(show_spinner="Compiling targets…", max_entries=8)
+def _load_bank(cfg: bytes):
+    """Compiled bank for this YAML content, built once per server process."""
+    # Content-addressed file for the pipeline, so two uploads never share a path
     tmp_dir = ".streamlit_tmp"
     os.makedirs(tmp_dir, exist_ok=True)
-    path = os.path.join(tmp_dir, upload.name)
+    path = os.path.join(tmp_dir, f"targets-{hashlib.sha256(cfg).hexdigest()[:16]}.yaml")
     with open(path, "wb") as f:
-        f.write(upload.getbuffer())
-    return path
+        f.write(cfg)
+    return load_variant_bank(path)
+
+
+def _process(df: pd.DataFrame, banks) -> BatchResult:
+    """All notes in chunks of CHUNK_ROWS, with a progress bar and rate readout."""
+    n = len(df)
+    bar = st.progress(0.0, text=f"0 / {n:,} notes")
+    texts = df["text"]
+    parts = []
+    t0 = time.perf_counter()
+    for start in range(0, n, CHUNK_ROWS):
+        chunk = [str(t) for t in texts.iloc[start : start + CHUNK_ROWS].tolist()]
+        parts.append(process_batch(chunk, *banks))
+        done = min(n, start + CHUNK_ROWS)
+        rate = done / max(time.perf_counter() - t0, 1e-9)
+        bar.progress(done / n, text=f"{done:,} / {n:,} notes · {rate:,.0f} notes/s")
+    bar.empty()
+    return BatchResult.concat(parts) if parts else process_batch([], *banks)
 
 
 # --- UI: preview --------------------------------------------------------------
 with st.expander("Preview data (first 20 rows)", expanded=True):
     if notes_file is not None:
         try:
-            df_preview = _read_notes(notes_file).head(20)
+            df_preview = _read_notes(notes_file, nrows=20)
             st.dataframe(df_preview, width="stretch")
         except Exception as e:
             st.error(f"Could not read notes file: {e}")
@@ -94,10 +132,9 @@ if run_btn:
         st.error("Please upload a notes file first.")
         st.stop()
 
-    # Load config / build banks
+    # Load config / build banks (cached across runs and sessions by YAML content)
     try:
-        cfg_path = _resolve_cfg_path(cfg_file)
-        ctx, bank, ph_bank, fz = build_variant_bank(cfg_path)
+        banks = _load_bank(_cfg_bytes(cfg_file))
     except Exception as e:
         st.error(f"Config error: {e}")
         st.stop()
@@ -109,79 +146,64 @@ if run_btn:
         st.error(f"Could not read notes file: {e}")
         st.stop()
 
-    # First pass: run the pipeline, collect raw results
-    items: List[Dict[str, Any]] = []
-    flag_keys = set()
-
-    with st.status("Processing notes…", expanded=False) as status:
-        for _, r in df.iterrows():
-            note_id = int(r["note_id"])
-            text = str(r["text"])
+    # Columnar results only: flags arrays + a long spans table, no per-row JSON.
+    # Kept in the session so downloads and other reruns do not reprocess.
+    res = _process(df, banks)
+    note_ids = df["note_id"].astype("int64").to_numpy()
+    st.session_state["medlex"] = (_inputs_key(notes_file, cfg_file), res, note_ids)
+    del df
 
-            res = process_text(text, ctx, bank, ph_bank, fz)
-            items.append({"note_id": note_id, "res": res})
+# a result from another notes file or YAML is dropped, not shown or offered
+if "medlex" in st.session_state:
+    if st.session_state["medlex"][0] != _inputs_key(notes_file, cfg_file):
+        del st.session_state["medlex"]
 
-            # Discover has_* keys from actual output (robust to any config variations)
-            for k in res.keys():
-                if k.startswith("has_"):
-                    flag_keys.add(k)
-
-        status.update(label="Done ✅", state="complete")
+if "medlex" in st.session_state:
+    _, res, note_ids = st.session_state["medlex"]
+    # rows keyed by note_id in both tables; context is sliced from the notes
+    # only when asked for
+    flags_df, spans_df = res.to_pandas(index=note_ids, context=False)
 
     # Stable, sorted list of flag columns
-    flag_cols = sorted(flag_keys)
-
-    # Second pass: build uniform rows with all flags + JSON spans
-    out_rows: List[Dict[str, Any]] = []
-    for it in items:
-        res = it["res"]
-        row = {"note_id": it["note_id"]}
-        for col in flag_cols:
-            row[col] = int(res.get(col, 0))
-        row["spans"] = json.dumps(res.get("spans", []), ensure_ascii=False)
-        out_rows.append(row)
+    flag_cols = sorted(res.flags)
 
-    df_out = pd.DataFrame(out_rows).sort_values("note_id").reset_index(drop=True)
+    df_out = flags_df[flag_cols].rename_axis("note_id").reset_index()
+    # spans per note, by row position (note_ids need not be unique)
+    df_out["n_spans"] = np.bincount(
+        np.asarray(res.spans["row"], dtype=np.int64), minlength=res.n_rows
+    )
+    df_out = df_out.sort_values("note_id", kind="stable").reset_index(drop=True)
 
     st.subheader("Results")
-    if flag_cols:
-        st.dataframe(df_out, width="stretch")
-    else:
+    if not flag_cols:
         st.warning(
             "No `has_*` flags were produced by the pipeline. "
             "Check your YAML targets and a sample note to ensure matches are possible."
         )
-        st.dataframe(df_out[["note_id", "spans"]], width="stretch")
+    st.dataframe(df_out, width="stretch")
 
     # Expanded spans (optional)
+    if st.checkbox("Include context (text around each span) in the spans table and CSV"):
+        spans_df.insert(spans_df.columns.get_loc("end") + 1, "context", res.spans["context"])
     with st.expander("Show extracted spans (expanded table)"):
-        expanded = []
-        for r in out_rows:
-            try:
-                spans = json.loads(r.get("spans", "[]"))
-                for s in spans:
-                    expanded.append(
-                        {
-                            "note_id": r["note_id"],
-                            "matched": s.get("matched"),
-                            "span": s.get("span"),
-                            "context": s.get("context"),
-                            "source": s.get("source"),
-                            "is_negated": s.get("is_negated"),
-                        }
-                    )
-            except Exception:
-                pass
-        if expanded:
-            st.dataframe(pd.DataFrame(expanded), width="stretch")
+        if len(spans_df):
+            cols = [c for c in ("row", "matched", "start", "end", "context") if c in spans_df]
+            cols += ["source", "is_negated", "stage"]
+            st.dataframe(spans_df[cols].rename(columns={"row": "note_id"}), width="stretch")
         else:
             st.info("No spans to display.")
 
     # Download
-    csv_bytes = df_out.to_csv(index=False).encode("utf-8")
-    st.download_button(
-        "Download results CSV",
-        data=csv_bytes,
-        file_name="medlex_spotter_results.csv",
+    left, right = st.columns(2)
+    left.download_button(
+        "Download flags CSV",
+        data=df_out.to_csv(index=False).encode("utf-8"),
+        file_name="medlex_spotter_flags.csv",
+        mime="text/csv",
+    )
+    right.download_button(
+        "Download spans CSV (one row per span)",
+        data=spans_df.rename(columns={"row": "note_id"}).to_csv(index=False).encode("utf-8"),
+        file_name="medlex_spotter_spans.csv",
         mime="text/csv",
     )
@@ -0,0 +1,69 @@
+"""
+Import time of ``medlex.cli`` and the modules that make it up.
+
+Each run is a fresh interpreter under ``python -X importtime``; the script
+reports the median total over ``--runs``, the slowest modules one level
+below the top (what ``medlex.cli`` itself imports) and any heavy dependency
+(pandas, numpy, yaml, rapidfuzz, metaphone) that the bare import pulled in. Run
+``python -m compileall -q src`` first if bytecode writing is disabled,
+otherwise compiling the sources dominates.
+
+    python benchmarks/bench_import.py --runs 7 --top 15
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+HEAVY = ("pandas", "numpy", "yaml", "rapidfuzz", "metaphone")
+
+
+def _importtime(module: str):
+    """({module: cumulative µs} one level down, total µs, heavy packages loaded) for one run."""
+    probe = f"import sys, {module}; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, cumulative = 0, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line[len("import time:") :].split("|")
+        cum, name = cum.strip(), name[1:]  # keep the indentation after the separator
+        if not cum.isdigit():
+            continue  # the column header
+        # nesting is two spaces per level and cumulative times include the
+        # children: the total is the top level, the breakdown one level below
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            total += int(cum)
+        elif depth == 1:
+            name = name.strip()
+            cumulative[name] = cumulative.get(name, 0) + int(cum)
+    return cumulative, total, proc.stdout.split()
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--module", default="medlex.cli")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=10)
+    a = p.parse_args()
+
+    totals = []
+    for _ in range(a.runs):
+        cumulative, total, heavy = _importtime(a.module)
+        totals.append(total)
+    print(f"import {a.module}: median {statistics.median(totals) / 1000:.1f} ms over {a.runs} runs")
+    print(f"heavy dependencies loaded: {', '.join(heavy) or 'none'}")
+    print(f"{'ms':>8}  module")
+    for name, us in sorted(cumulative.items(), key=lambda kv: -kv[1])[: a.top]:
+        print(f"{us / 1000:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
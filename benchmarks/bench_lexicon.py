@@ -0,0 +1,84 @@
+"""
+Bank build time, matcher memory and scan throughput as the lexicon grows.
+
+Targets come from ``synth.scale_targets`` (three terms each) with the fuzzy and
+phonetic stages switched off, so only exact term matching is measured. Each
+size is run with the matcher ``TermBank`` picks (``TermIndex`` above
+``TERM_INDEX_MIN_TERMS`` terms) and with the other one forced for comparison
+(the prefix-factored regex only up to ``--regex-max`` terms).
+
+    python benchmarks/bench_lexicon.py --terms 1000 10000 100000 --notes 20000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from medlex import pipeline
+from medlex.pipeline import _note_hits, build_variant_bank
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synth  # noqa: E402
+
+
+def _build(path: str):
+    """(banks, seconds, MB retained by the build)."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    banks = build_variant_bank(path)
+    secs = time.perf_counter() - t0
+    mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    return banks, secs, mb
+
+
+def _rate(notes, ctx, bank) -> float:
+    # the scan itself: per-note output (one has_* flag per target) is not timed
+    t0 = time.perf_counter()
+    for text in notes:
+        _note_hits(text, ctx, bank)
+    return len(notes) / (time.perf_counter() - t0)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--terms", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    p.add_argument("--notes", type=int, default=20_000)
+    p.add_argument("--regex-max", type=int, default=10_000)
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+
+    print(f"{'terms':>8} {'matcher':>10} {'build s':>8} {'bank MB':>8} {'notes/s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in a.terms:
+            cfg = synth.scale_targets(max(1, n // 3), seed=a.seed)
+            for t in cfg["targets"]:
+                t.pop("fuzzy", None)
+                t.pop("generate_phonetic", None)
+            path = synth.write_config(cfg, os.path.join(tmp, f"lexicon_{n}.yaml"))
+            notes = synth.make_notes(a.notes, cfg["targets"], seed=a.seed)
+
+            # None: the default switch-over; 0 forces TermIndex, maxsize the regex
+            runs = [None]
+            if n <= pipeline.TERM_INDEX_MIN_TERMS:
+                runs.append(0)
+            elif n <= a.regex_max:
+                runs.append(sys.maxsize)
+            for limit in runs:
+                default = pipeline.TERM_INDEX_MIN_TERMS
+                if limit is not None:
+                    pipeline.TERM_INDEX_MIN_TERMS = limit
+                try:
+                    (ctx, bank, _, _), secs, mb = _build(path)
+                finally:
+                    pipeline.TERM_INDEX_MIN_TERMS = default
+                kind = type(bank.matcher).__name__
+                rate = _rate(notes, ctx, bank)
+                print(f"{len(bank.term_canon):>8} {kind:>10} {secs:>8.2f} {mb:>8.1f} {rate:>9,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Throughput of ``process_text`` as the number of targets grows.
+
+Compares the single-pass combined matcher (``TermBank``) with the old
+one-scan-per-target loop (same patterns passed as a plain dict).
+
+    python benchmarks/bench_targets.py --notes 2000 --targets 2 10 100 1000
+"""
+
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+
+import yaml
+
+from medlex.pipeline import build_variant_bank, process_text
+
+FILLER = (
+    "patient seen in clinic today bp stable follow up in three months "
+    "continue diet and exercise labs reviewed with family no acute distress"
+).split()
+
+
+def _fake_name(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 11)))
+
+
+def _write_targets(n: int, rng: random.Random, path: str) -> list:
+    targets = [
+        {"canonical": "METFORMIN", "terms": ["metformin", "metfornin", "glucophage"]},
+        {"canonical": "INSULIN", "terms": ["insulin", "lantus", "humalog"]},
+    ]
+    while len(targets) < n:
+        base = _fake_name(rng)
+        targets.append({"canonical": f"DRUG{len(targets)}", "terms": [base, base + "e", base[:-1]]})
+    with open(path, "w", encoding="utf-8") as fh:
+        yaml.safe_dump({"targets": targets[:n]}, fh)
+    return targets[:n]
+
+
+def _make_notes(n: int, targets: list, rng: random.Random) -> list:
+    notes = []
+    for _ in range(n):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(20, 60))]
+        for _ in range(rng.randint(0, 2)):
+            t = rng.choice(targets)
+            words.insert(rng.randrange(len(words)), rng.choice(t["terms"]))
+            words.insert(rng.randrange(len(words)), f"{rng.choice([5, 10, 500])} mg")
+        notes.append(" ".join(words))
+    return notes
+
+
+def _rate(notes, ctx, bank, ph_bank, fz) -> float:
+    t0 = time.perf_counter()
+    for text in notes:
+        process_text(text, ctx, bank, ph_bank, fz)
+    return len(notes) / (time.perf_counter() - t0)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--notes", type=int, default=2000)
+    p.add_argument("--targets", type=int, nargs="+", default=[2, 10, 100, 1000])
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+
+    rng = random.Random(a.seed)
+    print(f"{'targets':>8} {'single-pass notes/s':>20} {'per-target notes/s':>20} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in a.targets:
+            path = os.path.join(tmp, f"targets_{n}.yaml")
+            targets = _write_targets(n, rng, path)
+            notes = _make_notes(a.notes, targets, rng)
+            ctx, bank, ph_bank, fz = build_variant_bank(path)
+            single = _rate(notes, ctx, bank, ph_bank, fz)
+            legacy = _rate(notes, ctx, dict(bank), ph_bank, fz)
+            print(f"{n:>8} {single:>20,.0f} {legacy:>20,.0f} {single / legacy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Scaling of ``WorkerPool`` (the CLI's --workers) from 1 to N processes.
+
+Reports wall time, speedup over the in-process serial run and parallel
+efficiency (speedup / workers). Pool start-up, including each worker's bank
+build, is excluded by warming the pool first.
+
+    python benchmarks/bench_workers.py --notes 200000 --workers 1 2 4 8 16 32
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from medlex.batch import process_batch
+from medlex.parallel import WorkerPool
+from medlex.pipeline import build_variant_bank
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synth  # noqa: E402
+
+CFG = synth.BASE_CFG
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--notes", type=int, default=100_000)
+    p.add_argument("--workers", type=int, nargs="+", default=None)
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args()
+
+    ncpu = os.cpu_count() or 1
+    workers = a.workers or sorted({1, 2, 4, 8, 16, 32, ncpu} & set(range(1, ncpu + 1)))
+    notes = synth.make_notes(a.notes, seed=a.seed)
+
+    ctx, bank, ph_bank, fz = build_variant_bank(CFG)
+    process_batch(notes[:10], ctx, bank, ph_bank, fz)  # warm, like the pool below
+    t0 = time.perf_counter()
+    serial = process_batch(notes, ctx, bank, ph_bank, fz)
+    t_serial = time.perf_counter() - t0
+    print(f"{a.notes:,} notes, {ncpu} CPUs; serial: {t_serial:.2f}s")
+    print(f"{'workers':>8} {'seconds':>9} {'notes/s':>10} {'speedup':>8} {'efficiency':>11}")
+
+    for w in workers:
+        with WorkerPool(CFG, w) as pool:
+            pool.process(notes[: w * 10])  # warm: start processes, build banks
+            t0 = time.perf_counter()
+            res = pool.process(notes)
+            dt = time.perf_counter() - t0
+        assert res.flags == serial.flags and res.spans == serial.spans
+        speedup = t_serial / dt
+        print(f"{w:>8} {dt:>9.2f} {a.notes / dt:>10,.0f} {speedup:>7.2f}x {speedup / w:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
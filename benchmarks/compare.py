@@ -0,0 +1,52 @@
+"""
+Compare two benchmarks/run.py result files.
+
+    python benchmarks/compare.py base.json new.json --tolerance 0.10
+
+Prints throughput / p99 latency / peak RSS changes per case and exits with
+status 1 if any case regressed by more than the tolerance.
+"""
+
+import argparse
+import json
+import sys
+from typing import Tuple
+
+
+def _load(path: str) -> Tuple[dict, dict]:
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    return {(r["notes"], r["targets"]): r for r in data["results"]}, data.get("meta", {})
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("base")
+    p.add_argument("new")
+    p.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    a = p.parse_args()
+
+    base, base_meta = _load(a.base)
+    new, new_meta = _load(a.new)
+    print(f"base: {base_meta.get('commit')}  new: {new_meta.get('commit')}")
+    print(f"{'notes':>9} {'targets':>7} {'notes/s':>16} {'p99 ms':>16} {'rss MB':>14}")
+
+    regressed = False
+    for key in sorted(base.keys() & new.keys()):
+        b, n = base[key], new[key]
+        d_rate = n["notes_per_sec"] / b["notes_per_sec"] - 1 if b["notes_per_sec"] else 0.0
+        bp99, np99 = b["latency_ms"]["p99"], n["latency_ms"]["p99"]
+        d_p99 = np99 / bp99 - 1 if bp99 else 0.0
+        d_rss = n["peak_rss_mb"] / b["peak_rss_mb"] - 1 if b["peak_rss_mb"] else 0.0
+        bad = d_rate < -a.tolerance or d_p99 > a.tolerance or d_rss > a.tolerance
+        regressed |= bad
+        print(
+            f"{key[0]:>9,} {key[1]:>7,} {n['notes_per_sec']:>9,.0f} ({d_rate:+.0%})"
+            f" {np99:>9.3f} ({d_p99:+.0%}) {n['peak_rss_mb']:>7.0f} ({d_rss:+.0%})"
+            + ("  REGRESSION" if bad else "")
+        )
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
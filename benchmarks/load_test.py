@@ -0,0 +1,143 @@
+"""
+Load test for ``medlex serve``.
+
+Opens ``--clients`` keep-alive connections and sends ``--requests`` POST
+/extract calls in total (``--notes-per-request`` synthetic notes each, see
+benchmarks/synth.py), then reports throughput, client-side latency and the
+server's own /metrics (mean micro-batch size).
+
+    python -m medlex.cli serve --targets configs/example_targets.yaml --workers 4 &
+    python benchmarks/load_test.py --clients 64 --requests 20000
+
+``--spawn`` starts (and stops) a server itself.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import synth  # noqa: E402
+
+
+class Client:
+    def __init__(self, host, port, unix):
+        self.host, self.port, self.unix = host, port, unix
+        self.reader = self.writer = None
+
+    async def connect(self):
+        if self.unix:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.unix)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.writer.write(
+            b"%s %s HTTP/1.1\r\nHost: medlex\r\nContent-Length: %d\r\n\r\n"
+            % (method.encode(), path.encode(), len(body))
+            + body
+        )
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            k, _, v = line.decode().partition(":")
+            if k.lower() == "content-length":
+                length = int(v)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+
+def _pct(vals, q):
+    return vals[min(len(vals) - 1, int(q * (len(vals) - 1)))] if vals else 0.0
+
+
+async def run(a):
+    notes = synth.make_notes(max(1000, a.notes_per_request * 100), seed=a.seed)
+    queue = asyncio.Queue()
+    for i in range(a.requests):
+        queue.put_nowait(i)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        c = Client(a.host, a.port, a.unix)
+        await c.connect()
+        try:
+            while not queue.empty():
+                i = queue.get_nowait()
+                k = (i * a.notes_per_request) % (len(notes) - a.notes_per_request)
+                t0 = time.perf_counter()
+                status, _ = await c.request(
+                    "POST", "/extract", {"texts": notes[k : k + a.notes_per_request]}
+                )
+                latencies.append((time.perf_counter() - t0) * 1000)
+                errors += status != 200
+        finally:
+            c.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(a.clients)))
+    dt = time.perf_counter() - t0
+
+    c = Client(a.host, a.port, a.unix)
+    await c.connect()
+    _, metrics = await c.request("GET", "/metrics")
+    c.close()
+
+    latencies.sort()
+    n_notes = a.requests * a.notes_per_request
+    print(f"{a.requests:,} requests ({n_notes:,} notes) from {a.clients} clients in {dt:.2f}s")
+    print(f"  {a.requests / dt:,.0f} req/s, {n_notes / dt:,.0f} notes/s, {errors} errors")
+    print(
+        f"  latency ms: p50={_pct(latencies, 0.5):.2f} p90={_pct(latencies, 0.9):.2f}"
+        f" p99={_pct(latencies, 0.99):.2f} max={latencies[-1]:.2f}"
+    )
+    print(
+        f"  server: mean batch {metrics['mean_batch_notes']:.1f} notes, {metrics['batches']:,} batches"
+    )
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--unix", default=None)
+    p.add_argument("--clients", type=int, default=32)
+    p.add_argument("--requests", type=int, default=5_000)
+    p.add_argument("--notes-per-request", type=int, default=1)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--spawn", metavar="TARGETS_YAML", help="Start a server for the run")
+    p.add_argument("--workers", type=int, default=1, help="Server workers (with --spawn)")
+    a = p.parse_args()
+
+    server = None
+    if a.spawn:
+        cmd = [sys.executable, "-m", "medlex.cli", "serve", "--targets", a.spawn]
+        cmd += ["--port", str(a.port), "--workers", str(a.workers)]
+        if a.unix:
+            cmd += ["--unix", a.unix]
+        server = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        server.stdout.readline()  # "medlex serve: ..." once listening
+    try:
+        asyncio.run(run(a))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
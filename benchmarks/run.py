@@ -0,0 +1,172 @@
+"""
+medlex benchmark suite.
+
+For each (notes, targets) combination, runs the CLI's pipeline over seeded
+synthetic notes (benchmarks/synth.py) in a fresh process and records
+throughput, per-note latency, peak RSS and per-stage time. Results are written
+as JSON so runs from different commits can be compared with
+benchmarks/compare.py.
+
+    python benchmarks/run.py --sizes 1000 100000 1000000 --targets 2 100 --out bench.json
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import synth  # noqa: E402
+
+
+def _percentile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_one(size: int, n_targets: int, seed: int, chunk: int, latency_sample: int) -> dict:
+    """One measurement, in this process: call it in a fresh interpreter."""
+    import pandas as pd
+
+    from medlex.batch import process_batch
+    from medlex.pipeline import build_variant_bank, process_text
+
+    stages = dict.fromkeys(["bank", "generate", "parse", "match", "serialize", "frame"], 0.0)
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = synth.scale_targets(n_targets, seed=seed)
+        path = synth.write_config(cfg, os.path.join(tmp, "targets.yaml"))
+        t0 = time.perf_counter()
+        ctx, bank, ph_bank, fz = build_variant_bank(path)
+        stages["bank"] = time.perf_counter() - t0
+
+    notes = synth.iter_notes(size, cfg["targets"], seed=seed)
+    stride = max(1, size // latency_sample)
+    latencies = []
+    n_spans = n_chars = done = 0
+    while done < size:
+        t0 = time.perf_counter()
+        texts = [next(notes) for _ in range(min(chunk, size - done))]
+        src = pd.DataFrame({"note_id": range(done, done + len(texts)), "text": texts})
+        buf = src.to_csv(sep="\t", index=False)
+        stages["generate"] += time.perf_counter() - t0
+
+        # same steps as the CLI: parse -> match -> serialize spans -> build output frame
+        t0 = time.perf_counter()
+        df = pd.read_csv(io.StringIO(buf), sep="\t")
+        t1 = time.perf_counter()
+        res = process_batch([str(t) for t in df["text"].tolist()], ctx, bank, ph_bank, fz)
+        t2 = time.perf_counter()
+        spans_json = res.spans_json()
+        t3 = time.perf_counter()
+        out = pd.DataFrame({"note_id": df["note_id"].to_numpy()})
+        for k, col in res.flags.items():
+            out[k] = pd.Series(col, dtype="int8")
+        out["spans"] = spans_json
+        t4 = time.perf_counter()
+        stages["parse"] += t1 - t0
+        stages["match"] += t2 - t1
+        stages["serialize"] += t3 - t2
+        stages["frame"] += t4 - t3
+
+        for text in texts[::stride]:
+            s = time.perf_counter_ns()
+            process_text(text, ctx, bank, ph_bank, fz)
+            latencies.append((time.perf_counter_ns() - s) / 1e6)
+        n_spans += len(res.spans["row"])
+        n_chars += sum(map(len, texts))
+        done += len(texts)
+
+    latencies.sort()
+    pipeline_s = stages["parse"] + stages["match"] + stages["serialize"] + stages["frame"]
+    return {
+        "notes": size,
+        "targets": n_targets,
+        "notes_per_sec": size / pipeline_s if pipeline_s else 0.0,
+        "match_notes_per_sec": size / stages["match"] if stages["match"] else 0.0,
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.50),
+            "p99": _percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+            "sampled": len(latencies),
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages_s": stages,
+        "spans": n_spans,
+        "mean_note_chars": n_chars / size if size else 0.0,
+    }
+
+
+def _meta(seed: int) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description="medlex benchmark suite")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    p.add_argument("--targets", type=int, nargs="+", default=[2])
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--chunk", type=int, default=10_000, help="Notes per batch (as --chunksize)")
+    p.add_argument("--latency-sample", type=int, default=20_000, help="Notes timed one by one")
+    p.add_argument("--out", default="bench_results.json", help="JSON results file")
+    p.add_argument("--one", action="store_true", help=argparse.SUPPRESS)
+    a = p.parse_args()
+
+    if a.one:
+        rec = run_one(a.sizes[0], a.targets[0], a.seed, a.chunk, a.latency_sample)
+        print(json.dumps(rec))
+        return
+
+    results = []
+    for n_targets in a.targets:
+        for size in a.sizes:
+            # fresh interpreter per case so peak RSS belongs to that case alone
+            cmd = [sys.executable, __file__, "--one", "--sizes", str(size)]
+            cmd += ["--targets", str(n_targets), "--seed", str(a.seed), "--chunk", str(a.chunk)]
+            cmd += ["--latency-sample", str(a.latency_sample)]
+            proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            rec = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(rec)
+            print(
+                f"notes={size:>9,} targets={n_targets:>6,}  {rec['notes_per_sec']:>9,.0f} notes/s"
+                f"  p50={rec['latency_ms']['p50']:.3f}ms p99={rec['latency_ms']['p99']:.3f}ms"
+                f"  rss={rec['peak_rss_mb']:.0f}MB",
+                flush=True,
+            )
+
+    with open(a.out, "w", encoding="utf-8") as fh:
+        json.dump({"meta": _meta(a.seed), "results": results}, fh, indent=2)
+    print(f"wrote {a.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Seeded synthetic clinical-note generator for benchmarks.
+
+Notes mix clinical filler with target mentions the way real notes do:
+correct spellings, typos, abbreviations (``met``, ``ins.``), brand names,
+doses and forms, negations ("no insulin", "stopped metformin") and the
+"met with family" trap. Lengths are log-normal (most notes short, a long tail
+of long ones). Same seed, same notes.
+"""
+
+import math
+import random
+import string
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import yaml
+
+# the repo's example targets, wherever the benchmarks are run from
+BASE_CFG = str(Path(__file__).resolve().parents[1] / "configs" / "example_targets.yaml")
+
+FILLER = [
+    "Patient seen in clinic today for routine follow up.",
+    "BP 132/84, HR 76, afebrile.",
+    "Reports good adherence to diet and exercise.",
+    "A1c 7.9 last month, down from 8.4.",
+    "Met with family to discuss results and next steps.",
+    "No acute distress; lungs clear to auscultation.",
+    "Denies chest pain, shortness of breath or palpitations.",
+    "Labs reviewed with patient; lipid panel within range.",
+    "Plan to recheck fasting glucose in three months.",
+    "Foot exam normal, monofilament sensation intact.",
+    "Counselled on hypoglycemia symptoms and sick-day rules.",
+    "Instructions given, patient verbalized understanding.",
+    "Follow up with ophthalmology for retinal screening.",
+    "Weight stable at 92 kg; BMI 31.",
+]
+NEGATIONS = ["no {t}", "stopped {t}", "denies {t} use", "discontinued {t}", "not on {t}"]
+MENTIONS = [
+    "Started {t} {d} {u} {f} daily.",
+    "Continue {t} {d} {u} with breakfast.",
+    "On {t} {d} {u} bid.",
+    "{t} {d}{u} {f} nightly.",
+    "Will initiate {t} {f} {d} {u} qhs.",
+    "Taking {t} as prescribed.",
+]
+DOSES = ["5", "10", "20", "500", "750", "850", "1000"]
+UNITS = ["mg", "units", "u", "iu"]
+FORMS = ["tab", "tablet", "pen", "inj", "xr", "vial", ""]
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    """One random edit (substitute, drop, duplicate, swap) inside the word."""
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    op = rng.randrange(4)
+    if op == 0:
+        return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1 :]
+    if op == 1:
+        return word[:i] + word[i + 1 :]
+    if op == 2:
+        return word[:i] + word[i] + word[i:]
+    return word[: i - 1] + word[i] + word[i - 1] + word[i + 1 :]
+
+
+def load_targets(path: str = BASE_CFG) -> List[dict]:
+    with open(path, encoding="utf-8") as fh:
+        return yaml.safe_load(fh)["targets"]
+
+
+def scale_targets(n: int, seed: int = 0, base: str = BASE_CFG) -> dict:
+    """
+    Config with ``n`` targets: the base YAML's targets first, then synthetic
+    drugs (a made-up name plus a couple of variants each).
+    """
+    with open(base, encoding="utf-8") as fh:
+        cfg = yaml.safe_load(fh)
+    rng = random.Random(seed)
+    targets = list(cfg["targets"])[:n]
+    names = set()
+    while len(targets) < n:
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 11)))
+        if name in names:
+            continue
+        names.add(name)
+        brand = name[:4] + rng.choice(["ex", "ol", "ine", "ra"])
+        targets.append(
+            {
+                "canonical": f"DRUG{len(targets):05d}",
+                "terms": [name, name + "e", brand],
+                "fuzzy": 88,
+                "generate_phonetic": rng.random() < 0.5,
+            }
+        )
+    cfg["targets"] = targets
+    return cfg
+
+
+def write_config(cfg: dict, path: str) -> str:
+    with open(path, "w", encoding="utf-8") as fh:
+        yaml.safe_dump(cfg, fh, sort_keys=False)
+    return path
+
+
+def iter_notes(
+    n: int,
+    targets: Optional[List[dict]] = None,
+    seed: int = 0,
+    mention_rate: float = 0.35,
+    mean_sentences: float = 6.0,
+) -> Iterator[str]:
+    """
+    Yield ``n`` notes. About ``mention_rate`` of them mention a target; of
+    those mentions ~20% are negated, ~15% misspelled and ~10% abbreviated.
+    """
+    targets = targets or load_targets()
+    rng = random.Random(seed)
+    sigma = 0.8
+    mu = math.log(mean_sentences) - sigma**2 / 2  # so the mean is mean_sentences
+    for _ in range(n):
+        k = max(1, int(rng.lognormvariate(mu, sigma)))
+        sentences = [rng.choice(FILLER) for _ in range(k)]
+        if rng.random() < mention_rate:
+            t = rng.choice(targets)
+            term = rng.choice(t["terms"])
+            r = rng.random()
+            if r < 0.15:
+                term = _typo(term, rng)
+            elif r < 0.25:
+                term = rng.choice(["met", "metf.", "ins.", "ins"])
+            if rng.random() < 0.2:
+                mention = rng.choice(NEGATIONS).format(t=term).capitalize() + "."
+            else:
+                mention = rng.choice(MENTIONS).format(
+                    t=term, d=rng.choice(DOSES), u=rng.choice(UNITS), f=rng.choice(FORMS)
+                )
+            sentences.insert(rng.randrange(len(sentences) + 1), mention)
+        yield " ".join(sentences)
+
+
+def make_notes(n: int, targets: Optional[List[dict]] = None, seed: int = 0) -> List[str]:
+    return list(iter_notes(n, targets, seed))
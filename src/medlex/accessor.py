@@ -0,0 +1,42 @@
+# src/medlex/accessor.py
+"""
+pandas accessor: ``import medlex.accessor`` once, then
+
+    flags, spans = df.medlex.spot("text", targets="configs/example_targets.yaml")
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from .batch import process_batch
+from .pipeline import build_variant_bank
+
+
+@pd.api.extensions.register_dataframe_accessor("medlex")
+class MedlexAccessor:
+    def __init__(self, df: pd.DataFrame):
+        self._df = df
+
+    def spot(
+        self, column: str = "text", targets: Optional[str] = None, bank: Optional[Tuple] = None
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Spot targets in ``df[column]``.
+
+        Pass either ``targets`` (YAML path) or ``bank`` (the tuple returned by
+        ``build_variant_bank``). Returns (flags, spans): flags is aligned with
+        ``df.index`` (one int8 column per has_* flag); spans is a long table whose
+        ``row`` column holds the ``df.index`` label of each span's note.
+        """
+        if column not in self._df.columns:
+            raise KeyError(f"Column not found: {column}")
+        if bank is None:
+            if targets is None:
+                raise ValueError("Pass either 'targets' (YAML path) or 'bank'.")
+            bank = build_variant_bank(targets)
+        ctx, terms, ph_bank, fz = bank
+        res = process_batch(self._df[column].tolist(), ctx, terms, ph_bank, fz)
+        return res.to_pandas(index=self._df.index)
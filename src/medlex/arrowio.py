@@ -0,0 +1,225 @@
+# src/medlex/arrowio.py
+"""
+Parquet / Arrow IPC input and output. Needs the optional ``pyarrow`` dependency
+(``pip install 'medlex-spotter[arrow]'``).
+
+Output layout, one row per note:
+  note_id  int64
+  has_*    int8, one column per target
+  spans    list<struct<matched, start, end, context, source, is_negated,
+           stage, context_score>>, in the same order as the JSON spans of the CSV output
+
+Readers can select columns (e.g. only the flags) without touching the spans,
+and Arrow files are memory-mapped, so nothing is re-parsed.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import tempfile
+from typing import Iterator, List, Optional, Sequence
+
+FORMATS = ("csv", "parquet", "arrow")
+_EXTENSIONS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+INPUT_COLUMNS = ("note_id", "text")
+
+
+def _pa():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(
+            "Parquet/Arrow I/O needs pyarrow: pip install 'medlex-spotter[arrow]'"
+        ) from e
+    return pyarrow
+
+
+def detect_format(path: Optional[str]) -> str:
+    """'parquet' / 'arrow' from the file extension, else 'csv' (also for stdout)."""
+    if not path or path == "-":
+        return "csv"
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def span_type():
+    pa = _pa()
+    return pa.struct(
+        [
+            ("matched", pa.string()),
+            ("start", pa.int64()),
+            ("end", pa.int64()),
+            ("context", pa.string()),
+            ("source", pa.string()),
+            ("is_negated", pa.bool_()),
+            ("stage", pa.string()),
+            ("context_score", pa.int32()),
+        ]
+    )
+
+
+def output_schema(flag_keys: Sequence[str]):
+    pa = _pa()
+    fields = [("note_id", pa.int64())] + [(k, pa.int8()) for k in flag_keys]
+    return pa.schema(fields + [("spans", pa.list_(span_type()))])
+
+
+def to_arrow(res, note_ids=None):
+    """
+    ``BatchResult`` -> ``pyarrow.Table`` in the layout above. Flag columns are
+    wrapped without copying; ``note_ids`` defaults to the row numbers.
+    """
+    pa = _pa()
+    import numpy as np
+
+    n = res.n_rows
+    if note_ids is None:
+        note_ids = np.arange(n, dtype="int64")
+    cols = {"note_id": pa.array(np.asarray(note_ids, dtype="int64"))}
+    for k, col in res.flags.items():
+        cols[k] = pa.Array.from_buffers(pa.int8(), n, [None, pa.py_buffer(col)])
+
+    sp = res.spans
+    # spans are stored row by row, so per-row counts give the list offsets
+    counts = np.bincount(np.asarray(sp["row"], dtype="int64"), minlength=n)
+    offsets = np.zeros(n + 1, dtype="int32")
+    np.cumsum(counts, out=offsets[1:])
+    st = span_type()
+    values = pa.StructArray.from_arrays(
+        [pa.array(sp[f.name], type=f.type) for f in st], fields=list(st)
+    )
+    cols["spans"] = pa.ListArray.from_arrays(pa.array(offsets), values)
+    return pa.table(cols, schema=output_schema(list(res.flags)))
+
+
+# ---------- input ----------
+
+
+def _open_ipc(path: str):
+    pa = _pa()
+    source = pa.memory_map(path)
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source).read_all()
+
+
+def read_notes(path: str, fmt: str, chunksize: Optional[int] = None):
+    """
+    note_id/text DataFrame from a Parquet or Arrow file, or an iterator of
+    DataFrames of up to ``chunksize`` rows. Only the two input columns are read.
+    """
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        columns = [c for c in INPUT_COLUMNS if c in pf.schema_arrow.names]
+        if chunksize is None:
+            return pf.read(columns=columns).to_pandas()
+        return (b.to_pandas() for b in pf.iter_batches(batch_size=chunksize, columns=columns))
+
+    table = _open_ipc(path)
+    table = table.select([c for c in INPUT_COLUMNS if c in table.column_names])
+    if chunksize is None:
+        return table.to_pandas()
+    return (b.to_pandas() for b in table.to_batches(max_chunksize=chunksize))
+
+
+# ---------- output ----------
+
+
+class TableSink:
+    """Appends tables to one Parquet or Arrow IPC file; use as a context manager."""
+
+    def __init__(self, path: str, fmt: str, schema):
+        pa = _pa()
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(path, schema)
+        else:
+            self._writer = pa.ipc.new_file(path, schema)
+
+    def write(self, table) -> None:
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArrowRunWriter:
+    """
+    ``extsort.RunWriter`` for Arrow tables: sorted runs go to temporary IPC
+    files, which are memory-mapped and k-way merged by key at the end.
+    """
+
+    def __init__(self, key: str, dir: Optional[str] = None):
+        self.key = key
+        self._tmp = tempfile.TemporaryDirectory(prefix="medlex-runs-", dir=dir)
+        self.paths: List[str] = []
+
+    def add(self, table) -> None:
+        if table.num_rows == 0:
+            return
+        pa = _pa()
+        path = os.path.join(self._tmp.name, f"run-{len(self.paths):06d}.arrow")
+        # sort_by is stable, and heapq.merge breaks ties by run order
+        table = table.sort_by(self.key)
+        with pa.ipc.new_file(path, table.schema) as w:
+            w.write_table(table)
+        self.paths.append(path)
+
+    def merge_into(self, sink: TableSink, batch_rows: int = 65_536) -> None:
+        runs = [_open_ipc(p) for p in self.paths]
+        pending: List = []  # table slices of the batch being assembled
+        n_pending = 0
+        cur_run = cur_start = cur_len = 0
+
+        def flush_slice():
+            nonlocal n_pending
+            if cur_len:
+                pending.append(runs[cur_run].slice(cur_start, cur_len))
+                n_pending += cur_len
+
+        merged = heapq.merge(*(self._keys(t, i) for i, t in enumerate(runs)))
+        for _, run, row in merged:
+            if run == cur_run and row == cur_start + cur_len:
+                cur_len += 1
+                continue
+            flush_slice()
+            cur_run, cur_start, cur_len = run, row, 1
+            if n_pending >= batch_rows:
+                sink.write(_pa().concat_tables(pending))
+                pending, n_pending = [], 0
+        flush_slice()
+        if pending:
+            sink.write(_pa().concat_tables(pending))
+
+    def _keys(self, table, run: int) -> Iterator[tuple]:
+        row = 0
+        for chunk in table.column(self.key).chunks:
+            for k in chunk.to_pylist():
+                yield k, run, row
+                row += 1
+
+    def close(self) -> None:
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
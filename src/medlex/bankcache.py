@@ -0,0 +1,95 @@
+# src/medlex/bankcache.py
+"""
+On-disk cache of compiled variant banks.
+
+``load_variant_bank(cfg_path)`` returns what ``build_variant_bank`` would, but
+stores the result (term -> canonical maps, phonetic index, fuzzy vocabulary,
+regex sources) under a key derived from the YAML bytes and the medlex version.
+A warm start unpickles one file instead of parsing YAML and expanding every
+variant. Editing the YAML changes the key, so stale entries are
+never read.
+
+Cache location: ``cache_dir`` argument, else ``$MEDLEX_CACHE_DIR``, else
+``$XDG_CACHE_HOME/medlex`` (``~/.cache/medlex``).
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+import sys
+import tempfile
+import time
+from typing import Any, Optional
+
+from .pipeline import build_variant_bank, config_hash
+from .stats import lap
+
+# Bump when the pickled layout of Ctx/TermBank/indexes changes
+CACHE_FORMAT = 6
+
+
+def default_cache_dir() -> str:
+    env = os.environ.get("MEDLEX_CACHE_DIR")
+    if env:
+        return env
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "medlex")
+
+
+def cache_path(cfg_path: str, cache_dir: Optional[str] = None) -> str:
+    py = "%d%d" % sys.version_info[:2]
+    name = f"bank-{config_hash(cfg_path)[:32]}-f{CACHE_FORMAT}-py{py}.pkl"
+    return os.path.join(cache_dir or default_cache_dir(), name)
+
+
+def _read(path: str):
+    with open(path, "rb") as fh:
+        return pickle.load(fh)
+
+
+def _write(path: str, banks) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write-then-rename so concurrent readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(banks, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_variant_bank(
+    cfg_path: str, cache_dir: Optional[str] = None, use_cache: bool = True, stats: Any = None
+):
+    """
+    ``build_variant_bank(cfg_path)``, served from the on-disk cache when possible.
+
+    Unreadable or corrupt cache files are rebuilt; an unwritable cache directory
+    only costs the speed-up, never the result. ``stats`` counts
+    bank.cache_hit / bank.cache_miss and times a warm load as bank.load_cache.
+    """
+    if not use_cache:
+        return build_variant_bank(cfg_path, stats=stats)
+    path = cache_path(cfg_path, cache_dir)
+    if os.path.exists(path):
+        try:
+            if stats is None:
+                return _read(path)
+            t = time.perf_counter()
+            banks = _read(path)
+            lap(stats, "bank.load_cache", t)
+            stats.count("bank.cache_hit")
+            return banks
+        except Exception:
+            pass  # fall through and rebuild
+    if stats is not None:
+        stats.count("bank.cache_miss")
+    banks = build_variant_bank(cfg_path, stats=stats)
+    try:
+        _write(path, banks)
+    except OSError:
+        pass
+    return banks
@@ -0,0 +1,460 @@
+# src/medlex/batch.py
+from __future__ import annotations
+
+import json
+import time
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .pipeline import CONTEXT_PAD, SEGMENT_CHARS, Ctx, _exact_hits_windowed, _note_hits
+from .preprocess import normalize
+from .stats import lap
+
+SPAN_COLUMNS = (
+    "row",
+    "matched",
+    "start",
+    "end",
+    "context",
+    "source",
+    "is_negated",
+    "stage",
+    "context_score",
+)
+
+STAGES = ("exact", "fuzzy", "phonetic")
+_STAGE_ID = {s: i for i, s in enumerate(STAGES)}
+
+# per-row outcome under a time budget: matched in full; out of time and
+# matched exact-only (``_exact_hits_windowed``); out of time, no result
+STATUS = ("ok", "degraded", "timeout")
+
+
+def _as_texts(texts: Iterable[Any]) -> List[str]:
+    return ["" if t is None else str(t) for t in texts]
+
+
+def _byte_span(text: str, base: int, start: int, end: int) -> List[int]:
+    """Character span of ``text`` as UTF-8 byte offsets, shifted by ``base``."""
+    if text.isascii():
+        return [base + start, base + end]
+    b0 = base + len(text[:start].encode("utf-8"))
+    return [b0, b0 + len(text[start:end].encode("utf-8"))]
+
+
+class SpanTable(Mapping):
+    """
+    Spans of a batch as parallel arrays, one entry per span, keyed by ``row``.
+
+    Stored: row, start, end, source (index into ``sources``), stage (index into
+    ``STAGES``), is_negated and context_score - about 30 bytes a span. ``matched``
+    and ``context`` are never stored; reading those columns slices them out of
+    the note texts. Reads as a ``column -> sequence`` mapping over
+    ``SPAN_COLUMNS``.
+    """
+
+    def __init__(self, texts: Optional[List[str]], sources: Optional[List[str]] = None):
+        self.texts = texts
+        self.sources: List[str] = sources if sources is not None else []
+        self._source_id = {s: i for i, s in enumerate(self.sources)}
+        self.row = array("q")
+        self.start = array("q")
+        self.end = array("q")
+        self.source_id = array("i")
+        self.stage_id = array("b")
+        self.negated = array("b")
+        self.score = array("i")
+
+    @property
+    def n_spans(self) -> int:
+        return len(self.row)
+
+    def source_index(self, canon: str) -> int:
+        i = self._source_id.get(canon)
+        if i is None:
+            i = self._source_id[canon] = len(self.sources)
+            self.sources.append(canon)
+        return i
+
+    def append(self, row, start, end, canon, neg, stage, score) -> None:
+        self.row.append(row)
+        self.start.append(start)
+        self.end.append(end)
+        self.source_id.append(self.source_index(canon))
+        self.stage_id.append(_STAGE_ID[stage])
+        self.negated.append(1 if neg else 0)
+        self.score.append(score)
+
+    def matched(self, i: int) -> str:
+        return self.texts[self.row[i]][self.start[i] : self.end[i]]
+
+    def context(self, i: int) -> str:
+        """The span with up to ``CONTEXT_PAD`` characters either side."""
+        s, e = self.start[i], self.end[i]
+        return self.texts[self.row[i]][max(0, s - CONTEXT_PAD) : e + CONTEXT_PAD]
+
+    def __getitem__(self, name: str):
+        n = self.n_spans
+        if name == "row":
+            return self.row
+        if name == "start":
+            return self.start
+        if name == "end":
+            return self.end
+        if name == "context_score":
+            return self.score
+        if name == "is_negated":
+            return [bool(x) for x in self.negated]
+        if name == "source":
+            return [self.sources[i] for i in self.source_id]
+        if name == "stage":
+            return [STAGES[i] for i in self.stage_id]
+        if name == "matched":
+            return [self.matched(i) for i in range(n)]
+        if name == "context":
+            return [self.context(i) for i in range(n)]
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(SPAN_COLUMNS)
+
+    def __len__(self) -> int:
+        return len(SPAN_COLUMNS)
+
+
+class BatchResult:
+    """
+    Columnar output of ``process_batch``.
+
+    flags: has_<canonical> -> int8 array, one entry per input row
+    spans: ``SpanTable``, one entry per span, keyed by ``row``; matched text
+           and context are sliced from the notes on demand
+    status: int8 index into ``STATUS`` per row (all 0 without a time budget)
+    """
+
+    def __init__(
+        self,
+        n_rows: int,
+        flags: Dict[str, array],
+        spans: SpanTable,
+        status: Optional[array] = None,
+    ):
+        self.n_rows = n_rows
+        self.flags = flags
+        self.spans = spans
+        self.status = status if status is not None else array("b", bytes(n_rows))
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def detach(self) -> "BatchResult":
+        """Drop the note texts (e.g. before shipping the result to a process
+        that has them); ``concat(..., texts=)`` attaches them again."""
+        self.spans.texts = None
+        return self
+
+    @classmethod
+    def concat(
+        cls, parts: Iterable["BatchResult"], texts: Optional[Iterable[Any]] = None
+    ) -> "BatchResult":
+        """
+        Stack results of consecutive batches; span rows are re-based. ``texts``
+        (all notes, in order) replaces the parts' own, e.g. after ``detach``.
+        """
+        parts = list(parts)
+        flags = {k: array("b") for k in parts[0].flags}
+        status = array("b")
+        out = SpanTable([] if texts is None else _as_texts(texts), list(parts[0].spans.sources))
+        offset = 0
+        for part in parts:
+            for k, col in part.flags.items():
+                flags[k].extend(col)
+            status.extend(part.status)
+            sp = part.spans
+            out.row.extend(r + offset for r in sp.row)
+            out.start.extend(sp.start)
+            out.end.extend(sp.end)
+            ids = [out.source_index(s) for s in sp.sources]
+            out.source_id.extend(ids[i] for i in sp.source_id)
+            out.stage_id.extend(sp.stage_id)
+            out.negated.extend(sp.negated)
+            out.score.extend(sp.score)
+            if texts is None:
+                out.texts.extend(sp.texts)
+            offset += part.n_rows
+        return cls(offset, flags, out, status)
+
+    @classmethod
+    def from_hits(
+        cls,
+        texts: List[str],
+        note_hits: List[List[tuple]],
+        flag_keys: List[str],
+        status: Optional[array] = None,
+    ) -> "BatchResult":
+        """
+        Columns from per-note ``_note_hits`` tuples (one list per text): the
+        layout ``process_batch`` returns, for results computed or stored elsewhere.
+        """
+        flag_of: Dict[str, str] = {}
+        spans = SpanTable(texts)
+        add = spans.append
+        hit_rows: Dict[str, List[int]] = {k: [] for k in flag_keys}
+        for row, hits in enumerate(note_hits):
+            for canon, start, end, _m, neg, stage, score in hits:
+                add(row, start, end, canon, neg, stage, score)
+                if not neg:
+                    flag = flag_of.get(canon)
+                    if flag is None:
+                        flag = flag_of[canon] = f"has_{canon.lower()}"
+                    hit_rows[flag].append(row)
+
+        n = len(texts)
+        flags: Dict[str, array] = {}
+        for k in flag_keys:
+            col = array("b", bytes(n))
+            for r in hit_rows[k]:
+                col[r] = 1
+            flags[k] = col
+        return cls(n, flags, spans, status)
+
+    def row_hits(self) -> List[List[tuple]]:
+        """Back to per-note ``_note_hits`` tuples, the inverse of ``from_hits``."""
+        per_row: List[List[tuple]] = [[] for _ in range(self.n_rows)]
+        sp = self.spans
+        for i, row in enumerate(sp.row):
+            per_row[row].append(
+                (
+                    sp.sources[sp.source_id[i]],
+                    sp.start[i],
+                    sp.end[i],
+                    sp.matched(i),
+                    bool(sp.negated[i]),
+                    STAGES[sp.stage_id[i]],
+                    sp.score[i],
+                )
+            )
+        return per_row
+
+    def spans_json(self, byte_offsets: Optional[Sequence[int]] = None) -> List[str]:
+        """Per-row JSON list of span dicts, as ``process_text`` would emit them."""
+        return [json.dumps(s, ensure_ascii=False) for s in self.row_spans(byte_offsets)]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """One ``process_text``-style dict (has_* flags + spans) per row."""
+        out = []
+        for i, spans in enumerate(self.row_spans()):
+            rec: Dict[str, Any] = {k: col[i] for k, col in self.flags.items()}
+            rec["spans"] = spans
+            out.append(rec)
+        return out
+
+    def row_spans(self, byte_offsets: Optional[Sequence[int]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Per-row list of span dicts, in ``process_text`` order. With
+        ``byte_offsets`` (where each note starts in its source file, see
+        ``medlex.textio``) every span also gets ``bytes``: [start, end) in the file.
+        """
+        per_row: List[List[Dict[str, Any]]] = [[] for _ in range(self.n_rows)]
+        sp = self.spans
+        for i, row in enumerate(sp.row):
+            per_row[row].append(
+                {
+                    "matched": sp.matched(i),
+                    "span": (sp.start[i], sp.end[i]),
+                    "context": sp.context(i),
+                    "source": sp.sources[sp.source_id[i]],
+                    "is_negated": bool(sp.negated[i]),
+                    "stage": STAGES[sp.stage_id[i]],
+                    "context_score": sp.score[i],
+                }
+            )
+            if byte_offsets is not None:
+                per_row[row][-1]["bytes"] = _byte_span(
+                    sp.texts[row], byte_offsets[row], sp.start[i], sp.end[i]
+                )
+        return per_row
+
+    def to_pandas(self, index=None, context: bool = True):
+        """
+        (flags_df, spans_df). ``index`` relabels rows (flags index and the
+        spans ``row`` column), e.g. with the source DataFrame's index.
+        ``context=False`` leaves out the ``context`` column (the rest is cheap).
+        """
+        import numpy as np
+        import pandas as pd
+
+        flags_df = pd.DataFrame(
+            {k: pd.Series(v, dtype="int8", copy=False) for k, v in self.flags.items()}
+        )
+        sp = self.spans
+        cols = [c for c in SPAN_COLUMNS if context or c != "context"]
+        data = {c: sp[c] for c in cols}
+        # copies, not buffer views: a view would pin the arrays against resizing
+        for c in ("row", "start", "end", "context_score"):
+            data[c] = np.array(data[c], dtype=np.int64)
+        data["is_negated"] = np.array(sp.negated, dtype=bool)
+        # categorical: one copy of each canonical / stage name, not one per span
+        data["source"] = pd.Categorical.from_codes(
+            np.array(sp.source_id, dtype=np.int32), categories=list(sp.sources)
+        )
+        data["stage"] = pd.Categorical.from_codes(
+            np.array(sp.stage_id, dtype=np.int8), categories=list(STAGES)
+        )
+        spans_df = pd.DataFrame(data, columns=cols)
+        if index is not None:
+            index = pd.Index(index)
+            flags_df.index = index
+            spans_df["row"] = index.take(spans_df["row"].to_numpy())
+        return flags_df, spans_df
+
+    def to_arrow(self, note_ids=None):
+        """
+        ``pyarrow.Table``: note_id, int8 has_* columns and a nested
+        list<struct> ``spans`` column (see ``medlex.arrowio``).
+        """
+        from .arrowio import to_arrow
+
+        return to_arrow(self, note_ids)
+
+
+def process_batch(
+    texts: Iterable[Any],
+    ctx: Ctx,
+    bank: Dict[str, Any],
+    ph_bank: Optional[Dict[str, Any]] = None,
+    fz: Optional[Dict[str, Any]] = None,
+    stats: Any = None,
+    cache: Any = None,
+    budget: Optional[float] = None,
+    degrade: bool = True,
+    segment_chars: Optional[int] = SEGMENT_CHARS,
+) -> BatchResult:
+    """
+    Run the pipeline over many notes at once (list, Series, any iterable).
+
+    Same flags/spans as calling ``process_text`` per note, but written straight
+    into columns: no per-note result dict, no per-span dict. Fuzzy candidates
+    are deduplicated across the whole batch and scored in one matrix call
+    (timed as ``fuzzy.score`` when ``stats`` is given); notes that fail the
+    stub check are not tokenized, and only notes holding a token that cleared
+    a threshold are scanned for fuzzy hits.
+
+    With a ``ResultCache`` (``medlex.resultcache``), notes already seen - earlier
+    in the batch or in the cache - are not normalized, tokenized or scanned
+    again; ``stats`` then counts cache.hit / cache.miss. A repeat within the
+    batch takes its first copy's hits and status, and counts as a hit only if
+    that copy was stored (it matched within ``budget``).
+
+    ``budget`` caps the seconds spent matching any one note, so a pathological
+    note (OCR garbage, a pasted lab dump, a YAML pattern that backtracks) cannot
+    hold up the batch. A note that runs out is retried exact-only with cues
+    searched near each hit (``degrade``), then given up on; ``status`` records
+    which (``STATUS``), ``stats`` counts notes.degraded / notes.timeout, and
+    neither outcome is stored in ``cache``.
+
+    Notes longer than ``2 * segment_chars`` are matched as overlapping
+    segments (``medlex.segment``); None matches every note in one piece.
+
+    Each note to match is normalized once (``preprocess.normalize``, timed as
+    ``normalize``); the fuzzy tokens and every stage come from that text.
+    """
+    flag_keys = getattr(bank, "flag_keys", None) or [f"has_{c.lower()}" for c in bank]
+
+    texts = _as_texts(texts)
+    if stats is not None:
+        stats.count("notes", len(texts))
+    keys = cached = None
+    first: Dict[int, int] = {}  # repeat row -> first row with its (uncached) key
+    if cache is not None and ctx.config_hash:
+        keys = [cache.key(text, ctx.config_hash) for text in texts]
+        hits0, misses0 = cache.hits, cache.misses
+        cached = cache.get_many(keys)
+        seen: Dict[bytes, int] = {}
+        for row, key in enumerate(keys):
+            if cached[row] is None:
+                src = seen.setdefault(key, row)
+                if src != row:
+                    first[row] = src
+    if stats is not None:
+        t = time.perf_counter()
+    norms = [
+        normalize(text) if (cached is None or cached[row] is None) and row not in first else None
+        for row, text in enumerate(texts)
+    ]
+    if stats is not None:
+        lap(stats, "normalize", t)
+    fuzzy_scores = None
+    row_scores = {}  # row -> fuzzy_scores, for notes that hold a scored token
+    if fz:
+        if stats is not None:
+            t = time.perf_counter()
+        tokens = set()
+        note_tokens: Dict[int, set] = {}
+        for row, norm in enumerate(norms):
+            if norm is not None:
+                # tier 1: stubs; notes that cannot match are not even tokenized
+                if fz.may_match(norm.text):
+                    note_tokens[row] = fz.tokens(norm.text)
+                    tokens |= note_tokens[row]
+        fuzzy_scores = fz.match(tokens)
+        # tier 2: only notes with a token that cleared a threshold are scanned
+        for row, toks in note_tokens.items():
+            if not toks.isdisjoint(fuzzy_scores):
+                row_scores[row] = fuzzy_scores
+        if stats is not None:
+            lap(stats, "fuzzy.score", t)
+            stats.count("fuzzy.tokens_scored", len(tokens))
+            n = sum(1 for norm in norms if norm is not None)
+            stats.count("prefilter.fuzzy.stubs", n)
+            stats.count("prefilter.fuzzy.stubs.rejected", n - len(note_tokens))
+            stats.count("prefilter.fuzzy.tokens", len(note_tokens))
+            stats.count("prefilter.fuzzy.tokens.rejected", len(note_tokens) - len(row_scores))
+
+    status = array("b", bytes(len(texts)))
+
+    def run(row: int) -> list:
+        text = norms[row]
+        scores = row_scores.get(row, {})
+        if budget is None:
+            return _note_hits(text, ctx, bank, fz, scores, ph_bank, stats, None, segment_chars)
+        try:
+            deadline = time.perf_counter() + budget
+            return _note_hits(text, ctx, bank, fz, scores, ph_bank, stats, deadline, segment_chars)
+        except TimeoutError:
+            pass
+        if degrade:
+            try:
+                hits = _exact_hits_windowed(text, ctx, bank, time.perf_counter() + budget)
+                status[row] = 1
+                if stats is not None:
+                    stats.count("notes.degraded")
+                return hits
+            except TimeoutError:
+                pass
+        status[row] = 2
+        if stats is not None:
+            stats.count("notes.timeout")
+        return []
+
+    note_hits: List[List[tuple]] = []
+    for row in range(len(texts)):
+        if cached is None:
+            hits = run(row)
+        elif row in first:
+            src = first[row]
+            hits = note_hits[src]
+            status[row] = status[src]
+            cache.get(keys[row])  # a hit only if the first copy was stored
+        else:
+            hits = cached[row]
+            if hits is None:
+                hits = run(row)
+                if status[row] == 0:
+                    cache.put(keys[row], hits)
+        note_hits.append(hits)
+    if cached is not None and stats is not None:
+        stats.count("cache.hit", cache.hits - hits0)
+        stats.count("cache.miss", cache.misses - misses0)
+    return BatchResult.from_hits(texts, note_hits, flag_keys, status)
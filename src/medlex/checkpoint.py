@@ -0,0 +1,154 @@
+# src/medlex/checkpoint.py
+"""
+Crash-safe checkpoints for long streaming runs.
+
+With ``--checkpoint DIR`` every processed chunk is committed as its own part
+file (``part-000042.csv``) and then recorded in ``manifest.json``. Both are
+written to a temporary name, fsynced and renamed into place, so after a crash
+the manifest only ever lists complete parts; a half-written part is simply
+redone. ``--resume`` reads the input again, skips the chunks the manifest
+already has (they are read, not matched) and carries on from there. When
+every chunk is in, the parts are merged into the output: k-way by note_id
+(see ``extsort``) or, with ``--no-sort``, concatenated in input order. Once
+the output is written the manifest is marked complete, and the directory is
+not run into again, with or without ``--resume``.
+
+The manifest also records what the parts were computed from: the config
+hash, the input file's size and mtime (for a directory, those of its
+``.txt`` files), the chunk size and format, the sort order and the flag
+columns. Resuming with any of them changed is refused rather than mixing
+results.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from typing import IO, Any, Dict, List, Optional
+
+from .extsort import merge_runs
+
+MANIFEST = "manifest.json"
+
+
+def input_fingerprint(path: str) -> Dict[str, Any]:
+    """Size and mtime of ``path``; for a directory, a digest over its ``.txt`` files."""
+    path = os.path.abspath(path)
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    h = hashlib.blake2b(digest_size=16)
+    for d, dirs, files in os.walk(path):
+        dirs.sort()
+        for f in sorted(files):
+            if f.lower().endswith(".txt"):
+                st = os.stat(os.path.join(d, f))
+                h.update(f"{os.path.relpath(os.path.join(d, f), path)}\0{st.st_size}\0".encode())
+                h.update(f"{st.st_mtime_ns}\n".encode())
+    return {"path": path, "files": h.hexdigest()}
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # not supported here (e.g. Windows); the rename is still atomic
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class Checkpoint:
+    """Part files plus manifest in ``directory``."""
+
+    def __init__(self, directory: str, meta: Dict[str, Any], resume: bool = False):
+        self.dir = directory
+        self.meta = meta
+        self.parts: List[Dict[str, Any]] = []
+        self.complete = False
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                manifest = json.load(fh)
+            finished = (
+                f"{directory} holds a finished run (its output was written); "
+                "remove the directory to run again"
+            )
+            if not resume:
+                if manifest.get("complete"):
+                    raise SystemExit(finished)
+                raise SystemExit(
+                    f"{directory} already holds a checkpoint; pass --resume to continue it "
+                    "or remove the directory to start over"
+                )
+            changed = sorted(
+                k for k in {*meta, *manifest["meta"]} if manifest["meta"].get(k) != meta.get(k)
+            )
+            if changed:
+                raise SystemExit(
+                    f"Cannot resume {directory}: {', '.join(changed)} changed since the "
+                    "checkpoint was written"
+                )
+            if manifest.get("complete"):
+                raise SystemExit(finished)
+            self.parts = manifest["parts"]
+        else:
+            self._write_manifest()
+
+    @property
+    def done(self) -> int:
+        """Chunks already committed."""
+        return len(self.parts)
+
+    @property
+    def rows(self) -> int:
+        return sum(p["rows"] for p in self.parts)
+
+    def _write_atomic(self, name: str, write) -> None:
+        final = os.path.join(self.dir, name)
+        tmp = final + ".tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as fh:
+            write(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, final)
+        _fsync_dir(self.dir)
+
+    def _write_manifest(self) -> None:
+        manifest = {"meta": self.meta, "parts": self.parts, "complete": self.complete}
+        self._write_atomic(MANIFEST, lambda fh: json.dump(manifest, fh, indent=1))
+
+    def commit(self, df, sort_key: Optional[str] = None) -> None:
+        """Write the next chunk's output rows as a part, then record it."""
+        name = f"part-{self.done:06d}.csv"
+        if sort_key is not None:
+            df = df.sort_values(sort_key, kind="stable")
+        self._write_atomic(name, lambda fh: df.to_csv(fh, index=False))
+        self.parts.append({"file": name, "rows": len(df)})
+        self._write_manifest()
+
+    def finish(self) -> None:
+        """Mark the run complete, once ``merge_into`` has written the output."""
+        self.complete = True
+        self._write_manifest()
+
+    def merge_into(self, out: IO[str], sort_key: Optional[str] = None) -> bool:
+        """Write every committed part to ``out``; False if there were none."""
+        paths = [os.path.join(self.dir, p["file"]) for p in self.parts]
+        if not paths:
+            return False
+        if sort_key is not None:
+            merge_runs(paths, out, sort_key)
+            return True
+        for i, path in enumerate(paths):
+            with open(path, newline="", encoding="utf-8") as fh:
+                if i:
+                    fh.readline()  # header
+                shutil.copyfileobj(fh, out)
+        return True
@@ -1,11 +1,25 @@
+from __future__ import annotations
+
 import argparse
 import sys
-import json
-from typing import Optional
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
+from typing import List, Optional
 
-import pandas as pd
+# pandas / numpy, multiprocessing (--workers) and sqlite (--incremental) are
+# imported by the paths that need them: a plain CSV run (``csvio``) never does
+from .arrowio import FORMATS, ArrowRunWriter, TableSink, detect_format, output_schema, read_notes
+from .bankcache import load_variant_bank
+from .checkpoint import Checkpoint, input_fingerprint
+from .batch import STATUS, process_batch
+from .csvio import read_csv_notes, write_csv_rows
+from .extsort import RunWriter
+from .preprocess import phonetic_cache_info
+from .resultcache import DEFAULT_MAXSIZE, ResultCache
+from .stats import Stats, lap
+from .textio import TEXT_FORMATS, detect_text_format, read_text_notes
 
-from .pipeline import build_variant_bank, process_text
+DEFAULT_CHUNKSIZE = 50_000
 
 
 def _detect_sep(path: str) -> str:
@@ -22,61 +36,452 @@ def _detect_sep(path: str) -> str:
         return ","
 
 
-def _read_table(path_in: str, sep_arg: str) -> pd.DataFrame:
+def _resolve_sep(path_in: str, sep_arg: str) -> str:
     if sep_arg == "csv":
-        sep = ","
-    elif sep_arg == "tsv":
-        sep = "\t"
-    else:  # auto
-        sep = _detect_sep(path_in)
-    return pd.read_csv(path_in, sep=sep)
+        return ","
+    if sep_arg == "tsv":
+        return "\t"
+    return _detect_sep(path_in)  # auto
 
 
-def main(path_in: str, cfg_path: str, out_path: Optional[str] = "-", sep_arg: str = "auto"):
-    # Build matching context/banks
-    ctx, bank, ph_bank, fz = build_variant_bank(cfg_path)
+def _read_table(
+    path_in: str, sep_arg: str, chunksize: Optional[int] = None, in_format: str = "csv"
+):
+    """DataFrame, or an iterator of DataFrames when ``chunksize`` is set."""
+    import pandas as pd
 
-    # Precompute the full set of flag columns we expect from the YAML
-    flag_keys = [f"has_{t.canonical.lower()}" for t in ctx.targets]
+    if in_format in TEXT_FORMATS:
+        # raw text is always read in chunks, straight off the memory map; object
+        # columns keep the decoded strings as they are (no copy into a string array)
+        chunks = read_text_notes(path_in, in_format, chunksize)
+        return (pd.DataFrame(c, dtype=object) for c in chunks)
+    if in_format != "csv":
+        return read_notes(path_in, in_format, chunksize)
+    return pd.read_csv(path_in, sep=_resolve_sep(path_in, sep_arg), chunksize=chunksize)
 
-    # Load notes
-    df = _read_table(path_in, sep_arg)
 
-    # Validate columns
+def _validate_columns(df) -> None:
     required = ("note_id", "text")
     for col in required:
         if col not in df.columns:
             raise SystemExit(f"Input must contain columns: {', '.join(required)} (missing: {col})")
 
-    # Process rows
-    rows = []
-    for _, r in df.iterrows():
-        note_id = int(r["note_id"])
-        text = str(r["text"])
 
-        res = process_text(text, ctx, bank, ph_bank, fz)
+def _runner_args(df):
+    return df["note_id"].astype("int64").tolist(), [str(t) for t in df["text"].tolist()]
+
+
+def _process_frame(df, runner, flag_keys, stats=None, status: bool = False):
+    """
+    Output rows (note_id, has_*, spans) for ``df``, in input order; with
+    ``status`` (a time budget is set) also ok/degraded/timeout per note.
+    """
+    import numpy as np
+    import pandas as pd
 
-        # Ensure every flag column exists; default to 0 if missing
-        flags = {k: int(res.get(k, 0)) for k in flag_keys}
+    if stats is not None:
+        t = time.perf_counter()
+    res = runner(*_runner_args(df), stats)
+    if stats is not None:
+        t = lap(stats, "process", t)
 
-        # Spans as JSON string for safe CSV embedding
-        spans_json = json.dumps(res.get("spans", []), ensure_ascii=False)
+    # Spans as JSON string for safe CSV embedding; raw text input adds file byte offsets
+    offsets = df["offset"].tolist() if "offset" in df.columns else None
+    spans = res.spans_json(byte_offsets=offsets)
+    if stats is not None:
+        t = lap(stats, "serialize", t)
+    out_df = pd.DataFrame({"note_id": df["note_id"].astype("int64").to_numpy()})
+    if "file" in df.columns:
+        out_df["file"] = df["file"].to_numpy()
+    for k in flag_keys:
+        out_df[k] = pd.Series(res.flags[k], dtype="int8")
+    if status:
+        out_df["status"] = pd.Categorical.from_codes(
+            np.frombuffer(res.status, dtype=np.int8), categories=list(STATUS)
+        )
+    out_df["spans"] = spans
+    if stats is not None:
+        lap(stats, "frame", t)
+    return out_df
 
-        rows.append({"note_id": note_id, **flags, "spans": spans_json})
 
-    out_df = pd.DataFrame(rows).sort_values("note_id")
+def _process_rows(note_ids, texts, runner, flag_keys, stats=None, status: bool = False):
+    """``_process_frame`` for the stdlib CSV path: the same output rows, as lists."""
+    if stats is not None:
+        t = time.perf_counter()
+    res = runner(note_ids, texts, stats)
+    if stats is not None:
+        t = lap(stats, "process", t)
+    spans = res.spans_json()
+    if stats is not None:
+        t = lap(stats, "serialize", t)
+    cols = [note_ids, *(res.flags[k] for k in flag_keys)]
+    if status:
+        cols.append([STATUS[s] for s in res.status])
+    cols.append(spans)
+    rows = [list(r) for r in zip(*cols)]
+    if stats is not None:
+        lap(stats, "frame", t)
+    return rows
 
-    # Write output
+
+def _process_table(df, runner, stats=None):
+    """Output rows for ``df`` as an Arrow table with a nested spans column."""
+    if stats is not None:
+        t = time.perf_counter()
+    res = runner(*_runner_args(df), stats)
+    if stats is not None:
+        t = lap(stats, "process", t)
+    table = res.to_arrow(df["note_id"].astype("int64").to_numpy())
+    if stats is not None:
+        lap(stats, "frame", t)
+    return table
+
+
+def _timed(stats, name: str):
+    return stats.timer(name) if stats is not None else nullcontext()
+
+
+@contextmanager
+def _open_out(out_path: Optional[str]):
     if out_path in (None, "-"):
-        out_df.to_csv(sys.stdout, index=False)
+        yield sys.stdout
     else:
-        out_df.to_csv(out_path, index=False)
+        with open(out_path, "w", newline="", encoding="utf-8") as fh:
+            yield fh
 
 
-if __name__ == "__main__":
-    p = argparse.ArgumentParser(description="medlex-spotter CLI")
+def main(
+    path_in: str,
+    cfg_path: str,
+    out_path: Optional[str] = "-",
+    sep_arg: str = "auto",
+    chunksize: Optional[int] = None,
+    sort: bool = True,
+    workers: int = 1,
+    bank_cache: bool = True,
+    stats_path: Optional[str] = None,
+    in_format: str = "auto",
+    out_format: str = "auto",
+    result_cache: Optional[dict] = None,
+    incremental_dir: Optional[str] = None,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    note_timeout: Optional[float] = None,
+    degrade: bool = True,
+):
+    # csv / parquet / arrow / lines / txtdir; "auto" goes by file extension
+    if in_format == "auto":
+        in_format = detect_text_format(path_in) or detect_format(path_in)
+    out_format = detect_format(out_path) if out_format == "auto" else out_format
+    if out_format != "csv" and out_path in (None, "-"):
+        raise SystemExit(f"--out-format {out_format} needs an --out file path")
+    if in_format in TEXT_FORMATS:
+        if out_format != "csv":
+            raise SystemExit(
+                f"--in-format {in_format} writes CSV output (spans carry byte offsets)"
+            )
+        # read chunk by chunk; notes already come in note_id order
+        chunksize = chunksize or DEFAULT_CHUNKSIZE
+        sort = False
+    if checkpoint_dir:
+        if out_format != "csv":
+            raise SystemExit("--checkpoint writes CSV output")
+        if path_in in (None, "-"):
+            raise SystemExit(
+                "--checkpoint needs an --in file path (the input is read again on --resume)"
+            )
+        if incremental_dir:
+            raise SystemExit("--checkpoint and --incremental cannot be combined")
+        # checkpoints are per chunk: always stream
+        chunksize = chunksize or DEFAULT_CHUNKSIZE
+
+    # Per-stage timers and counters, only collected when a report is asked for
+    # (or to count result-cache hits)
+    stats = Stats() if stats_path or result_cache is not None or note_timeout is not None else None
+    t_start = time.perf_counter()
+    _main(
+        path_in,
+        cfg_path,
+        out_path,
+        sep_arg,
+        chunksize,
+        sort,
+        workers,
+        bank_cache,
+        stats,
+        in_format,
+        out_format,
+        result_cache,
+        incremental_dir,
+        checkpoint_dir,
+        resume,
+        note_timeout,
+        degrade,
+    )
+    if note_timeout is not None:
+        degraded, timeout = stats.counters["notes.degraded"], stats.counters["notes.timeout"]
+        print(
+            f"time budget: {degraded} notes matched exact-only, {timeout} timed out",
+            file=sys.stderr,
+        )
+    if result_cache is not None:
+        hits, misses = stats.counters["cache.hit"], stats.counters["cache.miss"]
+        rate = hits / (hits + misses) if hits + misses else 0.0
+        print(f"result cache: {hits} hits, {misses} misses ({rate:.1%})", file=sys.stderr)
+    if stats_path:
+        stats.add_time("total", time.perf_counter() - t_start)
+        total = stats.timers["total"]
+        extra = {"workers": workers, "notes_per_sec": stats.counters["notes"] / total}
+        if workers == 1:
+            # the memo lives per process; with workers it is in the children
+            extra["phonetic_cache"] = phonetic_cache_info()
+        stats.dump(stats_path, extra)
+
+
+def _main(
+    path_in,
+    cfg_path,
+    out_path,
+    sep_arg,
+    chunksize,
+    sort,
+    workers,
+    bank_cache,
+    stats,
+    in_format,
+    out_format,
+    result_cache=None,
+    incremental_dir=None,
+    checkpoint_dir=None,
+    resume=False,
+    note_timeout=None,
+    degrade=True,
+):
+    # Build matching context/banks (or load them from the on-disk cache)
+    ctx, bank, ph_bank, fz = load_variant_bank(cfg_path, use_cache=bank_cache, stats=stats)
+
+    # Precompute the full set of flag columns we expect from the YAML
+    flag_keys = [f"has_{canon.lower()}" for canon in bank]
+
+    with ExitStack() as stack:
+        if workers > 1:
+            from .parallel import WorkerPool
+
+            # each worker builds its own bank once, in the pool initializer
+            pool = WorkerPool(
+                cfg_path,
+                workers,
+                use_cache=bank_cache,
+                result_cache=result_cache,
+                budget=note_timeout,
+                degrade=degrade,
+            )
+            run_texts = stack.enter_context(pool).process
+        else:
+            cache = None
+            if result_cache is not None:
+                cache = stack.enter_context(ResultCache(**result_cache))
+
+            def run_texts(texts, stats=None):
+                return process_batch(
+                    texts,
+                    ctx,
+                    bank,
+                    ph_bank,
+                    fz,
+                    stats=stats,
+                    cache=cache,
+                    budget=note_timeout,
+                    degrade=degrade,
+                )
+
+        state = None
+        if incremental_dir:
+            from .incremental import IncrementalState
+
+            # only new/changed notes reach run_texts; the rest come from the state
+            state = stack.enter_context(IncrementalState(incremental_dir, ctx.config_hash))
+
+        def runner(note_ids, texts, stats=None):
+            if state is None:
+                return run_texts(texts, stats)
+            return state.run(note_ids, texts, run_texts, flag_keys, stats)
+
+        checkpoint = None
+        if checkpoint_dir:
+            meta = {
+                "config_hash": ctx.config_hash,
+                "input": input_fingerprint(path_in),
+                "in_format": in_format,
+                "chunksize": chunksize,
+                "sort": sort,
+                "flag_keys": flag_keys,
+                "status_column": note_timeout is not None,
+            }
+            checkpoint = Checkpoint(checkpoint_dir, meta, resume=resume)
+            if checkpoint.done:
+                print(
+                    f"checkpoint: resuming after {checkpoint.done} chunks ({checkpoint.rows} rows)",
+                    file=sys.stderr,
+                )
+
+        if chunksize:
+            _main_stream(
+                path_in,
+                out_path,
+                sep_arg,
+                chunksize,
+                sort,
+                runner,
+                flag_keys,
+                stats,
+                in_format,
+                out_format,
+                checkpoint,
+                note_timeout is not None,
+            )
+        elif in_format == "csv" and out_format == "csv":
+            # plain CSV/TSV both ways: the stdlib reader and writer, no pandas
+            with _timed(stats, "read"):
+                note_ids, texts = read_csv_notes(path_in, _resolve_sep(path_in, sep_arg))
+            rows = _process_rows(
+                note_ids, texts, runner, flag_keys, stats, note_timeout is not None
+            )
+        else:
+            # Load notes
+            with _timed(stats, "read"):
+                df = _read_table(path_in, sep_arg, in_format=in_format)
+            _validate_columns(df)
+
+            if out_format != "csv":
+                table = _process_table(df, runner, stats)
+            else:
+                out_df = _process_frame(df, runner, flag_keys, stats, note_timeout is not None)
+
+        if state is not None:
+            state.finish()
+            print(state.summary(), file=sys.stderr)
+    if chunksize:
+        return
+
+    # Write output
+    with _timed(stats, "write"):
+        if in_format == "csv" and out_format == "csv":
+            if sort:
+                rows.sort(key=lambda r: r[0])
+            header = [
+                "note_id",
+                *flag_keys,
+                *(["status"] if note_timeout is not None else []),
+                "spans",
+            ]
+            with _open_out(out_path) as fh:
+                write_csv_rows(fh, header, rows)
+            return
+        if out_format != "csv":
+            if sort:
+                table = table.sort_by("note_id")
+            with TableSink(out_path, out_format, table.schema) as sink:
+                sink.write(table)
+            return
+        if sort:
+            out_df = out_df.sort_values("note_id")
+        if out_path in (None, "-"):
+            out_df.to_csv(sys.stdout, index=False)
+        else:
+            out_df.to_csv(out_path, index=False)
+
+
+def _main_stream(
+    path_in,
+    out_path,
+    sep_arg,
+    chunksize,
+    sort,
+    runner,
+    flag_keys,
+    stats=None,
+    in_format="csv",
+    out_format="csv",
+    checkpoint=None,
+    status=False,
+):
+    """
+    Bounded-memory mode: read ``chunksize`` rows at a time and write each
+    processed chunk out before reading the next. With ``sort``, chunks go to
+    sorted run files that are merged at the end (external merge sort).
+    A ``Checkpoint`` takes the place of the run files: each chunk is committed
+    as a part, chunks it already holds are skipped, and the output is merged
+    from its parts.
+    """
+    columnar = out_format != "csv"
+    with ExitStack() as stack:
+        if columnar:
+            out = stack.enter_context(TableSink(out_path, out_format, output_schema(flag_keys)))
+            runs = stack.enter_context(ArrowRunWriter("note_id")) if sort else None
+        else:
+            out = stack.enter_context(_open_out(out_path))
+            runs = stack.enter_context(RunWriter("note_id")) if sort and not checkpoint else None
+        sort_key = "note_id" if sort else None
+        skip = checkpoint.done if checkpoint is not None else 0
+        wrote = columnar  # a columnar file carries its schema even when empty
+        chunks = iter(_read_table(path_in, sep_arg, chunksize=chunksize, in_format=in_format))
+        while True:
+            with _timed(stats, "read"):
+                df = next(chunks, None)
+            if df is None:
+                break
+            if skip:
+                # committed before the restart: read past it, don't match it again
+                skip -= 1
+                if stats is not None:
+                    stats.count("checkpoint.skipped_chunks")
+                continue
+            _validate_columns(df)
+            if columnar:
+                out_chunk = _process_table(df, runner, stats)
+            else:
+                out_chunk = _process_frame(df, runner, flag_keys, stats, status)
+            with _timed(stats, "write"):
+                if checkpoint is not None:
+                    checkpoint.commit(out_chunk, sort_key)
+                elif runs is not None:
+                    runs.add(out_chunk)
+                elif columnar:
+                    out.write(out_chunk)
+                else:
+                    out_chunk.to_csv(out, index=False, header=not wrote)
+                    wrote = True
+        if runs is not None and runs.paths:
+            with _timed(stats, "write"):
+                runs.merge_into(out)
+            wrote = True
+        elif checkpoint is not None:
+            with _timed(stats, "write"):
+                wrote = checkpoint.merge_into(out, sort_key)
+        if not wrote:
+            import pandas as pd
+
+            # empty input: still emit the header row
+            columns = ["note_id", *flag_keys, *(["status"] if status else []), "spans"]
+            pd.DataFrame(columns=columns).to_csv(out, index=False)
+    if checkpoint is not None:
+        # the output is closed: a rerun must not mistake this for a crashed run
+        checkpoint.finish()
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        description="medlex-spotter CLI",
+        epilog="Service mode: medlex serve --help; evaluation: medlex eval --help",
+    )
     p.add_argument(
-        "--in", dest="path_in", required=True, help="Input CSV/TSV with columns: note_id,text"
+        "--in",
+        dest="path_in",
+        required=True,
+        help="Input CSV/TSV with columns: note_id,text; or a .txt file with one note per line, "
+        "or a directory of .txt notes (see --in-format)",
     )
     p.add_argument("--targets", required=True, help="YAML targets config")
     p.add_argument(
@@ -85,5 +490,157 @@ if __name__ == "__main__":
     p.add_argument(
         "--sep", dest="sep", default="auto", choices=["auto", "csv", "tsv"], help="Input delimiter"
     )
-    a = p.parse_args()
-    main(a.path_in, a.targets, a.out_path, a.sep)
+    p.add_argument(
+        "--stream",
+        action="store_true",
+        help=f"Process the input in chunks with bounded memory (default chunk: {DEFAULT_CHUNKSIZE})",
+    )
+    p.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Rows per chunk in streaming mode (implies --stream)",
+    )
+    p.add_argument(
+        "--no-sort",
+        dest="sort",
+        action="store_false",
+        help="Keep input order instead of sorting by note_id",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes (default 1: run in-process). Output is identical to a serial run",
+    )
+    p.add_argument(
+        "--no-bank-cache",
+        dest="bank_cache",
+        action="store_false",
+        help="Always rebuild the compiled bank from YAML (skip the on-disk cache; "
+        "location: $MEDLEX_CACHE_DIR or ~/.cache/medlex)",
+    )
+    p.add_argument(
+        "--stats",
+        dest="stats_path",
+        default=None,
+        metavar="OUT_JSON",
+        help="Write per-stage timings and match counters to this JSON file",
+    )
+    p.add_argument(
+        "--in-format",
+        default="auto",
+        choices=["auto", *FORMATS, *TEXT_FORMATS],
+        help="Input format (auto: by extension, .parquet/.arrow/.feather, .txt -> lines, "
+        "a directory -> txtdir, else CSV/TSV). lines/txtdir are memory-mapped, streamed, "
+        "and their spans carry file byte offsets",
+    )
+    p.add_argument(
+        "--out-format",
+        default="auto",
+        choices=["auto", *FORMATS],
+        help="Output format (auto: by --out extension, else CSV). parquet/arrow store flags "
+        "as int8 and spans as a nested list<struct> column",
+    )
+    p.add_argument(
+        "--result-cache",
+        action="store_true",
+        help="Reuse results for notes whose text was already seen (hit/miss counts on stderr)",
+    )
+    p.add_argument(
+        "--result-cache-size",
+        type=int,
+        default=DEFAULT_MAXSIZE,
+        help=f"Notes kept in the in-memory result cache (default {DEFAULT_MAXSIZE})",
+    )
+    p.add_argument(
+        "--result-cache-db",
+        default=None,
+        metavar="PATH",
+        help="SQLite file that keeps results across runs (implies --result-cache)",
+    )
+    p.add_argument(
+        "--incremental",
+        dest="incremental_dir",
+        default=None,
+        metavar="STATE_DIR",
+        help="Keep per-note hashes and results in STATE_DIR and only process notes that are "
+        "new or changed since the last run (all notes when the targets YAML changes); "
+        "the input must be the whole corpus",
+    )
+    p.add_argument(
+        "--checkpoint",
+        dest="checkpoint_dir",
+        default=None,
+        metavar="DIR",
+        help="Commit each processed chunk to DIR (part files + manifest) so an interrupted "
+        "run can be resumed; implies --stream, CSV output",
+    )
+    p.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the run checkpointed in --checkpoint DIR, skipping committed chunks",
+    )
+    p.add_argument(
+        "--note-timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Time budget per note: a note that runs over is retried exact-only (cues searched "
+        "near each hit), then skipped. Adds a status column (ok/degraded/timeout) to CSV output",
+    )
+    p.add_argument(
+        "--no-degrade",
+        dest="degrade",
+        action="store_false",
+        help="With --note-timeout, skip notes that run over instead of retrying them exact-only",
+    )
+    return p
+
+
+def run(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "serve":
+        from .serve import main as serve_main
+
+        return serve_main(argv[1:])
+    if argv and argv[0] == "eval":
+        from .evaluate import main as eval_main
+
+        return eval_main(argv[1:])
+    a = _build_parser().parse_args(argv)
+    chunksize = a.chunksize or (DEFAULT_CHUNKSIZE if a.stream else None)
+    if chunksize is not None and chunksize < 1:
+        raise SystemExit("--chunksize must be a positive integer")
+    if a.workers < 1:
+        raise SystemExit("--workers must be a positive integer")
+    if a.note_timeout is not None and a.note_timeout <= 0:
+        raise SystemExit("--note-timeout must be a positive number of seconds")
+    if a.resume and not a.checkpoint_dir:
+        raise SystemExit("--resume needs --checkpoint DIR")
+    result_cache = None
+    if a.result_cache or a.result_cache_db:
+        result_cache = {"maxsize": a.result_cache_size, "path": a.result_cache_db}
+    main(
+        a.path_in,
+        a.targets,
+        a.out_path,
+        a.sep,
+        chunksize=chunksize,
+        sort=a.sort,
+        workers=a.workers,
+        bank_cache=a.bank_cache,
+        stats_path=a.stats_path,
+        in_format=a.in_format,
+        out_format=a.out_format,
+        result_cache=result_cache,
+        incremental_dir=a.incremental_dir,
+        checkpoint_dir=a.checkpoint_dir,
+        resume=a.resume,
+        note_timeout=a.note_timeout,
+        degrade=a.degrade,
+    )
+
+
+if __name__ == "__main__":
+    run()
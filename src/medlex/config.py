@@ -1,13 +1,69 @@
 from __future__ import annotations
 
+import warnings
 from dataclasses import dataclass, field
 from typing import List, Optional, Any, Dict
-import yaml
+
+try:
+    from re import _parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
 
 from dataclasses import dataclass, field
 from typing import List, Optional
 
 
+class PatternWarning(UserWarning):
+    """A YAML pattern has a shape known to backtrack catastrophically."""
+
+
+def _walk_risks(items, in_repeat: bool, out: set) -> None:
+    p = _sre_parse
+    for op, av in items:
+        if op in (p.MAX_REPEAT, p.MIN_REPEAT):
+            unbounded = av[1] == p.MAXREPEAT
+            if unbounded and in_repeat:
+                out.add("nested unbounded quantifiers, e.g. (a+)*")
+            _walk_risks(av[2], in_repeat or unbounded, out)
+        elif op is p.SUBPATTERN:
+            _walk_risks(av[-1], in_repeat, out)
+        elif op is p.BRANCH:
+            # the parser factors out common prefixes: (a|aa) becomes a(|a)
+            if in_repeat and any(not b for b in av[1]):
+                out.add("overlapping alternatives under a quantifier, e.g. (a|aa)+")
+            for b in av[1]:
+                _walk_risks(b, in_repeat, out)
+        elif op in (p.ASSERT, p.ASSERT_NOT):
+            _walk_risks(av[1], in_repeat, out)
+
+
+def backtracking_risks(pattern: str) -> List[str]:
+    """
+    Catastrophic-backtracking shapes in ``pattern`` (a heuristic lint: it can
+    flag patterns the engine copes with, and says nothing about syntax only
+    the ``regex`` module knows).
+    """
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except Exception:
+        return []
+    out: set = set()
+    _walk_risks(parsed, False, out)
+    return sorted(out)
+
+
+def _lint_patterns(named: Dict[str, List[str]]) -> None:
+    for where, patterns in named.items():
+        for pat in patterns:
+            for risk in backtracking_risks(pat):
+                warnings.warn(
+                    f"Config: {where} pattern {pat!r} may backtrack catastrophically ({risk}); "
+                    "bound matching time per note with a time budget (--note-timeout)",
+                    PatternWarning,
+                    stacklevel=3,
+                )
+
+
 @dataclass
 class Defaults:
     dosage_units: str = r"(?:mg|g|iu|units|u)"
@@ -56,8 +112,13 @@ def _as_str_list(x: Any) -> List[str]:
 
 
 def load_config(path: str) -> Config:
+    # imported here: a bank loaded from the on-disk cache never parses YAML
+    import yaml
+
+    # libyaml's parser when PyYAML was built with it: large lexicons load ~10x faster
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(path, "r", encoding="utf-8") as f:
-        raw = yaml.safe_load(f) or {}
+        raw = yaml.load(f, Loader=loader) or {}
 
     if not isinstance(raw, dict):
         raise ValueError("Config error: top-level YAML must be a mapping (dict).")
@@ -127,4 +188,11 @@ def load_config(path: str) -> Config:
             )
         )
 
+    _lint_patterns(
+        {
+            "negation": negation.patterns,
+            "defaults.dosage_units": [defaults.dosage_units],
+            "defaults.forms": [defaults.forms],
+        }
+    )
     return Config(defaults=defaults, targets=targets, negation=negation)
@@ -1,5 +1,13 @@
+import time
+
 import regex as re
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import List, Optional, Tuple
+
+# characters either side of a span searched for dosage units / forms
+CONTEXT_WINDOW = 30
 
 
 @dataclass
@@ -9,13 +17,31 @@ class ContextCfg:
     negation_patterns: list[str]
 
 
+@lru_cache(maxsize=32)
+def _cue_patterns(
+    dosage_units: str, forms: str
+) -> Tuple[Optional[re.Pattern], Optional[re.Pattern]]:
+    """
+    Compiled (dose, form) cue patterns; built once per distinct config.
+    Case-insensitive, like the negation patterns: notes are matched lowercased.
+    """
+    dose = (
+        re.compile(rf"\b\d+(?:\.\d+)?\s*({dosage_units})\b", re.IGNORECASE)
+        if dosage_units
+        else None
+    )
+    form = re.compile(rf"\b{forms}\b", re.IGNORECASE) if forms else None
+    return dose, form
+
+
 def context_score(text: str, start: int, end: int, cfg: ContextCfg) -> int:
-    window = text[max(0, start - 30) : min(len(text), end + 30)]
+    window = text[max(0, start - CONTEXT_WINDOW) : min(len(text), end + CONTEXT_WINDOW)]
+    dose, form = _cue_patterns(cfg.dosage_units, cfg.forms)
     pos = 0
-    if cfg.dosage_units:
-        pos += len(re.findall(rf"\b\d+(?:\.\d+)?\s*({cfg.dosage_units})\b", window))
-    if cfg.forms:
-        pos += len(re.findall(rf"\b{cfg.forms}\b", window))
+    if dose is not None:
+        pos += len(dose.findall(window))
+    if form is not None:
+        pos += len(form.findall(window))
     return pos
 
 
@@ -25,3 +51,75 @@ def is_negated(text: str, start: int, end: int, cfg: ContextCfg) -> bool:
         if re.search(pat, window):
             return True
     return False
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """
+    Seconds until ``deadline`` (a ``time.perf_counter()`` value), for a
+    ``regex`` ``timeout=``; None without a deadline. Raises ``TimeoutError``
+    once it has passed.
+    """
+    if deadline is None:
+        return None
+    left = deadline - time.perf_counter()
+    if left <= 0:
+        raise TimeoutError("note time budget exceeded")
+    return left
+
+
+class _Cues:
+    """Sorted (start, end) of one cue pattern's matches in a note."""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, pattern, text: str, deadline: Optional[float] = None):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        if pattern is not None:
+            # user-written patterns: a deadline bounds any backtracking
+            for m in pattern.finditer(text, timeout=time_left(deadline)):
+                self.starts.append(m.start())
+                self.ends.append(m.end())
+
+    def count(self, lo: int, hi: int) -> int:
+        """Cues lying entirely inside [lo, hi)."""
+        # finditer matches don't overlap, so starts and ends are both sorted
+        return max(0, bisect_right(self.ends, hi) - bisect_left(self.starts, lo))
+
+
+class CueIndex:
+    """
+    Negation cues, dosage units and dose forms of one note, each located with a
+    single ``finditer`` pass; per-span queries are then two bisections.
+
+    Replaces re-slicing and re-searching a window for every match:
+    O(note + matches * log cues) instead of O(matches * window * patterns).
+    A cue counts for a span when it lies entirely inside the span's window.
+    With a ``deadline`` each scan raises ``TimeoutError`` once it is reached.
+    """
+
+    def __init__(self, text: str, negation_re, cfg: ContextCfg, deadline: Optional[float] = None):
+        self.n = len(text)
+        self.text = text
+        self.negation_re = negation_re
+        self.deadline = deadline
+        dose, form = _cue_patterns(cfg.dosage_units, cfg.forms)
+        self.dose = _Cues(dose, text, deadline)
+        self.form = _Cues(form, text, deadline)
+
+    @cached_property
+    def negation(self) -> _Cues:
+        # located on first use: notes only checked for context never need it
+        return _Cues(self.negation_re, self.text, self.deadline)
+
+    def has_context(self) -> bool:
+        """Any dosage unit or dose form anywhere in the note."""
+        return bool(self.dose.starts or self.form.starts)
+
+    def negated(self, start: int, end: int, window: int) -> bool:
+        return self.negation.count(max(0, start - window), min(self.n, end + window)) > 0
+
+    def score(self, start: int, end: int, window: int = CONTEXT_WINDOW) -> int:
+        """Dosage-unit + dose-form cues near the span (``context_score`` semantics)."""
+        lo, hi = max(0, start - window), min(self.n, end + window)
+        return self.dose.count(lo, hi) + self.form.count(lo, hi)
@@ -0,0 +1,57 @@
+# src/medlex/csvio.py
+"""
+Plain CSV/TSV in and out with the standard library ``csv`` module.
+
+The CLI takes this path for a whole (not streamed) CSV/TSV input written as
+CSV: the shape of the small batches an ETL job shells out for, where the
+interpreter and its imports are most of the wall clock. Nothing here imports
+pandas; the output is the same bytes the pandas path writes (the dialect of
+``DataFrame.to_csv``, as in ``extsort``).
+
+Input: a header row naming ``note_id`` (integers) and ``text``; other columns
+are ignored, blank lines skipped and missing trailing fields read as empty.
+"""
+
+from __future__ import annotations
+
+import csv
+from typing import IO, Iterable, List, Sequence, Tuple
+
+REQUIRED = ("note_id", "text")
+
+
+def read_csv_notes(path: str, sep: str = ",") -> Tuple[List[int], List[str]]:
+    """(note_ids, texts) from a CSV/TSV file, in file order."""
+    note_ids: List[int] = []
+    texts: List[str] = []
+    # utf-8-sig: a BOM left by spreadsheet exports is not part of the first name
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        reader = csv.reader(fh, delimiter=sep)
+        header = next(reader, [])
+        for col in REQUIRED:
+            if col not in header:
+                raise SystemExit(
+                    f"Input must contain columns: {', '.join(REQUIRED)} (missing: {col})"
+                )
+        id_idx, text_idx = header.index("note_id"), header.index("text")
+        width = max(id_idx, text_idx) + 1
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            try:
+                note_ids.append(int(row[id_idx]))
+            except ValueError:
+                raise SystemExit(
+                    f"note_id must be an integer (line {reader.line_num}: {row[id_idx]!r})"
+                ) from None
+            texts.append(row[text_idx])
+    return note_ids, texts
+
+
+def write_csv_rows(out: IO[str], header: Sequence[str], rows: Iterable[Sequence]) -> None:
+    """``header`` then ``rows``, quoted and terminated like ``DataFrame.to_csv``."""
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(header)
+    writer.writerows(rows)
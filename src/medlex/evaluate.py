@@ -0,0 +1,376 @@
+# src/medlex/evaluate.py
+"""
+``medlex eval``: precision / recall against note-level labels, swept over
+fuzzy thresholds and guard settings.
+
+Candidate generation runs once. Every exact hit, every fuzzy token whose best
+score against some target clears the lowest threshold in the sweep, and every
+phonetic hit is kept with its raw score, context_score and negation, plus
+the fuzzy candidates each phonetic one overlaps (a fuzzy hit that is
+accepted claims the token first). Each setting is then a handful of NumPy
+masks over that table, so a sweep of 50 settings costs about one pipeline
+run rather than 50.
+
+A setting is:
+
+  fuzzy     threshold for every target with ``fuzzy:`` in the YAML, or off
+  phonetic  minimum context_score for a phonetic hit (the pipeline uses 1),
+            or off
+  negation  on: negated hits do not set the flag (the pipeline); off: they do
+
+At ``fuzzy`` = the YAML threshold, ``phonetic`` = 1 and ``negation`` = on,
+predictions are exactly the pipeline's has_* flags.
+
+Labels: a CSV/TSV with ``note_id`` and one 0/1 column per target, named by its
+canonical (``METFORMIN``) or flag (``has_metformin``); only labelled notes
+are scored. Output: one row per (setting, target) with tp/fp/fn/tn,
+precision, recall and f1, plus a micro-averaged ``ALL`` row per setting.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .context import CueIndex
+from .matchers import FuzzyIndex
+from .pipeline import _overlaps, _term_hits
+from .preprocess import normalize
+
+STAGES = ("exact", "fuzzy", "phonetic")
+DEFAULT_FUZZY = ["off", *range(70, 101, 2)]
+DEFAULT_PHONETIC = ["off", 0, 1, 2]
+DEFAULT_NEGATION = ["on"]
+
+
+@dataclass
+class Candidates:
+    """
+    Every candidate hit of a corpus, before thresholds and guards.
+
+    ``frame`` columns: row, target (index into ``targets``), stage (index
+    into ``STAGES``), start, end, score (exact 100, fuzzy ratio, phonetic 80),
+    context_score, negated. ``blocks`` pairs (phonetic, fuzzy) frame
+    positions whose spans overlap.
+    """
+
+    n_rows: int
+    targets: List[str]
+    frame: pd.DataFrame
+    blocks: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+
+def _floor_index(fz: FuzzyIndex, floor: int) -> FuzzyIndex:
+    """``fz``'s variants with every threshold lowered to ``floor``."""
+    return FuzzyIndex((c, [v], floor) for c, v in zip(fz.canons, fz.variants))
+
+
+def generate_candidates(
+    texts: Sequence[str], ctx, bank, ph_bank=None, fz=None, fuzzy_floor: Optional[int] = None
+) -> Candidates:
+    """
+    Candidate table for ``texts``. Fuzzy candidates are kept down to
+    ``fuzzy_floor`` (None: no fuzzy stage); phonetic ones regardless of
+    context, so any guard setting can be applied afterwards. Notes are
+    normalized as in the pipeline; start / end index the normalized text.
+    """
+    targets = list(bank)
+    tid = {c: i for i, c in enumerate(targets)}
+    cols: Dict[str, list] = {
+        k: []
+        for k in ("row", "target", "stage", "start", "end", "score", "context_score", "negated")
+    }
+    blocks: List[tuple] = []
+
+    texts = [normalize(t).text for t in texts]
+    ffz = _floor_index(fz, fuzzy_floor) if fz and fuzzy_floor is not None else None
+    # one matrix call for the distinct tokens of the whole corpus
+    scores = ffz.match(set().union(*(ffz.tokens(t) for t in texts))) if ffz else {}
+
+    def add(row, cues, canon, stage, start, end, score):
+        cols["row"].append(row)
+        cols["target"].append(tid[canon])
+        cols["stage"].append(stage)
+        cols["start"].append(start)
+        cols["end"].append(end)
+        cols["score"].append(score)
+        cols["context_score"].append(cues.score(start, end))
+        cols["negated"].append(cues.negated(start, end, ctx.window))
+        return len(cols["row"]) - 1
+
+    for row, text in enumerate(texts):
+        cues = CueIndex(text, ctx.negation_re, ctx.context)
+        taken = []
+        for canon, s, e in _term_hits(text, bank):
+            add(row, cues, canon, 0, s, e, 100.0)
+            taken.append((s, e))
+        fuzzy_here = []  # (start, end, frame position)
+        if scores:
+            for m in ffz.token_re.finditer(text):
+                scored = scores.get(m.group(0))
+                if not scored or _overlaps(m.start(), m.end(), taken):
+                    continue
+                for canon, _, score in scored:
+                    fuzzy_here.append(
+                        (m.start(), m.end(), add(row, cues, canon, 1, m.start(), m.end(), score))
+                    )
+        if ph_bank:
+            for h in ph_bank.scan(text):
+                if _overlaps(h.start, h.end, taken):
+                    continue
+                i = add(row, cues, h.canonical, 2, h.start, h.end, float(h.score))
+                blocks.extend((i, j) for s, e, j in fuzzy_here if h.start < e and s < h.end)
+
+    frame = pd.DataFrame(
+        {
+            "row": np.asarray(cols["row"], dtype=np.int64),
+            "target": np.asarray(cols["target"], dtype=np.int32),
+            "stage": np.asarray(cols["stage"], dtype=np.int8),
+            "start": np.asarray(cols["start"], dtype=np.int64),
+            "end": np.asarray(cols["end"], dtype=np.int64),
+            "score": np.asarray(cols["score"], dtype=np.float32),
+            "context_score": np.asarray(cols["context_score"], dtype=np.int32),
+            "negated": np.asarray(cols["negated"], dtype=bool),
+        }
+    )
+    return Candidates(len(texts), targets, frame, np.asarray(blocks, dtype=np.int64).reshape(-1, 2))
+
+
+def predict(
+    cands: Candidates,
+    fuzzy: Optional[float] = None,
+    phonetic: Optional[int] = None,
+    negation: bool = True,
+) -> np.ndarray:
+    """
+    (n_rows, n_targets) bool flags for one setting; ``None`` switches a stage
+    off. Fuzzy thresholds below the ``fuzzy_floor`` the candidates were
+    generated with miss the tokens scoring between the two.
+    """
+    f = cands.frame
+    stage = f["stage"].to_numpy()
+    accept = stage == 0
+    if fuzzy is not None:
+        accept |= (stage == 1) & (f["score"].to_numpy() >= fuzzy)
+    if phonetic is not None:
+        ph = (stage == 2) & (f["context_score"].to_numpy() >= phonetic)
+        if len(cands.blocks):
+            # a phonetic hit on a token an accepted fuzzy hit already claimed
+            blocked = np.zeros(len(f), dtype=bool)
+            ph_i, fz_i = cands.blocks[:, 0], cands.blocks[:, 1]
+            blocked[ph_i[accept[fz_i]]] = True
+            ph &= ~blocked
+        accept |= ph
+    if negation:
+        accept &= ~f["negated"].to_numpy()
+    n_targets = len(cands.targets)
+    flags = np.zeros(cands.n_rows * n_targets, dtype=bool)
+    flags[(f["row"].to_numpy() * n_targets + f["target"].to_numpy())[accept]] = True
+    return flags.reshape(cands.n_rows, n_targets)
+
+
+def _metrics(pred: np.ndarray, gold: np.ndarray) -> Dict[str, np.ndarray]:
+    tp = (pred & gold).sum(axis=0)
+    fp = (pred & ~gold).sum(axis=0)
+    fn = (~pred & gold).sum(axis=0)
+    tn = (~pred & ~gold).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {
+        "tp": tp,
+        "fp": fp,
+        "fn": fn,
+        "tn": tn,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+    }
+
+
+def sweep(
+    cands: Candidates,
+    gold: np.ndarray,
+    fuzzy: Sequence[Optional[float]] = (None,),
+    phonetic: Sequence[Optional[int]] = (1,),
+    negation: Sequence[bool] = (True,),
+    targets: Optional[Sequence[int]] = None,
+) -> pd.DataFrame:
+    """
+    P/R/F1 per (setting, target) over the grid ``fuzzy x phonetic x negation``.
+    ``gold`` is (n_rows, len(targets)) bool, its columns the candidate
+    targets listed in ``targets`` (default: all of them).
+    """
+    cols = np.arange(len(cands.targets)) if targets is None else np.asarray(targets)
+    names = [cands.targets[i] for i in cols]
+    parts = []
+    for f, p, n in itertools.product(fuzzy, phonetic, negation):
+        pred = predict(cands, f, p, n)[:, cols]
+        m = _metrics(pred, gold)
+        micro = _metrics(pred.reshape(-1, 1), gold.reshape(-1, 1))
+        block = pd.DataFrame({k: np.concatenate([v, micro[k]]) for k, v in m.items()})
+        block.insert(0, "target", [*names, "ALL"])
+        block.insert(0, "negation", "on" if n else "off")
+        block.insert(0, "phonetic", "off" if p is None else str(p))
+        block.insert(0, "fuzzy", "off" if f is None else f"{f:g}")
+        parts.append(block)
+    return pd.concat(parts, ignore_index=True)
+
+
+def read_labels(path: str, targets: Sequence[str]) -> pd.DataFrame:
+    """note_id-indexed 0/1 frame with one bool column per labelled target in ``targets``."""
+    from .cli import _resolve_sep
+
+    df = pd.read_csv(path, sep=_resolve_sep(path, "auto"))
+    if "note_id" not in df.columns:
+        raise SystemExit(f"{path}: labels need a note_id column")
+    by_name = {c.upper(): c for c in targets}
+    by_name.update({f"HAS_{c.upper()}": c for c in targets})
+    cols = {}
+    for col in df.columns.drop("note_id"):
+        canon = by_name.get(str(col).upper())
+        if canon is None:
+            print(f"labels: no target {col!r} in the YAML, ignored", file=sys.stderr)
+        else:
+            cols[canon] = df[col].fillna(0).astype(bool).to_numpy()
+    if not cols:
+        raise SystemExit(f"{path}: no label column names a target of the YAML")
+    return pd.DataFrame(cols, index=df["note_id"].to_numpy())
+
+
+def _read_notes(path_in: str, sep_arg: str) -> pd.DataFrame:
+    from .arrowio import detect_format
+    from .cli import DEFAULT_CHUNKSIZE, _read_table, _validate_columns
+    from .textio import TEXT_FORMATS, detect_text_format
+
+    in_format = detect_text_format(path_in) or detect_format(path_in)
+    if in_format in TEXT_FORMATS:
+        df = pd.concat(list(_read_table(path_in, sep_arg, DEFAULT_CHUNKSIZE, in_format)))
+    else:
+        df = _read_table(path_in, sep_arg, in_format=in_format)
+    _validate_columns(df)
+    return df
+
+
+def _grid_values(values: Sequence[str], kind, flag: str) -> List:
+    out = []
+    for v in values:
+        if v == "off":
+            out.append(None)
+            continue
+        try:
+            out.append(kind(v))
+        except ValueError:
+            raise SystemExit(f"{flag}: expected numbers or 'off', got {v!r}") from None
+    return out
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="medlex eval",
+        description="Precision/recall against labels, swept over fuzzy thresholds and guards",
+    )
+    p.add_argument("--in", dest="path_in", required=True, help="Notes (as for medlex --in)")
+    p.add_argument(
+        "--labels", required=True, help="CSV/TSV: note_id plus one 0/1 column per target"
+    )
+    p.add_argument("--targets", required=True, help="YAML targets config")
+    p.add_argument("--out", dest="out_path", default="-", help="Curves CSV (use '-' for stdout)")
+    p.add_argument(
+        "--sep", dest="sep", default="auto", choices=["auto", "csv", "tsv"], help="Input delimiter"
+    )
+    p.add_argument(
+        "--fuzzy",
+        nargs="+",
+        default=[str(v) for v in DEFAULT_FUZZY],
+        metavar="T",
+        help="Fuzzy thresholds to sweep ('off' disables the stage; default: off 70 72 .. 100)",
+    )
+    p.add_argument(
+        "--phonetic",
+        nargs="+",
+        default=[str(v) for v in DEFAULT_PHONETIC],
+        metavar="N",
+        help="Minimum context_score for phonetic hits "
+        "('off' disables the stage; default: off 0 1 2)",
+    )
+    p.add_argument(
+        "--negation",
+        nargs="+",
+        default=DEFAULT_NEGATION,
+        choices=["on", "off"],
+        help="Whether negated hits are dropped (default: on)",
+    )
+    p.add_argument(
+        "--candidates", default=None, metavar="PATH", help="Also write the candidate table (CSV)"
+    )
+    p.add_argument("--no-bank-cache", dest="bank_cache", action="store_false")
+    return p
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .bankcache import load_variant_bank
+
+    a = _build_parser().parse_args(argv)
+    fuzzy = _grid_values(a.fuzzy, float, "--fuzzy")
+    phonetic = _grid_values(a.phonetic, int, "--phonetic")
+    negation = [v == "on" for v in dict.fromkeys(a.negation)]
+
+    ctx, bank, ph_bank, fz = load_variant_bank(a.targets, use_cache=a.bank_cache)
+    labels = read_labels(a.labels, list(bank))
+    notes = _read_notes(a.path_in, a.sep)
+    notes = notes[notes["note_id"].isin(labels.index)].drop_duplicates("note_id")
+    missing = len(labels) - len(notes)
+    if missing:
+        print(f"labels: {missing} labelled notes not in the input, ignored", file=sys.stderr)
+    labels = labels.loc[notes["note_id"].to_numpy()]
+
+    t0 = time.perf_counter()
+    floors = [f for f in fuzzy if f is not None]
+    cands = generate_candidates(
+        notes["text"].fillna("").astype(str).tolist(),
+        ctx,
+        bank,
+        ph_bank if any(p is not None for p in phonetic) else None,
+        fz,
+        fuzzy_floor=int(min(floors)) if floors else None,
+    )
+    t1 = time.perf_counter()
+    targets = [cands.targets.index(c) for c in labels.columns]
+    curves = sweep(cands, labels.to_numpy(), fuzzy, phonetic, negation, targets)
+    t2 = time.perf_counter()
+
+    curves.to_csv(sys.stdout if a.out_path in (None, "-") else a.out_path, index=False)
+    if a.candidates:
+        frame = cands.frame.assign(
+            note_id=notes["note_id"].to_numpy()[cands.frame["row"].to_numpy()],
+            target=np.asarray(cands.targets, dtype=object)[cands.frame["target"].to_numpy()],
+            stage=np.asarray(STAGES, dtype=object)[cands.frame["stage"].to_numpy()],
+        ).drop(columns="row")
+        frame.to_csv(a.candidates, index=False)
+
+    n_settings = len(curves) // (len(targets) + 1)
+    print(
+        f"{len(notes)} notes, {len(cands)} candidates in {t1 - t0:.2f}s; "
+        f"{n_settings} settings in {t2 - t1:.2f}s",
+        file=sys.stderr,
+    )
+    setting = ["fuzzy", "phonetic", "negation"]
+    for target, rows in curves.groupby("target", sort=False):
+        best = rows.loc[rows["f1"].idxmax()]
+        print(
+            f"best {target}: f1={best['f1']:.3f} (P={best['precision']:.3f} R={best['recall']:.3f})"
+            " at " + " ".join(f"{k}={best[k]}" for k in setting),
+            file=sys.stderr,
+        )
@@ -0,0 +1,71 @@
+# src/medlex/extsort.py
+"""
+External merge sort for CSV output that does not fit in memory.
+
+Each chunk is sorted in memory and written as a "run" file; the runs are then
+k-way merged row by row, so peak memory is one chunk plus one row per run.
+"""
+
+from __future__ import annotations
+
+import csv
+import heapq
+import os
+import tempfile
+from typing import IO, Callable, Iterator, List, Optional
+
+
+class RunWriter:
+    """Collects sorted runs in a temporary directory; use as a context manager."""
+
+    def __init__(self, key: str, dir: Optional[str] = None):
+        self.key = key
+        self._tmp = tempfile.TemporaryDirectory(prefix="medlex-runs-", dir=dir)
+        self.paths: List[str] = []
+
+    def add(self, df) -> None:
+        """Sort ``df`` by the key column and write it as a new run."""
+        if len(df) == 0:
+            return
+        path = os.path.join(self._tmp.name, f"run-{len(self.paths):06d}.csv")
+        df.sort_values(self.key, kind="stable").to_csv(path, index=False)
+        self.paths.append(path)
+
+    def merge_into(self, out: IO[str], key_type: Callable = int) -> None:
+        merge_runs(self.paths, out, self.key, key_type)
+
+    def close(self) -> None:
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_run(path: str, key_idx: int, key_type: Callable) -> Iterator[tuple]:
+    with open(path, newline="", encoding="utf-8") as fh:
+        reader = csv.reader(fh)
+        next(reader)  # header
+        for row in reader:
+            yield key_type(row[key_idx]), row
+
+
+def merge_runs(paths: List[str], out: IO[str], key: str, key_type: Callable = int) -> None:
+    """
+    Merge sorted CSV runs (same header) into ``out``. Ties keep run order, so
+    merging runs written in input order is a stable sort of the whole input.
+    """
+    if not paths:
+        return
+    with open(paths[0], newline="", encoding="utf-8") as fh:
+        header = next(csv.reader(fh))
+    key_idx = header.index(key)
+
+    # Same dialect as pandas' to_csv, so output matches a single in-memory write
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(header)
+    runs = [_read_run(p, key_idx, key_type) for p in paths]
+    for _, row in heapq.merge(*runs, key=lambda kr: kr[0]):
+        writer.writerow(row)
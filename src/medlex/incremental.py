@@ -0,0 +1,152 @@
+# src/medlex/incremental.py
+"""
+Incremental re-runs over a corpus that mostly does not change.
+
+``IncrementalState`` keeps, in ``STATE_DIR/state.sqlite``, each note_id's
+text hash and hits from the previous run, plus the config hash and
+``RESULTS_FORMAT`` they were computed with. A run only matches notes that are
+new or whose text changed; everything else is rebuilt from the stored hits,
+so the output is still the complete result for the input. A different YAML,
+medlex version or results format drops every stored note, so the output
+never mixes hits from old and new matching code. Notes missing from the input
+are removed from the state at the end of a successful run: the input is
+taken to be the whole current corpus.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+from array import array
+from typing import Callable, List, Optional, Sequence
+
+from .batch import BatchResult
+from .pipeline import RESULTS_FORMAT
+
+# ids per SELECT ... IN (...) (SQLite's default variable limit is 999+)
+_QUERY_IDS = 500
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class IncrementalState:
+    def __init__(self, state_dir: str, config_hash: str):
+        os.makedirs(state_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(state_dir, "state.sqlite"))
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS notes (
+                note_id INTEGER PRIMARY KEY, text_hash BLOB NOT NULL, hits TEXT NOT NULL
+            );
+            CREATE TEMP TABLE seen (note_id INTEGER PRIMARY KEY);
+            """
+        )
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        # a state written before results_format was stored lacks the key: reprocessed
+        want = {"config_hash": config_hash, "results_format": str(RESULTS_FORMAT)}
+        self.config_changed = bool(meta) and any(meta.get(k) != v for k, v in want.items())
+        if not meta or self.config_changed:
+            self._db.execute("DELETE FROM notes")
+            self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", want.items())
+            self._db.commit()
+        self.counts = dict.fromkeys(("new", "changed", "unchanged", "removed"), 0)
+
+    def lookup(self, note_ids: Sequence[int], texts: Sequence[str]):
+        """(text hashes, stored hits or None per note); counts new/changed/unchanged."""
+        hashes = [text_hash(t) for t in texts]
+        prev = {}
+        uniq = list(dict.fromkeys(note_ids))
+        for i in range(0, len(uniq), _QUERY_IDS):
+            part = uniq[i : i + _QUERY_IDS]
+            q = "SELECT note_id, text_hash, hits FROM notes WHERE note_id IN (%s)" % ",".join(
+                "?" * len(part)
+            )
+            prev.update((r[0], r[1:]) for r in self._db.execute(q, part))
+        self._db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((i,) for i in uniq))
+
+        stored: List[Optional[list]] = []
+        for nid, h in zip(note_ids, hashes):
+            old = prev.get(nid)
+            if old is None:
+                self.counts["new"] += 1
+                stored.append(None)
+            elif old[0] != h:
+                self.counts["changed"] += 1
+                stored.append(None)
+            else:
+                self.counts["unchanged"] += 1
+                stored.append([tuple(x) for x in json.loads(old[1])])
+        return hashes, stored
+
+    def store(self, note_ids: Sequence[int], hashes: Sequence[bytes], hits: Sequence[list]):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO notes VALUES (?, ?, ?)",
+            (
+                (nid, h, json.dumps(x, ensure_ascii=False))
+                for nid, h, x in zip(note_ids, hashes, hits)
+            ),
+        )
+        self._db.commit()
+
+    def run(
+        self,
+        note_ids: Sequence[int],
+        texts: List[str],
+        runner: Callable,
+        flag_keys: List[str],
+        stats=None,
+    ) -> BatchResult:
+        """
+        ``runner(texts, stats)`` (``process_batch`` or ``WorkerPool.process``)
+        over the new/changed notes only; the result covers every note.
+        """
+        hashes, stored = self.lookup(note_ids, texts)
+        todo = [i for i, hits in enumerate(stored) if hits is None]
+        if stats is not None:
+            stats.count("incremental.skipped", len(texts) - len(todo))
+        if not todo:
+            return BatchResult.from_hits(texts, stored, flag_keys)
+        res = runner([texts[i] for i in todo], stats)
+        fresh = res.row_hits()
+        # notes cut short by a time budget are retried next run, not remembered
+        keep = [j for j, st in enumerate(res.status) if st == 0]
+        self.store(
+            [note_ids[todo[j]] for j in keep],
+            [hashes[todo[j]] for j in keep],
+            [fresh[j] for j in keep],
+        )
+        if len(todo) == len(texts):
+            return res
+        status = array("b", bytes(len(texts)))
+        for i, hits, st in zip(todo, fresh, res.status):
+            stored[i] = hits
+            status[i] = st
+        return BatchResult.from_hits(texts, stored, flag_keys, status)
+
+    def finish(self) -> None:
+        """Drop notes that were not in this run's input; call after a successful run."""
+        cur = self._db.execute("DELETE FROM notes WHERE note_id NOT IN (SELECT note_id FROM seen)")
+        self.counts["removed"] = cur.rowcount
+        self._db.commit()
+
+    def summary(self) -> str:
+        c = self.counts
+        msg = (
+            f"incremental: {c['new']} new, {c['changed']} changed, "
+            f"{c['unchanged']} unchanged, {c['removed']} removed"
+        )
+        return msg + (" (config changed: all notes reprocessed)" if self.config_changed else "")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
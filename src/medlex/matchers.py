@@ -1,10 +1,13 @@
+from array import array
 from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
 import regex as re
-from rapidfuzz import fuzz
-from .preprocess import metaphone_encode_window
+from .preprocess import clean_text, metaphone_codes, metaphone_encode_window
+from .targets import expand_phonetic
 
 
-@dataclass
+@dataclass(slots=True)
 class Hit:
     canonical: str
     variant: str
@@ -22,6 +25,8 @@ def scan_exact(text: str, variant: str, canonical: str) -> list[Hit]:
 
 def scan_fuzzy(text: str, variant: str, canonical: str, thresh: int) -> list[Hit]:
     # heuristic: look for substrings starting with first 3 chars
+    from rapidfuzz import fuzz
+
     hits = []
     stub = re.escape(variant[:3])
     for m in re.finditer(rf"{stub}\w{{0,12}}", text):
@@ -42,3 +47,183 @@ def scan_phonetic(text: str, ph_variant: str, canonical: str) -> list[Hit]:
         if code in phs:
             hits.append(Hit(canonical, ph_variant, 80, m.start(), m.end()))
     return hits
+
+
+# Shorter variants ("met", "ins", "metf") collide with everyday words under
+# edit distance, so they are left to exact matching.
+FUZZY_MIN_LEN = 5
+
+# Below this many token x variant pairs, ``FuzzyIndex.match`` scores token by
+# token instead of with one ``cdist`` matrix: a few milliseconds at most, and
+# a small CLI run never imports numpy (~60 ms)
+CDIST_MIN_PAIRS = 50_000
+
+
+class FuzzyIndex:
+    """
+    Every fuzzy-enabled variant, scored against note tokens in one matrix call.
+
+    Built once per bank from (canonical, terms, threshold) triples; ``match``
+    takes the distinct tokens of a note (or of a whole batch) and runs a single
+    ``rapidfuzz.process.cdist`` against all variants, with the lowest target
+    threshold as ``score_cutoff``.
+    """
+
+    def __init__(self, targets: Iterable[Tuple[str, List[str], int]]):
+        self.variants: List[str] = []
+        self.canons: List[str] = []
+        self.thresholds: List[int] = []
+        seen = set()
+        for canon, terms, thresh in targets:
+            for t in terms:
+                v = clean_text(str(t))
+                if len(v) < FUZZY_MIN_LEN or not v.isalpha() or (canon, v) in seen:
+                    continue
+                seen.add((canon, v))
+                self.variants.append(v)
+                self.canons.append(canon)
+                self.thresholds.append(int(thresh))
+        self.cutoff = min(self.thresholds, default=100)
+        # Only tokens whose length could reach the cutoff against some variant:
+        # ratio = 2*min(l, L) / (l + L), so l >= L*c/(2-c) and l <= L*(2-c)/c.
+        c = self.cutoff / 100
+        lens = [len(v) for v in self.variants] or [FUZZY_MIN_LEN]
+        self.min_len = max(FUZZY_MIN_LEN - 1, int(min(lens) * c / (2 - c)))
+        self.max_len = int(max(lens) * (2 - c) / c) + 1
+        self.token_re = re.compile(r"(?<!\w)[^\W\d_]{%d,%d}(?!\w)" % (self.min_len, self.max_len))
+        self.stub_re = self._stub_pattern()
+
+    def _stub_pattern(self):
+        """
+        Pattern for the stubs of every variant, or None when some variant has none.
+
+        A token scoring ``t`` against a variant of length L is at most
+        d = (100 - t) * (l + L) // 100 insertions/deletions away from it, with l
+        the longest token that can still reach ``t``. Each edit breaks at most one
+        of d + 1 disjoint pieces of the variant, so one piece survives intact in
+        any matching token: a note containing none of the pieces cannot match.
+        """
+        stubs = set()
+        for v, t in zip(self.variants, self.thresholds):
+            n = len(v)
+            if t <= 0:
+                return None
+            d = (100 - t) * (n * (200 - t) // t + n) // 100
+            k = d + 1
+            if k > n:
+                return None
+            cuts = [i * n // k for i in range(k + 1)]
+            stubs.update(v[a:b] for a, b in zip(cuts, cuts[1:]))
+        if not stubs:
+            return None
+        return re.compile(r"\L<stubs>", stubs=sorted(stubs))
+
+    def __bool__(self) -> bool:
+        return bool(self.variants)
+
+    def may_match(self, text: str) -> bool:
+        """
+        False only if no token of ``text`` can clear any threshold (stub check).
+        ``text`` here and below is a normalized note (``preprocess.normalize``).
+        """
+        return self.stub_re is None or self.stub_re.search(text) is not None
+
+    def tokens(self, text: str) -> set:
+        """Distinct candidate tokens in ``text``."""
+        return {m.group(0) for m in self.token_re.finditer(text)}
+
+    def match(self, tokens: Iterable[str]) -> Dict[str, List[Tuple[str, str, float]]]:
+        """
+        token -> [(canonical, best variant, score)] for tokens that clear some
+        target's threshold; tokens with no match are absent.
+        """
+        toks = list(tokens)
+        if not toks or not self.variants:
+            return {}
+        if len(toks) * len(self.variants) < CDIST_MIN_PAIRS:
+            return self._match_each(toks)
+        import numpy as np
+        from rapidfuzz import fuzz, process
+
+        scores = process.cdist(
+            toks, self.variants, scorer=fuzz.ratio, score_cutoff=self.cutoff, dtype=np.float32
+        )
+        ok = scores >= np.asarray(self.thresholds, dtype=np.float32)
+        out: Dict[str, List[Tuple[str, str, float]]] = {}
+        for i in np.flatnonzero(ok.any(axis=1)):
+            best: Dict[str, Tuple[str, str, float]] = {}
+            for j in np.flatnonzero(ok[i]):
+                canon, score = self.canons[j], float(scores[i, j])
+                if canon not in best or score > best[canon][2]:
+                    best[canon] = (canon, self.variants[j], score)
+            out[toks[i]] = list(best.values())
+        return out
+
+    def _match_each(self, toks: List[str]) -> Dict[str, List[Tuple[str, str, float]]]:
+        """``match`` one token at a time: same scores (as float32), no numpy."""
+        from rapidfuzz import fuzz, process
+
+        out: Dict[str, List[Tuple[str, str, float]]] = {}
+        for tok in toks:
+            found = process.extract(
+                tok, self.variants, scorer=fuzz.ratio, score_cutoff=self.cutoff, limit=None
+            )
+            best: Dict[str, Tuple[str, str, float]] = {}
+            # variant order, as the matrix path visits them
+            for _, score, j in sorted(found, key=lambda r: r[2]):
+                score = array("f", [score])[0]
+                if score < self.thresholds[j]:
+                    continue
+                canon = self.canons[j]
+                if canon not in best or score > best[canon][2]:
+                    best[canon] = (canon, self.variants[j], score)
+            if best:
+                out[tok] = list(best.values())
+        return out
+
+    def scan(self, text: str, scores: Dict[str, List[Tuple[str, str, float]]]) -> List[Hit]:
+        """Hits for every candidate token in ``text`` found in ``scores``."""
+        hits = []
+        for m in self.token_re.finditer(text):
+            for canon, variant, score in scores.get(m.group(0), ()):
+                hits.append(Hit(canon, variant, round(score), m.start(), m.end()))
+        return hits
+
+
+# Same reasoning for phonetic codes: short tokens share codes with too many words.
+PHONETIC_MIN_LEN = 5
+
+
+class PhoneticIndex(dict):
+    """
+    ``ph_<code>`` -> canonicals, built once from ``generate_phonetic`` targets.
+
+    Each note token is encoded once (``metaphone_codes`` is memoized) and looked
+    up here, so the cost per token does not depend on how many variants exist.
+    """
+
+    token_re = re.compile(r"(?<!\w)[^\W\d_]{%d,15}(?!\w)" % PHONETIC_MIN_LEN)
+
+    def __init__(self, targets: Iterable[Tuple[str, List[str]]] = ()):
+        super().__init__()
+        for canon, terms in targets:
+            for t in terms:
+                v = clean_text(str(t))
+                if len(v) < PHONETIC_MIN_LEN or not v.isalpha():
+                    continue
+                for code in sorted(expand_phonetic([v])):
+                    owners = self.setdefault(code, [])
+                    if canon not in owners:
+                        owners.append(canon)
+
+    def scan(self, text: str) -> List[Hit]:
+        """Hits for every token of the normalized ``text`` sharing a code with a variant."""
+        hits = []
+        for m in self.token_re.finditer(text):
+            seen = set()
+            for code in metaphone_codes(m.group(0)):
+                for canon in self.get(code, ()):
+                    if canon not in seen:
+                        seen.add(canon)
+                        hits.append(Hit(canon, code, 80, m.start(), m.end()))
+        return hits
@@ -0,0 +1,214 @@
+# src/medlex/parallel.py
+"""
+Multi-core batch processing.
+
+Each worker process loads the variant bank once, in its initializer, and
+keeps it for its lifetime; tasks only carry note texts and return columnar
+``BatchResult`` pieces, which are stitched back together in input order.
+"""
+
+from __future__ import annotations
+
+import os
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .bankcache import load_variant_bank
+from .batch import BatchResult, _as_texts, process_batch
+from .pipeline import SEGMENT_CHARS, _to_original
+from .preprocess import normalize
+from .resultcache import ResultCache
+from .segment import merge_segment_hits, plan_segments, segment_overlap
+from .stats import Stats
+
+# Per-process bank, result cache and time budget options, set by _init_worker
+_BANKS: Optional[tuple] = None
+_CACHE: Optional[ResultCache] = None
+_BUDGET: Dict[str, Any] = {}
+
+
+def _init_worker(
+    cfg_path: str,
+    use_cache: bool,
+    result_cache: Optional[dict],
+    budget: Dict[str, Any],
+    banks: Optional[tuple] = None,
+) -> None:
+    global _BANKS, _CACHE, _BUDGET
+    _BANKS = banks if banks is not None else load_variant_bank(cfg_path, use_cache=use_cache)
+    if result_cache is not None:
+        _CACHE = ResultCache(**result_cache)
+    _BUDGET = budget
+
+
+def _run(texts: List[Any], stats: Any = None) -> BatchResult:
+    ctx, bank, ph_bank, fz = _BANKS
+    res = process_batch(texts, ctx, bank, ph_bank, fz, stats=stats, cache=_CACHE, **_BUDGET)
+    if _CACHE is not None:
+        _CACHE.flush()  # workers are not closed cleanly; persist as we go
+    return res
+
+
+def _run_piece(texts: List[Any]) -> BatchResult:
+    # the parent holds the texts: send back spans only, ``process`` reattaches them
+    return _run(texts).detach()
+
+
+def _run_segment(text: str, share: float = 1.0) -> Tuple[List[tuple], int]:
+    # one slice of a long note: its hits (slice coordinates) and status, under
+    # ``share`` of the note's time budget
+    ctx, bank, ph_bank, fz = _BANKS
+    opts = dict(_BUDGET)
+    if opts.get("budget") is not None:
+        opts["budget"] *= share
+    res = process_batch([text], ctx, bank, ph_bank, fz, segment_chars=None, **opts)
+    return res.row_hits()[0], res.status[0]
+
+
+def _config_hash() -> Optional[str]:
+    return _BANKS[0].config_hash
+
+
+def _run_piece_stats(texts: List[Any]) -> Tuple[BatchResult, Dict[str, Any]]:
+    stats = Stats()
+    res = _run(texts, stats).detach()
+    return res, stats.to_dict()
+
+
+class WorkerPool:
+    """
+    Process pool with a warm bank per worker.
+
+    ``process(texts)`` splits the batch into pieces of at most ``piece_rows``
+    notes, fans them out, and returns one ``BatchResult`` identical to a serial
+    ``process_batch`` over the same texts. With ``stats``, each worker collects
+    its own counters and timers and they are added to ``stats``; timers summed
+    across workers are busy time, not wall time.
+
+    ``result_cache`` (``ResultCache`` keyword arguments, e.g. ``{"maxsize": ...,
+    "path": ...}``) gives every worker its own in-memory cache; with ``path``
+    they share one SQLite store. ``budget`` / ``degrade`` are passed on to
+    ``process_batch``.
+
+    A note longer than ``2 * segment_chars`` is split into overlapping segments
+    (``medlex.segment``) that run as separate tasks, so one huge note is spread
+    over the workers instead of holding one of them; a segment that runs out
+    of time budget marks the whole note. Each segment gets the share of the
+    note's ``budget`` that its own part is of the note's length, so the
+    segments together spend at most ``budget`` - as in one process, where
+    they share one deadline - however many workers they land on.
+
+    Each worker loads ``cfg_path`` when it starts, which may be well after the
+    pool is made. ``banks`` (as returned by ``build_variant_bank``) hands every
+    worker that bank instead, so the YAML is never read again and later edits
+    to it cannot reach the pool. ``mp_context`` is passed on to
+    ``ProcessPoolExecutor``.
+    """
+
+    def __init__(
+        self,
+        cfg_path: str,
+        workers: Optional[int] = None,
+        piece_rows: int = 2_000,
+        use_cache: bool = True,
+        result_cache: Optional[dict] = None,
+        budget: Optional[float] = None,
+        degrade: bool = True,
+        segment_chars: Optional[int] = SEGMENT_CHARS,
+        banks: Optional[tuple] = None,
+        mp_context: Any = None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.piece_rows = piece_rows
+        self.segment_chars = segment_chars
+        self._cfg = (cfg_path, use_cache)
+        self._banks: Optional[tuple] = banks  # parent's own copy, to plan segments
+        budget_opts = {"budget": budget, "degrade": degrade}
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(cfg_path, use_cache, result_cache, budget_opts, banks),
+        )
+
+    def config_hash(self) -> Optional[str]:
+        """``config_hash`` of the bank a worker runs (starting one if none has)."""
+        return self._pool.submit(_config_hash).result()
+
+    @property
+    def broken(self) -> bool:
+        """True once a worker died abruptly: the pool then fails every task."""
+        # ProcessPoolExecutor sets _broken as soon as it notices; no public flag
+        return bool(self._pool._broken)
+
+    def process(self, texts: Sequence[Any], stats: Any = None) -> BatchResult:
+        texts = list(texts)
+        if self.segment_chars:
+            limit = 2 * self.segment_chars
+            long = [i for i, t in enumerate(texts) if isinstance(t, str) and len(t) > limit]
+            if long:
+                return self._process_long(texts, long, stats)
+        if not texts:
+            return self._pool.submit(_run, []).result()
+        # Enough pieces to keep every worker busy, none larger than piece_rows
+        size = min(self.piece_rows, max(1, -(-len(texts) // (self.workers * 4))))
+        pieces = [texts[i : i + size] for i in range(0, len(texts), size)]
+        # Executor.map yields in submission order, so output order is deterministic
+        if stats is None:
+            return BatchResult.concat(self._pool.map(_run_piece, pieces), texts)
+        parts = []
+        for res, piece_stats in self._pool.map(_run_piece_stats, pieces):
+            parts.append(res)
+            # replayed through count/add_time so any stats hook works, not just Stats
+            for k, v in piece_stats["counters"].items():
+                stats.count(k, v)
+            for k, v in piece_stats["timers_s"].items():
+                stats.add_time(k, v)
+        return BatchResult.concat(parts, texts)
+
+    def _process_long(self, texts: List[Any], long: List[int], stats: Any) -> BatchResult:
+        if self._banks is None:
+            cfg_path, use_cache = self._cfg
+            self._banks = load_variant_bank(cfg_path, use_cache=use_cache)
+        ctx, bank, _, fz = self._banks
+        overlap = segment_overlap(ctx, bank, fz)
+        plans, pending = {}, {}
+        norms = {}
+        for i in long:
+            # planned on the normalized note, the text every stage sees
+            norms[i] = norm = normalize(texts[i])
+            plans[i] = plan_segments(norm.text, self.segment_chars, overlap)
+            n = len(norm.text)
+            pending[i] = [
+                self._pool.submit(_run_segment, norm.text[slo:shi], (hi - lo) / n)
+                for lo, hi, slo, shi in plans[i]
+            ]
+        # the other notes run alongside, with the long ones blanked out
+        rest = list(texts)
+        for i in long:
+            rest[i] = ""
+        res = self.process(rest, stats)
+        hits = res.row_hits()
+        status = array("b", res.status)
+        for i in long:
+            parts = [f.result() for f in pending[i]]
+            merged = merge_segment_hits([p[0] for p in parts], plans[i], bank)
+            hits[i] = _to_original(norms[i], merged)
+            status[i] = max(p[1] for p in parts)
+        if stats is not None:
+            stats.count("segments", sum(len(p) for p in plans.values()))
+        return BatchResult.from_hits(_as_texts(texts), hits, list(res.flags), status)
+
+    def submit(self, texts: Sequence[Any]) -> "Future[BatchResult]":
+        """One piece, unsplit, on the next free worker (for callers batching themselves)."""
+        return self._pool.submit(_run, list(texts))
+
+    def close(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,11 +1,22 @@
 # src/medlex/pipeline.py
 from __future__ import annotations
 
+import hashlib
 import re
+import time
+from itertools import groupby
+from operator import itemgetter
+
+import regex
 from dataclasses import asdict, is_dataclass
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
 
-from .config import load_config  # existing loader
+from . import __version__
+from .config import Defaults, load_config  # existing loader
+from .context import CONTEXT_WINDOW, ContextCfg, CueIndex, time_left
+from .matchers import FuzzyIndex, PhoneticIndex
+from .preprocess import Normalized, clean_text, normalize
+from .stats import lap
 
 
 # ---------- small helpers ----------
@@ -44,27 +55,284 @@ def _get(obj: Any, key: str, default=None):
 
 # ---------- core compile logic ----------
 
+# characters of surrounding text kept with each span
+CONTEXT_PAD = 30
+# notes over twice this many characters are matched as overlapping segments
+SEGMENT_CHARS = 20_000
+
 
 class Ctx:
-    def __init__(self, negation_re: re.Pattern, window: int = 40):
+    def __init__(
+        self,
+        negation_re: re.Pattern,
+        window: int = 40,
+        context: Optional[ContextCfg] = None,
+        config_hash: Optional[str] = None,
+    ):
         self.negation_re = negation_re
         self.window = window
+        # dosage units / dose forms that count as medication context
+        if context is None:
+            d = Defaults()
+            context = ContextCfg(d.dosage_units, d.forms, [])
+        self.context = context
+        # identifies the YAML (and library version) this bank was built from
+        self.config_hash = config_hash
 
 
-def _compile_term_regex(terms: List[str]) -> re.Pattern:
-    safe = [re.escape(t) for t in terms if t and str(t).strip()]
+# Bump whenever the hits for an unchanged YAML and note change (matching,
+# normalization, tie-breaking): everything keyed on ``config_hash`` - the result
+# cache, incremental state, checkpoints - then stops reusing older results.
+RESULTS_FORMAT = 3
+
+
+def config_hash(cfg_path: str) -> str:
+    """
+    sha256 of the YAML bytes plus the medlex version and ``RESULTS_FORMAT``:
+    changes whenever results may.
+    """
+    h = hashlib.sha256(f"{__version__}\0{RESULTS_FORMAT}\0".encode())
+    with open(cfg_path, "rb") as fh:
+        h.update(fh.read())
+    return h.hexdigest()
+
+
+def _factor_terms(terms: List[str]) -> str:
+    """
+    Regex source for an alternation of ``terms`` factored into a prefix trie.
+
+    `re` tries a flat alternation one branch at a time, so with thousands of terms
+    every position pays for every term. Sharing prefixes keeps that cost to the
+    length of the longest match. Branches only compete at a position when one term
+    is a prefix of another, so order is kept around every term that ends at a node
+    (the "" branch) and the first-listed preference of the flat form is unchanged.
+    """
+    parts: List[str] = []
+    groups: Dict[str, List[str]] = {}
+
+    def flush():
+        for group in groups.values():
+            if len(group) == 1:
+                parts.append(re.escape(group[0]))
+            else:
+                parts.append(re.escape(group[0][0]) + _factor_terms([t[1:] for t in group]))
+        groups.clear()
+
+    for t in terms:
+        if not t:
+            flush()
+            parts.append("")
+        else:
+            groups.setdefault(t[0].lower(), []).append(t)
+    flush()
+    if len(parts) == 1:
+        return parts[0]
+    return "(?:%s)" % "|".join(parts)
+
+
+def _term_regex_source(terms: List[str], ignorecase: bool = True) -> str:
+    safe = [str(t) for t in terms if t and str(t).strip()]
     if not safe:
-        return re.compile(r"(?!x)x")  # never matches
-    return re.compile(r"(?i)\b(?:%s)\b" % "|".join(safe))
+        return r"(?!x)x"  # never matches
+    return (r"(?i)" if ignorecase else "") + r"\b(?:%s)\b" % _factor_terms(safe)
+
+
+def _compile_term_regex(terms: List[str]) -> re.Pattern:
+    return re.compile(_term_regex_source(terms))
+
+
+# Above this many distinct terms the combined matcher is a TermIndex, not a regex
+TERM_INDEX_MIN_TERMS = 2000
 
+_BOUNDARY = re.compile(r"\b")
 
-def build_variant_bank(cfg_path: str):
+
+def _fold(t: str) -> str:
+    # lower() turns a word-final sigma into "ς"; (?i) matching treats them alike
+    return t.lower().replace("ς", "σ")
+
+
+class TermIndex:
+    """
+    Whole-term lookup for lexicons too large for one regex.
+
+    Each target's hits are the spans its own ``_compile_term_regex(terms).finditer``
+    finds: case-insensitive, starting and ending on word boundaries, leftmost and
+    non-overlapping, and the earliest-listed term wins where several match at one
+    position. Targets are scanned independently, so hits of different targets may
+    overlap ("insulin" / "insulin glargine"). Compiling a 100k-term alternation
+    takes minutes (and a pickled pattern is recompiled on load); here building is
+    one dict insert per term and scanning looks up each boundary-to-boundary slice
+    of the note no longer than the longest term.
+    """
+
+    def __init__(self, terms):
+        """``terms``: a list of terms (one target) or canonical -> list of terms."""
+        groups = terms if isinstance(terms, dict) else {None: terms}
+        self.targets = list(groups)
+        # case-folded term -> [(target index, rank within the target)], first listing wins
+        self.rank: Dict[str, List[Tuple[int, int]]] = {}
+        for ti, ts in enumerate(groups.values()):
+            seen = set()
+            for t in ts:
+                if not t or not str(t).strip():
+                    continue
+                key = _fold(str(t))
+                if key not in seen:
+                    self.rank.setdefault(key, []).append((ti, len(seen)))
+                    seen.add(key)
+        self.firsts = frozenset(k[0] for k in self.rank)
+        self.longest = max(map(len, self.rank), default=0)
+
+    def __len__(self) -> int:
+        return len(self.rank)
+
+    def candidates(self, text: str, starts=None):
+        """
+        Yield (start, end, owners) for every occurrence of a term, by start.
+
+        ``starts`` (ascending word boundaries, e.g. from a regex that finds where
+        some term begins) limits the positions tried; by default every boundary
+        whose character can begin a term is.
+        """
+        rank, firsts, longest = self.rank, self.firsts, self.longest
+        low = _fold(text)
+        if len(low) != len(text):
+            # a character folds to several ("İ"): slice the original, fold each slice
+            low = None
+        if starts is not None:
+            n = len(text)
+            for s in starts:
+                # \b at endpos holds whatever follows; that position is past longest
+                for m in _BOUNDARY.finditer(text, s + 1, min(n, s + longest + 1)):
+                    e = m.start()
+                    if e - s > longest:
+                        break
+                    owners = rank.get(low[s:e] if low is not None else _fold(text[s:e]))
+                    if owners:
+                        yield s, e, owners
+            return
+        bounds = [m.start() for m in _BOUNDARY.finditer(text)]
+        n = len(bounds)
+        for i, s in enumerate(bounds):
+            head = low[s : s + 1] if low is not None else _fold(text[s : s + 1])[:1]
+            if head not in firsts:
+                continue
+            j = i + 1
+            while j < n and bounds[j] - s <= longest:
+                e = bounds[j]
+                owners = rank.get(low[s:e] if low is not None else _fold(text[s:e]))
+                if owners:
+                    yield s, e, owners
+                j += 1
+
+    def hits(self, text: str, starts=None):
+        """Yield (target index, start, end) of every hit, by start then target."""
+        last: Dict[int, int] = {}  # target index -> end of its previous hit
+        for s, group in groupby(self.candidates(text, starts), key=itemgetter(0)):
+            best: Dict[int, Tuple[int, int]] = {}  # target index -> (rank, end)
+            for _, e, owners in group:
+                for ti, r in owners:
+                    if last.get(ti, 0) <= s and (ti not in best or r < best[ti][0]):
+                        best[ti] = (r, e)
+            for ti in sorted(best):
+                last[ti] = e = best[ti][1]
+                yield ti, s, e
+
+    def spans(self, text: str):
+        """Yield (start, end) of every hit; for an index over a single target."""
+        return ((s, e) for _, s, e in self.hits(text))
+
+
+class _LazyPattern:
+    """
+    A term pattern compiled on first use.
+
+    Per-target patterns are only needed off the single-pass path (plain-dict
+    callers), so a large bank - fresh or loaded from the on-disk cache - does
+    not pay to compile them up front.
+    """
+
+    __slots__ = ("pattern", "_compiled")
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self._compiled = None
+
+    def __getattr__(self, name):
+        if self._compiled is None:
+            self._compiled = re.compile(self.pattern)
+        return getattr(self._compiled, name)
+
+    def __reduce__(self):
+        return (_LazyPattern, (self.pattern,))
+
+    def __eq__(self, other):
+        return isinstance(other, _LazyPattern) and other.pattern == self.pattern
+
+    def __hash__(self):
+        return hash(self.pattern)
+
+
+class TermBank(dict):
+    """
+    canonical -> per-target pattern, plus one combined matcher over every term.
+
+    Still a plain dict for callers that iterate ``bank.items()``; ``process_text``
+    uses ``hits`` so each note is scanned once, whatever the number of targets,
+    with the same hits as one ``finditer`` per target: each target's hits are
+    leftmost and non-overlapping among themselves, and may overlap another
+    target's. Terms are stored normalized (``preprocess.clean_text``), like the
+    notes they meet.
+    """
+
+    def __init__(self, per_target: Dict[str, re.Pattern], terms: Dict[str, List[str]]):
+        super().__init__(per_target)
+        # normalized term -> canonicals that list it (a term may be shared)
+        self.term_canon: Dict[str, List[str]] = {}
+        ordered: List[str] = []
+        for canon, ts in terms.items():
+            for t in ts:
+                key = clean_text(str(t)) if t else ""
+                if not key:
+                    continue
+                owners = self.term_canon.setdefault(key, [])
+                if not owners:
+                    ordered.append(key)
+                if canon not in owners:
+                    owners.append(canon)
+        # which target owns a term, and its rank there, for every term occurrence
+        self.index = TermIndex({canon: terms.get(canon, []) for canon in per_target})
+        if len(ordered) > TERM_INDEX_MIN_TERMS:
+            self.matcher = self.index
+        else:
+            # a lookahead, so every position where some term begins is found, even
+            # inside another hit; terms and notes are both normalized already
+            self.matcher = re.compile("(?=%s)" % _term_regex_source(ordered, ignorecase=False))
+        self.order = {canon: i for i, canon in enumerate(per_target)}
+        self.flag_keys = [f"has_{canon.lower()}" for canon in per_target]
+
+    def hits(self, text: str):
+        """(canonical, start, end) of every term hit in ``text``, by start then target."""
+        starts = None
+        if self.matcher is not self.index:
+            starts = (m.start() for m in self.matcher.finditer(text))
+        canons = self.index.targets
+        return ((canons[ti], s, e) for ti, s, e in self.index.hits(text, starts))
+
+
+def build_variant_bank(cfg_path: str, stats: Any = None):
     """
     Accepts dict-like OR object-like configs.
 
     Returns:
       ctx, bank, ph_bank, fz
+
+    ``stats`` (see ``medlex.stats``) gets bank.load_config / bank.compile
+    timers and the bank.targets / bank.terms counts.
     """
+    if stats is not None:
+        tic = time.perf_counter()
     raw = load_config(cfg_path)
     cfg = _as_plain(raw)  # normalize
 
@@ -74,8 +342,19 @@ def build_variant_bank(cfg_path: str):
     neg_patterns = _get(neg, "patterns", None)
     if not neg_patterns:
         neg_patterns = [r"\b(no|not|without|stop|stopped|discontinued|allergic to|avoid|denies)\b"]
-    negation_re = re.compile("|".join(neg_patterns), flags=re.IGNORECASE)
-    ctx = Ctx(negation_re=negation_re, window=40)
+    # the regex module, like the dose/form cues: its searches accept a timeout
+    negation_re = regex.compile("|".join(neg_patterns), flags=regex.IGNORECASE)
+
+    # ---- context cues (dosage units, forms) ----
+    defaults = _as_plain(_get(cfg, "defaults", None)) or {}
+    context = ContextCfg(
+        dosage_units=_get(defaults, "dosage_units", Defaults.dosage_units),
+        forms=_get(defaults, "forms", Defaults.forms),
+        negation_patterns=list(neg_patterns),
+    )
+    ctx = Ctx(
+        negation_re=negation_re, window=40, context=context, config_hash=config_hash(cfg_path)
+    )
 
     # ---- targets ----
     targets = _get(cfg, "targets", None)
@@ -87,7 +366,12 @@ def build_variant_bank(cfg_path: str):
     if not targets or not isinstance(targets, (list, tuple)):
         raise ValueError("Config must have a 'targets' list.")
 
-    bank: Dict[str, re.Pattern] = {}
+    if stats is not None:
+        tic = lap(stats, "bank.load_config", tic)
+    per_target: Dict[str, re.Pattern] = {}
+    terms_by_canon: Dict[str, List[str]] = {}
+    fuzzy_targets: List[Tuple[str, List[str], int]] = []
+    phonetic_targets: List[Tuple[str, List[str]]] = []
     for t in targets:
         t_plain = _as_plain(t)
         canon = _get(t_plain, "canonical", None) or _get(t_plain, "canon", None)
@@ -96,52 +380,260 @@ def build_variant_bank(cfg_path: str):
             raise ValueError(
                 f"Each target needs 'canonical' (or 'canon') and a non-empty list of 'terms'. Problematic entry: {t_plain}"
             )
-        bank[str(canon).upper()] = _compile_term_regex(list(terms))
-
-    # ph_bank/fz kept for signature compatibility (unused in this simplified flow)
-    ph_bank: Dict[str, Any] = {}
-    fz: Dict[str, Any] = {}
+        key = str(canon).upper()
+        # matched against normalized notes, so normalized the same way
+        normed = [clean_text(str(x)) for x in terms]
+        per_target[key] = _LazyPattern(_term_regex_source(normed))
+        terms_by_canon.setdefault(key, []).extend(normed)
+        fuzzy = _get(t_plain, "fuzzy", None)
+        if fuzzy is not None:
+            fuzzy_targets.append((key, [str(x) for x in terms], int(fuzzy)))
+        if _get(t_plain, "generate_phonetic", False):
+            phonetic_targets.append((key, [str(x) for x in terms]))
+    bank = TermBank(per_target, terms_by_canon)
+    fz = FuzzyIndex(fuzzy_targets)
+    ph_bank = PhoneticIndex(phonetic_targets)
+    if stats is not None:
+        lap(stats, "bank.compile", tic)
+        stats.count("bank.targets", len(per_target))
+        stats.count("bank.terms", len(bank.term_canon))
     return ctx, bank, ph_bank, fz
 
 
-def _is_negated(text: str, span: Tuple[int, int], ctx: Ctx) -> bool:
-    L, R = span
-    lo = max(0, L - ctx.window)
-    hi = min(len(text), R + ctx.window)
-    return bool(ctx.negation_re.search(text[lo:hi]))
+def _term_hits(text: str, bank: Dict[str, re.Pattern]):
+    """
+    Yield (canonical, start, end) for every term hit.
+
+    A ``TermBank`` is scanned once with its combined matcher; a plain
+    canonical -> pattern dict falls back to one scan per target.
+    """
+    if not isinstance(bank, TermBank):
+        for canon, cre in bank.items():
+            for m in cre.finditer(text):
+                yield canon, m.start(), m.end()
+        return
+    yield from bank.hits(text)
+
+
+def _overlaps(start: int, end: int, spans: List[Tuple[int, int]]) -> bool:
+    return any(start < e and s < end for s, e in spans)
+
+
+def _note_hits(
+    text: Any,
+    ctx: Ctx,
+    bank: Dict[str, re.Pattern],
+    fz: Any = None,
+    fuzzy_scores: Optional[Dict[str, Any]] = None,
+    ph_bank: Any = None,
+    stats: Any = None,
+    deadline: Optional[float] = None,
+    segment_chars: Optional[int] = SEGMENT_CHARS,
+) -> List[Tuple]:
+    """
+    (canonical, start, end, matched, is_negated, stage, context_score) for every
+    hit in ``text``, grouped by target in bank order, then by position.
+
+    Stages run exact -> fuzzy -> phonetic; a later stage skips tokens an
+    earlier one already claimed. ``fuzzy_scores`` (from ``FuzzyIndex.match``)
+    lets a batch score its tokens once; without it the note's own tokens are
+    scored here, unless the stub check (``FuzzyIndex.may_match``) rules the
+    note out. Negation cues, dosage units and forms are located once per
+    note (``CueIndex``), only when there is a hit to score or a phonetic stage
+    to gate; a note with no dose or form skips the phonetic stage.
+
+    ``deadline`` (a ``time.perf_counter()`` value) bounds the note: the YAML's
+    cue patterns run with the time left as their ``regex`` timeout, and each
+    stage checks it before starting. Past it, ``TimeoutError`` is raised.
+
+    Notes longer than ``2 * segment_chars`` are matched segment by segment
+    (``medlex.segment``), with the same result; None matches in one piece.
+
+    Every stage scans the note as normalized once by ``preprocess.normalize``
+    (``text`` may already be a ``Normalized``); spans and matched text are
+    mapped back to the original.
+    """
+    if stats is not None:
+        t = time.perf_counter()
+    norm = normalize(text)
+    text = norm.text
+    if stats is not None:
+        t = lap(stats, "normalize", t)
+    if segment_chars and len(text) > 2 * segment_chars and getattr(bank, "order", None):
+        from .segment import note_hits_segmented
+
+        hits = note_hits_segmented(
+            text, ctx, bank, fz, fuzzy_scores, ph_bank, stats, deadline, segment_chars
+        )
+        return _to_original(norm, hits)
+    found = []  # (canonical, start, end, stage)
+    for canon, start, end in _term_hits(text, bank):
+        found.append((canon, start, end, "exact"))
+    if stats is not None:
+        t = lap(stats, "exact", t)
+        stats.count("candidates.exact", len(found))
+        stats.count("matches.exact", len(found))
+
+    if fz:
+        time_left(deadline)
+        if fuzzy_scores is None:
+            # cheapest tier first: skip tokenizing and scoring notes that cannot match
+            if fz.may_match(text):
+                fuzzy_scores = fz.match(fz.tokens(text))
+            elif stats is not None:
+                stats.count("prefilter.fuzzy.stubs.rejected")
+            if stats is not None:
+                stats.count("prefilter.fuzzy.stubs")
+        if fuzzy_scores:
+            taken = [(h[1], h[2]) for h in found]
+            n_found = len(found)
+            for h in fz.scan(text, fuzzy_scores):
+                if stats is not None:
+                    stats.count("candidates.fuzzy")
+                if not _overlaps(h.start, h.end, taken):
+                    found.append((h.canonical, h.start, h.end, "fuzzy"))
+            if stats is not None:
+                stats.count("matches.fuzzy", len(found) - n_found)
+        if stats is not None:
+            t = lap(stats, "fuzzy", t)
+
+    cues = None
+    if ph_bank:
+        # sound-alikes are only trusted next to a dose or dose form: a note
+        # without either skips the stage
+        time_left(deadline)
+        cues = CueIndex(text, ctx.negation_re, ctx.context, deadline)
+        if stats is not None:
+            stats.count("prefilter.phonetic.cues")
+        if cues.has_context():
+            taken = [(h[1], h[2]) for h in found]
+            n_found = len(found)
+            time_left(deadline)
+            for h in ph_bank.scan(text):
+                if stats is not None:
+                    stats.count("candidates.phonetic")
+                if _overlaps(h.start, h.end, taken):
+                    continue
+                if cues.score(h.start, h.end) == 0:
+                    continue
+                found.append((h.canonical, h.start, h.end, "phonetic"))
+            if stats is not None:
+                stats.count("matches.phonetic", len(found) - n_found)
+        elif stats is not None:
+            stats.count("prefilter.phonetic.cues.rejected")
+        if stats is not None:
+            t = lap(stats, "phonetic", t)
+
+    if not found:
+        return []
+    cues = cues or CueIndex(text, ctx.negation_re, ctx.context, deadline)
+    hits = [
+        (canon, s, e, text[s:e], cues.negated(s, e, ctx.window), stage, cues.score(s, e))
+        for canon, s, e, stage in found
+    ]
+    if stats is not None:
+        lap(stats, "cues", t)
+        stats.count("matches", len(hits))
+        stats.count("matches.negated", sum(1 for h in hits if h[4]))
+
+    # Keep the per-target grouping callers saw before the single-pass scan
+    order = getattr(bank, "order", None)
+    if order is not None and len(hits) > 1:
+        hits.sort(key=lambda h: (order[h[0]], h[1]))
+    return _to_original(norm, hits)
+
+
+def _to_original(norm: Normalized, hits: List[Tuple]) -> List[Tuple]:
+    """``_note_hits`` tuples over ``norm.text`` moved onto ``norm.original``."""
+    src = norm.original
+    if norm.identity:
+        return [(c, s, e, src[s:e], *rest) for c, s, e, _m, *rest in hits]
+    out = []
+    for c, s, e, _m, *rest in hits:
+        s, e = norm.span(s, e)
+        out.append((c, s, e, src[s:e], *rest))
+    return out
+
+
+def _exact_hits_windowed(
+    text: Any, ctx: Ctx, bank: Dict[str, re.Pattern], deadline: Optional[float] = None
+) -> List[Tuple]:
+    """
+    Degraded ``_note_hits``: exact hits only, with negation and context cues
+    searched in each hit's own window rather than across the whole note. For
+    notes that ran out of time budget: the term scan is linear, and the
+    YAML's patterns only ever see a few dozen characters.
+    """
+    # the windows plus some slack, so \b and lookarounds at their edges see real text
+    pad = max(ctx.window, CONTEXT_WINDOW) + 20
+    norm = normalize(text)
+    text = norm.text
+    hits = []
+    for canon, s, e in _term_hits(text, bank):
+        lo, hi = max(0, s - pad), min(len(text), e + pad)
+        cues = CueIndex(text[lo:hi], ctx.negation_re, ctx.context, deadline)
+        neg = cues.negated(s - lo, e - lo, ctx.window)
+        hits.append((canon, s, e, text[s:e], neg, "exact", cues.score(s - lo, e - lo)))
+    order = getattr(bank, "order", None)
+    if order is not None and len(hits) > 1:
+        hits.sort(key=lambda h: (order[h[0]], h[1]))
+    return _to_original(norm, hits)
 
 
 def process_text(
-    text: str, ctx: Ctx, bank: Dict[str, re.Pattern], ph_bank: Dict[str, Any], fz: Dict[str, Any]
+    text: str,
+    ctx: Ctx,
+    bank: Dict[str, re.Pattern],
+    ph_bank: Dict[str, Any],
+    fz: Any,
+    stats: Any = None,
+    cache: Any = None,
 ) -> Dict[str, Any]:
     """
     Emits:
       - has_<lowercanonical> flags (0/1)
-      - spans: [{matched, span, context, source, is_negated}]
+      - spans: [{matched, span, context, source, is_negated, stage, context_score}]
     Flag = 1 iff any NON-NEGATED match exists for that canonical.
+    context_score counts dosage units / dose forms near the span.
+    stage is "exact", "fuzzy" (targets with a ``fuzzy:`` threshold) or
+    "phonetic" (``generate_phonetic: true``, only next to a dose/form).
+    ``stats`` collects per-stage timers and counters (``medlex.stats``);
+    ``cache`` (``medlex.resultcache.ResultCache``) reuses results for repeated notes.
     """
     spans: List[Dict[str, Any]] = []
-    flags: Dict[str, int] = {f"has_{canon.lower()}": 0 for canon in bank.keys()}
-
-    for canon, cre in bank.items():
-        found_non_neg = False
-        for m in cre.finditer(text or ""):
-            span = (m.start(), m.end())
-            neg = _is_negated(text, span, ctx)
-            lo = max(0, span[0] - 30)
-            hi = min(len(text), span[1] + 30)
-            spans.append(
-                {
-                    "matched": m.group(0),
-                    "span": span,
-                    "context": text[lo:hi],
-                    "source": canon,
-                    "is_negated": bool(neg),
-                }
-            )
-            if not neg:
-                found_non_neg = True
-        if found_non_neg:
-            flags[f"has_{canon.lower()}"] = 1
+    flag_keys = getattr(bank, "flag_keys", None) or [f"has_{c.lower()}" for c in bank]
+    out: Dict[str, Any] = dict.fromkeys(flag_keys, 0)
+
+    text = text or ""
+    if stats is not None:
+        stats.count("notes")
+    hits = key = None
+    if cache is not None and ctx.config_hash:
+        key = cache.key(text, ctx.config_hash)
+        hits = cache.get(key)
+        if stats is not None:
+            stats.count("cache.hit" if hits is not None else "cache.miss")
+    if hits is None:
+        hits = _note_hits(text, ctx, bank, fz, ph_bank=ph_bank, stats=stats)
+        if key is not None:
+            cache.put(key, hits)
+
+    for canon, start, end, matched, neg, stage, score in hits:
+        lo = max(0, start - CONTEXT_PAD)
+        hi = min(len(text), end + CONTEXT_PAD)
+        spans.append(
+            {
+                "matched": matched,
+                "span": (start, end),
+                "context": text[lo:hi],
+                "source": canon,
+                "is_negated": bool(neg),
+                "stage": stage,
+                "context_score": score,
+            }
+        )
+        if not neg:
+            out[f"has_{canon.lower()}"] = 1
 
-    return {**flags, "spans": spans}
+    out["spans"] = spans
+    return out
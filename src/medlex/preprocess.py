@@ -1,21 +1,218 @@
-import regex as re
+import re
+import unicodedata
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import regex
+
+# Distinct note tokens to remember phonetic codes for (bounded memory)
+PHONETIC_CACHE_SIZE = 65_536
+
+_doublemetaphone = None
+
+
+def _dm():
+    """``metaphone.doublemetaphone``, imported on first use only."""
+    global _doublemetaphone
+    if _doublemetaphone is None:
+        from metaphone import doublemetaphone
+
+        _doublemetaphone = doublemetaphone
+    return _doublemetaphone
+
+
+# Note normalization, shared by every stage: one pass per note.
+#   fold      each non-ASCII grapheme cluster to NFKC + case folding (ASCII: lower())
+#   collapse  any whitespace run to one space, a run of one repeated
+#             punctuation character ("--", "...", "====") to a single one
+# Normalizing normalized text changes nothing.
+_NON_ASCII = re.compile(r".?[^\x00-\x7f]+", re.DOTALL)
+_CLUSTER = regex.compile(r"\X", regex.DOTALL)
+_OTHER_WS = re.compile(r"[^\S ]")
+_PUNCT_RUN = re.compile(r"([^\w\s])\1")
+_RUN = re.compile(r" {2,}|([^\w\s])\1+")
+
+
+def _fold(s: str) -> str:
+    return unicodedata.normalize("NFKC", unicodedata.normalize("NFKC", s).casefold())
+
+
+class OffsetMap:
+    """
+    Positions in a rewritten string back to the string it came from.
+
+    Piecewise: piece k starts at ``at[k]`` in the output and ``src_at[k]`` in
+    the source (both end with a sentinel). A piece is either copied character
+    for character or a ``lump``: source characters rewritten as a block, each
+    of its output characters standing for the whole block.
+    """
+
+    __slots__ = ("at", "src_at", "lump", "_n", "_n_src")
+
+    def __init__(self):
+        self.at = array("q")
+        self.src_at = array("q")
+        self.lump = bytearray()
+        self._n = self._n_src = 0
+
+    def copy(self, n: int) -> None:
+        if not self.lump or self.lump[-1]:
+            self._piece(False)
+        self._n += n
+        self._n_src += n
+
+    def rewrite(self, n_src: int, n: int) -> None:
+        if n_src == n == 1:
+            return self.copy(1)
+        self._piece(True)
+        self._n += n
+        self._n_src += n_src
+
+    def _piece(self, lump: bool) -> None:
+        self.at.append(self._n)
+        self.src_at.append(self._n_src)
+        self.lump.append(lump)
+
+    def close(self) -> Optional["OffsetMap"]:
+        """The finished map; None when nothing was rewritten (the identity)."""
+        if not any(self.lump):
+            return None
+        self.at.append(self._n)
+        self.src_at.append(self._n_src)
+        return self
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """Source span of the output span [start, end), end > start."""
+        at, src_at, lump = self.at, self.src_at, self.lump
+        k = bisect_right(at, start) - 1
+        s = src_at[k] if lump[k] else src_at[k] + start - at[k]
+        k = bisect_right(at, end - 1) - 1
+        e = src_at[k + 1] if lump[k] else src_at[k] + end - at[k]
+        return s, e
+
+
+def _fold_text(text: str) -> Tuple[str, Optional[OffsetMap]]:
+    if text.isascii():
+        return text.lower(), None
+    parts: List[str] = []
+    omap = OffsetMap()
+    pos = 0
+    for m in _NON_ASCII.finditer(text):
+        s, e = m.span()
+        if s > pos:
+            parts.append(text[pos:s].lower())
+            omap.copy(s - pos)
+        piece = m.group(0)
+        folded = piece.casefold()
+        if (
+            len(folded) == len(piece)
+            and unicodedata.is_normalized("NFKC", piece)
+            and unicodedata.is_normalized("NFKC", folded)
+        ):
+            # the usual case (accents, Greek, curly quotes): one for one
+            parts.append(folded)
+            omap.copy(len(piece))
+        else:
+            for c in _CLUSTER.findall(piece):
+                f = _fold(c)
+                parts.append(f)
+                omap.rewrite(len(c), len(f))
+        pos = e
+    parts.append(text[pos:].lower())
+    omap.copy(len(text) - pos)
+    return "".join(parts), omap.close()
+
+
+def _collapse(text: str) -> Tuple[str, Optional[OffsetMap]]:
+    # cheap checks first: most notes have nothing to collapse
+    if not text.isprintable():
+        text = _OTHER_WS.sub(" ", text)  # tabs, newlines, NBSP...: one for one
+    if "  " not in text and _PUNCT_RUN.search(text) is None:
+        return text, None
+    parts: List[str] = []
+    omap = OffsetMap()
+    pos = 0
+    for m in _RUN.finditer(text):
+        s, e = m.span()
+        parts.append(text[pos:s])
+        omap.copy(s - pos)
+        parts.append(m.group(1) or " ")
+        omap.rewrite(e - s, 1)
+        pos = e
+    parts.append(text[pos:])
+    omap.copy(len(text) - pos)
+    return "".join(parts), omap.close()
+
+
+class Normalized:
+    """
+    A note after ``normalize``: ``text`` is what every matching stage scans,
+    ``original`` what spans are reported against; ``span`` maps between them.
+    """
+
+    __slots__ = ("original", "text", "_folded", "_collapsed")
+
+    def __init__(self, original: str):
+        self.original = original
+        folded, self._folded = _fold_text(original)
+        self.text, self._collapsed = _collapse(folded)
+
+    @property
+    def identity(self) -> bool:
+        """True when positions are the same on both sides."""
+        return self._folded is None and self._collapsed is None
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """Span of ``original`` that the normalized span [start, end) came from."""
+        if self._collapsed is not None:
+            start, end = self._collapsed.span(start, end)
+        if self._folded is not None:
+            start, end = self._folded.span(start, end)
+        return start, end
+
+
+def normalize(text) -> Normalized:
+    """
+    Normalize a note once for every stage: NFKC + case folding, whitespace
+    runs to one space, repeated punctuation to one character.
+    """
+    return text if isinstance(text, Normalized) else Normalized(text or "")
 
 
 def clean_text(s: str) -> str:
-    s = (s or "").lower()
-    s = re.sub(r"\s+", " ", s)
-    return s.strip()
+    """A term or query normalized like the notes it is matched against."""
+    return normalize(s).text.strip()
 
 
 def metaphone_encode_window(s: str, start: int, end: int):
     # encode the matched window to compare with phonetic variants
-    from metaphone import doublemetaphone
-
     window = s[max(0, start - 3) : min(len(s), end + 3)]
-    a, b = doublemetaphone(window)
+    a, b = _dm()(window)
     outs = set()
     if a:
         outs.add(f"ph_{a.lower()}")
     if b:
         outs.add(f"ph_{b.lower()}")
     return outs
+
+
+@lru_cache(maxsize=PHONETIC_CACHE_SIZE)
+def metaphone_codes(token: str) -> Tuple[str, ...]:
+    """Distinct ``ph_<code>`` Double Metaphone codes of one token, memoized."""
+    a, b = _dm()(token)
+    return tuple(dict.fromkeys(f"ph_{c.lower()}" for c in (a, b) if c))
+
+
+def phonetic_cache_info() -> Dict[str, float]:
+    """Hit/miss counts and hit rate of the ``metaphone_codes`` cache."""
+    info = metaphone_codes.cache_info()
+    calls = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": info.hits / calls if calls else 0.0,
+    }
@@ -0,0 +1,153 @@
+# src/medlex/resultcache.py
+"""
+Content-addressed cache of per-note match results.
+
+Duplicated and templated notes (medication reconciliation boilerplate, copied
+forward text) produce the same hits every time. ``ResultCache`` maps
+``blake2b(config_hash + text)`` to the note's hits, so a note seen before -
+in this batch, an earlier batch or, with ``path``, an earlier run - is not
+scanned again. The config hash covers the YAML, the medlex version and
+``pipeline.RESULTS_FORMAT`` (bumped when matching output changes), so neither
+a changed bank nor changed matching code reads stale entries.
+
+Two levels: an in-memory LRU bounded to ``maxsize`` notes, and an optional
+SQLite file shared across runs and processes (writes are batched and
+best-effort; a locked or read-only database only costs the speed-up).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_MAXSIZE = 100_000
+# rows buffered before an SQLite write
+_FLUSH_EVERY = 1_000
+
+
+class ResultCache:
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._mem: "OrderedDict[bytes, list]" = OrderedDict()
+        self._pending: Dict[bytes, str] = {}  # written to SQLite on flush()
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, timeout=30)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, hits TEXT NOT NULL)"
+                    " WITHOUT ROWID"
+                )
+                self._db.commit()
+            except sqlite3.Error:
+                self._db = None  # memory only
+
+    @staticmethod
+    def key(text: str, config_hash: str) -> bytes:
+        h = hashlib.blake2b(config_hash.encode(), digest_size=16)
+        h.update(b"\0")
+        h.update(text.encode("utf-8", "surrogatepass"))
+        return h.digest()
+
+    def _lookup(self, key: bytes) -> Optional[list]:
+        hits = self._mem.get(key)
+        if hits is not None:
+            self._mem.move_to_end(key)
+            return hits
+        if self._db is None:
+            return None
+        blob = self._pending.get(key)
+        if blob is None:
+            try:
+                row = self._db.execute("SELECT hits FROM results WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                return None
+            blob = row[0]
+        hits = [tuple(h) for h in json.loads(blob)]
+        self.disk_hits += 1
+        self._remember(key, hits)
+        return hits
+
+    def get(self, key: bytes) -> Optional[list]:
+        hits = self._lookup(key)
+        if hits is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return hits
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[list]]:
+        """
+        ``get`` for a batch. A repeat of a key found earlier in ``keys`` counts
+        as another hit. A repeat of a missing key is not counted: the caller
+        computes the first copy and ``get``s the repeats once it has been
+        ``put`` (or not; see ``process_batch``).
+        """
+        found: Dict[bytes, Optional[list]] = {}
+        out = []
+        for k in keys:
+            if k not in found:
+                found[k] = self.get(k)
+            elif found[k] is not None:
+                self.hits += 1
+            out.append(found[k])
+        return out
+
+    def put(self, key: bytes, hits: list) -> None:
+        self._remember(key, hits)
+        if self._db is not None:
+            self._pending[key] = json.dumps(hits, ensure_ascii=False)
+            if len(self._pending) >= _FLUSH_EVERY:
+                self.flush()
+
+    def _remember(self, key: bytes, hits: list) -> None:
+        if self.maxsize <= 0:
+            return
+        self._mem[key] = hits
+        self._mem.move_to_end(key)
+        if len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+    def flush(self) -> None:
+        """Write buffered entries to SQLite."""
+        if self._db is None or not self._pending:
+            return
+        rows, self._pending = self._pending, {}
+        try:
+            self._db.executemany("INSERT OR IGNORE INTO results VALUES (?, ?)", rows.items())
+            self._db.commit()
+        except sqlite3.Error:
+            self._db.rollback()
+
+    def info(self) -> Dict[str, float]:
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "size": len(self._mem),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / calls if calls else 0.0,
+        }
+
+    def close(self) -> None:
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,113 @@
+# src/medlex/segment.py
+"""
+Very long notes (discharge summaries, pasted reports) matched as overlapping
+segments.
+
+A note longer than ``2 * segment_chars`` is cut, at whitespace, into segments
+of about ``segment_chars`` characters. Each segment owns the hits that start
+inside it and is matched on a slice reaching ``overlap`` characters further
+on both sides. The overlap covers the longest term or candidate token plus
+the negation / context window and some slack for cue patterns, so every hit
+a segment owns sees the same neighbouring hits and cues as in the whole note,
+and the merged hits are the unsplit ones. Work per segment is bounded, so
+the per-note costs that grow with the number of hits (overlap checks between
+stages) stay linear in note length, and segments can be spread over
+processes (``WorkerPool``).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from .context import CONTEXT_WINDOW
+
+# room for cue patterns (negation, dose, form) around a window edge
+_SLACK = 64
+# how far to look for whitespace when placing a cut
+_SNAP = 256
+# longest candidate token of the phonetic stage (``PhoneticIndex.token_re``)
+_PHONETIC_MAX_LEN = 15
+
+
+def segment_overlap(ctx, bank, fz=None) -> int:
+    """Characters each segment's slice extends past the text it owns."""
+    longest = max((len(t) for t in getattr(bank, "term_canon", ())), default=64)
+    longest = max(longest + 8, getattr(fz, "max_len", 0), _PHONETIC_MAX_LEN)
+    return longest + max(ctx.window, CONTEXT_WINDOW) + _SLACK
+
+
+def _snap(text: str, i: int, step: int) -> int:
+    """Nearest position at or beyond ``i`` (in direction ``step``) right after whitespace."""
+    n = len(text)
+    j = i
+    for _ in range(_SNAP):
+        if j <= 0 or j >= n:
+            return max(0, min(n, j))
+        if text[j - 1].isspace():
+            return j
+        j += step
+    return i
+
+
+def plan_segments(text: str, size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """
+    (own_start, own_end, slice_start, slice_end) per segment; owned ranges
+    tile the text. A single segment when the text is at most ``2 * size``.
+    """
+    n = len(text)
+    cuts = [0]
+    while n - cuts[-1] > 2 * size:
+        cuts.append(_snap(text, cuts[-1] + size, 1))
+    cuts.append(n)
+    return [
+        (lo, hi, _snap(text, max(0, lo - overlap), -1), _snap(text, min(n, hi + overlap), 1))
+        for lo, hi in zip(cuts, cuts[1:])
+    ]
+
+
+def merge_segment_hits(
+    parts: Iterable[List[tuple]], plan: List[Tuple[int, int, int, int]], bank
+) -> List[tuple]:
+    """
+    Hits of every segment (in slice coordinates) back in note coordinates,
+    each kept once, by the segment owning its start; ordered like ``_note_hits``.
+    """
+    hits = []
+    for part, (lo, hi, slo, _) in zip(parts, plan):
+        for canon, s, e, *rest in part:
+            if lo <= s + slo < hi:
+                hits.append((canon, s + slo, e + slo, *rest))
+    order = bank.order
+    hits.sort(key=lambda h: (order[h[0]], h[1]))
+    return hits
+
+
+def note_hits_segmented(
+    text: str,
+    ctx,
+    bank,
+    fz: Any = None,
+    fuzzy_scores: Optional[dict] = None,
+    ph_bank: Any = None,
+    stats: Any = None,
+    deadline: Optional[float] = None,
+    size: int = 0,
+    map_fn: Callable = map,
+) -> List[tuple]:
+    """``_note_hits`` over segments of ``text``; ``map_fn`` may run them in parallel."""
+    from .pipeline import _note_hits
+
+    plan = plan_segments(text, size, segment_overlap(ctx, bank, fz))
+    if fz and fuzzy_scores is None:
+        # score the note's distinct tokens once, not once per segment
+        fuzzy_scores = fz.match(fz.tokens(text)) if fz.may_match(text) else {}
+    if stats is not None:
+        stats.count("segments", len(plan))
+
+    def run(bounds):
+        _, _, slo, shi = bounds
+        return _note_hits(
+            text[slo:shi], ctx, bank, fz, fuzzy_scores, ph_bank, stats, deadline, segment_chars=None
+        )
+
+    return merge_segment_hits(map_fn(run, plan), plan, bank)
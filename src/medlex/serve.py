@@ -0,0 +1,484 @@
+# src/medlex/serve.py
+"""
+``medlex serve``: a long-running local extraction service.
+
+The compiled bank is built once and kept warm. Concurrent requests are queued
+and coalesced into micro-batches (up to ``max_batch`` notes, or whatever has
+arrived ``max_wait_ms`` after the first one), which run off the event loop:
+on a thread, or with ``workers > 1`` on a ``WorkerPool`` of processes.
+
+HTTP/1.1 over TCP or a Unix socket, JSON in and out (standard library only):
+
+  POST /extract   {"texts": [...]} -> {"results": [<process_text output>, ...]}
+                  {"text": "..."}  -> {"result": <process_text output>}
+  POST /reload    re-read the targets YAML (also on SIGHUP, or with --watch)
+  GET  /metrics   request/note counters, batch sizes, latency percentiles, notes/s
+  GET  /healthz
+
+A reload builds the new bank (and worker pool) beside the old one and swaps
+them in one assignment; batches already running finish on the bank they
+started with, and a YAML that fails to load leaves the old bank serving.
+Worker processes are handed the bank the service loaded rather than the
+YAML path, so the config hash reported is the one every batch runs on.
+If a worker dies (an OOM kill, say), the pool is rebuilt on the same bank
+and the batch retried once; /healthz answers 503 while the pool is broken.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from .bankcache import load_variant_bank
+from .batch import process_batch
+from .parallel import WorkerPool
+
+DEFAULT_PORT = 8765
+MAX_BODY = 64 * 1024 * 1024
+# latencies kept for the /metrics percentiles
+LATENCY_WINDOW = 10_000
+# seconds of batches behind the "recent" notes/s figure
+RATE_WINDOW = 60.0
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class _Engine:
+    """A loaded bank plus whatever runs batches on it; swapped whole on reload."""
+
+    def __init__(
+        self, cfg_path: str, workers: int, bank_cache: bool, banks: Optional[tuple] = None
+    ):
+        # ``banks``: rebuild on an already loaded bank (after a worker died)
+        self.banks = (
+            banks if banks is not None else load_variant_bank(cfg_path, use_cache=bank_cache)
+        )
+        self.config_hash = self.banks[0].config_hash
+        if workers > 1:
+            # workers get this bank, not the YAML path: they start lazily, and an
+            # edit made meanwhile must not run under the hash reported here. They
+            # are spawned, not forked: a forked worker inherits the open client
+            # sockets and keeps a closed connection from ever reaching EOF
+            pool = WorkerPool(
+                cfg_path,
+                workers,
+                use_cache=bank_cache,
+                banks=self.banks,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            try:
+                worker_hash = pool.config_hash()
+            except BaseException:
+                pool.close(wait=False)
+                raise
+            if worker_hash != self.config_hash:
+                pool.close()
+                raise RuntimeError(
+                    f"worker bank {worker_hash} does not match the loaded {self.config_hash}"
+                )
+            self.pool: Optional[WorkerPool] = pool
+            self._thread = None
+        else:
+            self.pool = None
+            self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="medlex")
+
+    def run(self, texts: List[str]) -> "asyncio.Future":
+        loop = asyncio.get_running_loop()
+        if self.pool is not None:
+            return asyncio.wrap_future(self.pool.submit(texts))
+        return loop.run_in_executor(self._thread, process_batch, texts, *self.banks)
+
+    @property
+    def broken(self) -> bool:
+        return self.pool is not None and self.pool.broken
+
+    def close(self) -> None:
+        # waits for batches still running on this engine
+        if self.pool is not None:
+            self.pool.close()
+        else:
+            self._thread.shutdown()
+
+
+class _Request:
+    __slots__ = ("texts", "future", "t0")
+
+    def __init__(self, texts: List[str], future: "asyncio.Future"):
+        self.texts = texts
+        self.future = future
+        self.t0 = time.perf_counter()
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.notes = 0
+        self.batches = 0
+        self.errors = 0
+        self.reloads = 0
+        self.restarts = 0  # worker pools rebuilt after a worker died
+        self.latencies_ms: deque = deque(maxlen=LATENCY_WINDOW)
+        self._recent: deque = deque()  # (time, notes) per batch
+
+    def batch_done(self, n_requests: int, n_notes: int) -> None:
+        now = time.time()
+        self.batches += 1
+        self.requests += n_requests
+        self.notes += n_notes
+        self._recent.append((now, n_notes))
+        while self._recent and self._recent[0][0] < now - RATE_WINDOW:
+            self._recent.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        uptime = now - self.started
+        lat = sorted(self.latencies_ms)
+
+        def pct(q):
+            return lat[min(len(lat) - 1, int(q * (len(lat) - 1)))] if lat else 0.0
+
+        window = min(RATE_WINDOW, uptime) or 1.0
+        return {
+            "uptime_s": uptime,
+            "requests": self.requests,
+            "notes": self.notes,
+            "batches": self.batches,
+            "errors": self.errors,
+            "reloads": self.reloads,
+            "restarts": self.restarts,
+            "mean_batch_notes": self.notes / self.batches if self.batches else 0.0,
+            "notes_per_sec": self.notes / uptime if uptime else 0.0,
+            "notes_per_sec_recent": sum(n for t, n in self._recent if t >= now - window) / window,
+            "latency_ms": {
+                "p50": pct(0.50),
+                "p90": pct(0.90),
+                "p99": pct(0.99),
+                "max": lat[-1] if lat else 0.0,
+                "window": len(lat),
+            },
+        }
+
+
+class Service:
+    """
+    The batching core, usable without HTTP: ``await service.extract(texts)``.
+    Call ``start()`` inside a running event loop, ``close()`` when done.
+    """
+
+    def __init__(
+        self,
+        cfg_path: str,
+        workers: int = 1,
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0,
+        bank_cache: bool = True,
+    ):
+        self.cfg_path = cfg_path
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.bank_cache = bank_cache
+        self.metrics = Metrics()
+        self._engine = _Engine(cfg_path, workers, bank_cache)
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._reload_lock: Optional[asyncio.Lock] = None
+        self._running: set = set()  # batch tasks, referenced until done
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        # one batch in flight per worker; more would only queue inside the pool
+        self._slots = asyncio.Semaphore(self.workers)
+        self._reload_lock = asyncio.Lock()
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def extract(self, texts: List[str]) -> List[Dict[str, Any]]:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Request(["" if t is None else str(t) for t in texts], fut))
+        return await fut
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            n = len(batch[0].texts)
+            deadline = loop.time() + self.max_wait
+            while n < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    req = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(req)
+                n += len(req.texts)
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: List[_Request]) -> None:
+        engine = self._engine  # the bank this batch runs on, even if a reload lands meanwhile
+        texts = [t for req in batch for t in req.texts]
+        try:
+            try:
+                res = await engine.run(texts)
+            except BrokenProcessPool:
+                # a worker died (OOM kill, segfault): the pool fails every task
+                # from now on, so rebuild it and give the batch one more try
+                engine = await self._restart(engine)
+                res = await engine.run(texts)
+        except Exception as e:
+            self.metrics.errors += len(batch)
+            for req in batch:
+                if not req.future.done():
+                    req.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        records = res.records()
+        i = 0
+        now = time.perf_counter()
+        for req in batch:
+            n = len(req.texts)
+            if not req.future.done():
+                req.future.set_result(records[i : i + n])
+            self.metrics.latencies_ms.append((now - req.t0) * 1000.0)
+            i += n
+        self.metrics.batch_done(len(batch), len(texts))
+
+    async def reload(self) -> Dict[str, Any]:
+        """Rebuild from the YAML and swap atomically; the old bank keeps serving on error."""
+        async with self._reload_lock:
+            loop = asyncio.get_running_loop()
+            new = await loop.run_in_executor(
+                None, _Engine, self.cfg_path, self.workers, self.bank_cache
+            )
+            old, self._engine = self._engine, new
+            self.metrics.reloads += 1
+            loop.run_in_executor(None, old.close)
+            return {"config_hash": new.config_hash, "changed": new.config_hash != old.config_hash}
+
+    async def _restart(self, broken: _Engine) -> _Engine:
+        """Replace a broken worker pool with a new one on the same bank."""
+        async with self._reload_lock:
+            if self._engine is broken:  # not already replaced by another batch or a reload
+                loop = asyncio.get_running_loop()
+                self._engine = await loop.run_in_executor(
+                    None, _Engine, self.cfg_path, self.workers, self.bank_cache, broken.banks
+                )
+                self.metrics.restarts += 1
+                loop.run_in_executor(None, broken.close)
+            return self._engine
+
+    @property
+    def config_hash(self) -> str:
+        return self._engine.config_hash
+
+    async def watch(self, interval: float) -> None:
+        """Reload whenever the YAML's mtime changes."""
+        last = os.stat(self.cfg_path).st_mtime_ns
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtime = os.stat(self.cfg_path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != last:
+                last = mtime
+                try:
+                    await self.reload()
+                except Exception:
+                    self.metrics.errors += 1
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+        await asyncio.get_running_loop().run_in_executor(None, self._engine.close)
+
+    # ---------- HTTP ----------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await _read_head(reader)
+                except ValueError as e:
+                    # the stream is out of step after a bad head: answer and close
+                    status, payload, keep = 400, {"error": f"bad request: {e}"}, False
+                else:
+                    if head is None:
+                        break
+                    method, target, version, headers, length = head
+                    if length > MAX_BODY:
+                        status, payload = 413, {"error": f"body over {MAX_BODY} bytes"}
+                        keep = False
+                    else:
+                        body = await reader.readexactly(length) if length else b""
+                        status, payload = await self._route(method, target, body)
+                        keep = version == "HTTP/1.1" and headers.get("connection") != "close"
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\nConnection: %s\r\n\r\n"
+                    % (
+                        status,
+                        _REASONS[status].encode(),
+                        len(data),
+                        b"keep-alive" if keep else b"close",
+                    )
+                    + data
+                )
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, target: str, body: bytes):
+        path = target.split("?", 1)[0]
+        if path == "/extract":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                req = json.loads(body or b"{}")
+                single = "text" in req
+                texts = [req["text"]] if single else req["texts"]
+                if not isinstance(texts, list):
+                    raise TypeError("'texts' must be a list")
+            except (ValueError, KeyError, TypeError) as e:
+                return 400, {"error": f'expected {{"texts": [...]}} or {{"text": "..."}}: {e}'}
+            try:
+                results = await self.extract(texts)
+            except Exception as e:
+                return 500, {"error": str(e)}
+            return 200, {"result": results[0]} if single else {"results": results}
+        if path == "/metrics":
+            return 200, {**self.metrics.snapshot(), "config_hash": self.config_hash}
+        if path == "/healthz":
+            if self._engine.broken:
+                # the next batch rebuilds the pool
+                return 503, {"status": "worker pool broken", "config_hash": self.config_hash}
+            return 200, {"status": "ok", "config_hash": self.config_hash}
+        if path == "/reload":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                return 200, await self.reload()
+            except Exception as e:
+                return 500, {"error": f"reload failed, still serving the previous bank: {e}"}
+        return 404, {"error": f"no route {path}"}
+
+
+async def _read_head(reader: asyncio.StreamReader):
+    """
+    (method, target, version, headers, content length) of the next request, or
+    None at end of stream. ValueError for a malformed request line or
+    Content-Length, or a line longer than the reader's limit.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise ValueError(f"malformed request line {line[:80]!r}")
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+    length = headers.get("content-length") or "0"
+    if not length.isdigit():
+        raise ValueError(f"bad Content-Length {length[:80]!r}")
+    return (*parts, headers, int(length))
+
+
+async def start_server(
+    service: Service, host: str = "127.0.0.1", port: int = DEFAULT_PORT, unix: Optional[str] = None
+) -> asyncio.AbstractServer:
+    service.start()
+    if unix:
+        return await asyncio.start_unix_server(service.handle, path=unix)
+    return await asyncio.start_server(service.handle, host, port)
+
+
+async def _serve(a) -> None:
+    service = Service(
+        a.targets,
+        workers=a.workers,
+        max_batch=a.max_batch,
+        max_wait_ms=a.max_wait_ms,
+        bank_cache=a.bank_cache,
+    )
+    server = await start_server(service, a.host, a.port, a.unix)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(service.reload()))
+    watcher = asyncio.create_task(service.watch(a.watch)) if a.watch else None
+    where = a.unix or f"http://{a.host}:{server.sockets[0].getsockname()[1]}"
+    print(f"medlex serve: {where} (workers={a.workers}, max_batch={a.max_batch})", flush=True)
+    async with server:
+        await stop.wait()
+    if watcher is not None:
+        watcher.cancel()
+    await service.close()
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="medlex serve", description="medlex extraction service")
+    p.add_argument("--targets", required=True, help="YAML targets config")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--unix", default=None, metavar="PATH", help="Listen on a Unix socket instead")
+    p.add_argument(
+        "--workers", type=int, default=1, help="Worker processes (default 1: a background thread)"
+    )
+    p.add_argument("--max-batch", type=int, default=64, help="Notes per micro-batch (at most)")
+    p.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=2.0,
+        help="How long a batch waits for more requests after the first one",
+    )
+    p.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Poll the YAML and reload when it changes (reload is also on SIGHUP / POST /reload)",
+    )
+    p.add_argument("--no-bank-cache", dest="bank_cache", action="store_false")
+    return p
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    a = _build_parser().parse_args(argv)
+    if a.workers < 1 or a.max_batch < 1:
+        raise SystemExit("--workers and --max-batch must be positive integers")
+    asyncio.run(_serve(a))
@@ -0,0 +1,106 @@
+# src/medlex/stats.py
+"""
+Run instrumentation: counters and per-stage timers.
+
+Anything that takes ``stats=`` (``build_variant_bank``, ``process_text``,
+``process_batch``, ``WorkerPool.process``) accepts an object with
+``count(name, n)`` and ``add_time(name, seconds)``; ``Stats`` is the default
+implementation, subclass it (or duck-type it) to forward to a metrics system.
+With ``stats=None`` (the default) every probe is a single ``is not None``
+check, so disabled collection costs effectively nothing.
+
+Counter names used by the pipeline:
+  notes                        notes processed (by process_text / process_batch)
+  candidates.<stage>           hits proposed by exact / fuzzy / phonetic
+  matches.<stage>              hits kept (after overlap and context guards)
+  matches, matches.negated     all kept hits, and how many were negated
+  fuzzy.tokens_scored          distinct tokens sent to the fuzzy matrix call
+  cache.hit, cache.miss        result-cache lookups (``medlex.resultcache``)
+  prefilter.<tier>[.rejected]  notes reaching a prefilter tier, and how many it
+                               rejected: fuzzy.stubs, fuzzy.tokens (batches
+                               only), phonetic.cues (see ``prefilter_report``)
+  notes.degraded, notes.timeout  notes over ``process_batch``'s time budget,
+                               retried exact-only / given up on
+  segments                     segments very long notes were matched as
+                               (``medlex.segment``)
+Timer names: normalize, exact, fuzzy, fuzzy.score, phonetic, cues,
+bank.load_config, bank.compile; the CLI adds read, process, serialize, frame,
+write.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+
+class Stats:
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.timers: Dict[str, float] = defaultdict(float)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.timers[name] += seconds
+
+    def timer(self, name: str) -> "_Timer":
+        """``with stats.timer("read"): ...`` adds the block's wall time to ``name``."""
+        return _Timer(self, name)
+
+    def merge(self, other: "Stats | Dict[str, Any]") -> None:
+        """Add another run's numbers (a ``Stats`` or its ``to_dict()``), e.g. from a worker."""
+        d = other.to_dict() if isinstance(other, Stats) else other
+        for k, v in d.get("counters", {}).items():
+            self.counters[k] += v
+        for k, v in d.get("timers_s", {}).items():
+            self.timers[k] += v
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "timers_s": dict(sorted(self.timers.items())),
+        }
+
+    def prefilter_report(self) -> Dict[str, Dict[str, Any]]:
+        """tier -> {notes, rejected, rejection_rate} from the prefilter.* counters."""
+        out = {}
+        for name, n in sorted(self.counters.items()):
+            if not name.startswith("prefilter.") or name.endswith(".rejected"):
+                continue
+            rejected = self.counters.get(name + ".rejected", 0)
+            out[name[len("prefilter.") :]] = {
+                "notes": n,
+                "rejected": rejected,
+                "rejection_rate": rejected / n if n else 0.0,
+            }
+        return out
+
+    def dump(self, path: str, extra: Optional[Dict[str, Any]] = None) -> None:
+        report = {"prefilter": self.prefilter_report()}
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({**self.to_dict(), **report, **(extra or {})}, fh, indent=2)
+
+
+class _Timer:
+    __slots__ = ("stats", "name", "t0")
+
+    def __init__(self, stats, name: str):
+        self.stats, self.name = stats, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_time(self.name, time.perf_counter() - self.t0)
+
+
+def lap(stats, name: str, t0: float) -> float:
+    """Charge the time since ``t0`` to ``name``; returns now, for the next lap."""
+    t = time.perf_counter()
+    stats.add_time(name, t - t0)
+    return t
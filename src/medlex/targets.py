@@ -1,13 +1,15 @@
 from typing import Iterable
-from rapidfuzz.utils import default_process
-from metaphone import doublemetaphone
 
 
 def normalize_term(t: str) -> str:
+    from rapidfuzz.utils import default_process
+
     return default_process(t or "")
 
 
 def expand_phonetic(terms: Iterable[str]) -> set[str]:
+    from metaphone import doublemetaphone
+
     out = set()
     for t in terms:
         a, b = doublemetaphone(t)
@@ -0,0 +1,97 @@
+# src/medlex/textio.py
+"""
+Raw-text input: a flat export with one note per line, or a directory of
+``.txt`` notes (one note per file). No CSV parsing and no pandas: each file is
+memory-mapped and notes are sliced out by byte offset, a chunk at a time, so
+only the current chunk is ever decoded.
+
+  lines   note_id = 0-based line number. Blank lines are skipped (the numbering
+          keeps counting them); "\\n" and "\\r\\n" endings.
+  txtdir  note_id = position in the sorted list of ``*.txt`` files under the
+          directory (recursive); ``file`` holds the path relative to it.
+
+Each note also carries ``offset``, the byte where it starts in its file, so
+spans can be reported as file byte offsets (``BatchResult.spans_json(byte_offsets=)``)
+and found again with a seek. Text is decoded as UTF-8; invalid bytes become
+U+FFFD, and offsets are exact for valid UTF-8.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+TEXT_FORMATS = ("lines", "txtdir")
+
+
+def detect_text_format(path: Optional[str]) -> Optional[str]:
+    """'txtdir' for a directory, 'lines' for a ``.txt`` file, else None."""
+    if not path or path == "-":
+        return None
+    if os.path.isdir(path):
+        return "txtdir"
+    if path.lower().endswith(".txt"):
+        return "lines"
+    return None
+
+
+def _decode(buf) -> str:
+    return bytes(buf).decode("utf-8", errors="replace")
+
+
+def _iter_lines(path: str) -> Iterator[Tuple[int, int, str, Optional[str]]]:
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            n = len(mm)
+            pos = lineno = 0
+            while pos < n:
+                end = mm.find(b"\n", pos)
+                if end < 0:
+                    end = n
+                stop = end - 1 if end > pos and mm[end - 1] == 0x0D else end
+                if stop > pos:
+                    yield lineno, pos, _decode(mm[pos:stop]), None
+                pos = end + 1
+                lineno += 1
+
+
+def _iter_files(root: str) -> Iterator[Tuple[int, int, str, Optional[str]]]:
+    paths = sorted(
+        os.path.relpath(os.path.join(d, f), root).replace(os.sep, "/")
+        for d, _, files in os.walk(root)
+        for f in files
+        if f.lower().endswith(".txt")
+    )
+    for i, rel in enumerate(paths):
+        with open(os.path.join(root, rel), "rb") as fh:
+            if os.fstat(fh.fileno()).st_size == 0:
+                text = ""
+            else:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    text = _decode(mm)
+        yield i, 0, text, rel
+
+
+def read_text_notes(path: str, fmt: str, chunksize: int) -> Iterator[Dict[str, List]]:
+    """
+    Chunks of up to ``chunksize`` notes as column lists: note_id, text, offset
+    (and file, for ``txtdir``). Notes come in note_id order.
+    """
+    if fmt not in TEXT_FORMATS:
+        raise ValueError(f"Unknown text format: {fmt!r} (expected one of {TEXT_FORMATS})")
+    notes = _iter_lines(path) if fmt == "lines" else _iter_files(path)
+    names = (
+        ("note_id", "offset", "text", "file") if fmt == "txtdir" else ("note_id", "offset", "text")
+    )
+    cols: Dict[str, List] = {k: [] for k in names}
+    for note in notes:
+        for k, v in zip(names, note):
+            cols[k].append(v)
+        if len(cols["note_id"]) >= chunksize:
+            yield cols
+            cols = {k: [] for k in names}
+    if cols["note_id"]:
+        yield cols
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_bank_cache(tmp_path_factory, monkeypatch):
+    # keep the on-disk bank cache out of the user's home during tests
+    monkeypatch.setenv("MEDLEX_CACHE_DIR", str(tmp_path_factory.mktemp("bank-cache")))
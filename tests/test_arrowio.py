@@ -0,0 +1,68 @@
+import json
+
+import pandas as pd
+import pytest
+
+from medlex.cli import main
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq  # noqa: E402
+
+NOTES = "data/examples/notes.tsv"
+CFG = "configs/example_targets.yaml"
+
+
+def _shuffled_notes() -> pd.DataFrame:
+    df = pd.read_csv(NOTES, sep="\t")
+    return pd.concat([df] * 5, ignore_index=True).sample(frac=1, random_state=0)
+
+
+def _as_rows(table) -> list:
+    return table.to_pylist()
+
+
+def test_parquet_matches_csv(tmp_path):
+    df = _shuffled_notes()
+    df.to_csv(tmp_path / "notes.tsv", sep="\t", index=False)
+    main(str(tmp_path / "notes.tsv"), CFG, str(tmp_path / "out.csv"))
+    main(str(tmp_path / "notes.tsv"), CFG, str(tmp_path / "out.parquet"))
+
+    csv = pd.read_csv(tmp_path / "out.csv")
+    table = pq.read_table(tmp_path / "out.parquet")
+    assert table.schema.field("has_metformin").type == pa.int8()
+    assert table.column("note_id").to_pylist() == csv["note_id"].tolist()
+    for k in ("has_metformin", "has_insulin"):
+        assert table.column(k).to_pylist() == csv[k].tolist()
+    for row, spans in zip(table.column("spans").to_pylist(), csv["spans"]):
+        expected = json.loads(spans)
+        assert [(s["matched"], s["start"], s["end"]) for s in row] == [
+            (s["matched"], *s["span"]) for s in expected
+        ]
+        assert [s["is_negated"] for s in row] == [s["is_negated"] for s in expected]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_columnar_input_and_stream(tmp_path, fmt):
+    df = _shuffled_notes()
+    src = tmp_path / f"notes.{fmt}"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fmt == "parquet":
+        pq.write_table(table, src)
+    else:
+        with pa.ipc.new_file(str(src), table.schema) as w:
+            w.write_table(table)
+
+    out = f"out.{fmt}"
+    main(str(src), CFG, str(tmp_path / f"full.{fmt}"))
+    main(str(src), CFG, str(tmp_path / f"stream.{fmt}"), chunksize=4)
+    main(str(src), CFG, str(tmp_path / out), chunksize=4, sort=False)
+
+    def read(name):
+        if fmt == "parquet":
+            return pq.read_table(tmp_path / name)
+        return pa.ipc.open_file(pa.memory_map(str(tmp_path / name))).read_all()
+
+    full = read(f"full.{fmt}")
+    assert _as_rows(read(f"stream.{fmt}")) == _as_rows(full)
+    assert full.column("note_id").to_pylist() == sorted(df["note_id"])
+    assert read(out).column("note_id").to_pylist() == df["note_id"].tolist()
@@ -0,0 +1,36 @@
+import os
+import shutil
+
+from medlex.bankcache import cache_path, load_variant_bank
+from medlex.pipeline import process_text
+
+CFG = "configs/example_targets.yaml"
+TEXT = "no insuln; metphormin 500 mg; Glucophage XR"
+
+
+def test_warm_cache_gives_same_results(tmp_path):
+    cold = load_variant_bank(CFG, cache_dir=str(tmp_path))
+    assert os.path.exists(cache_path(CFG, str(tmp_path)))
+    warm = load_variant_bank(CFG, cache_dir=str(tmp_path))
+    assert warm[0].config_hash == cold[0].config_hash
+    assert process_text(TEXT, *warm) == process_text(TEXT, *cold)
+
+
+def test_yaml_change_invalidates(tmp_path):
+    cfg = tmp_path / "targets.yaml"
+    shutil.copy(CFG, cfg)
+    first = cache_path(str(cfg), str(tmp_path))
+    load_variant_bank(str(cfg), cache_dir=str(tmp_path))
+
+    cfg.write_text(cfg.read_text() + "\n# edited\n")
+    assert cache_path(str(cfg), str(tmp_path)) != first
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    path = cache_path(CFG, str(tmp_path))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(b"not a pickle")
+    ctx, bank, ph_bank, fz = load_variant_bank(CFG, cache_dir=str(tmp_path))
+    assert "METFORMIN" in bank
+    assert os.path.getsize(path) > len(b"not a pickle")  # replaced by a real entry
@@ -0,0 +1,45 @@
+import json
+
+import pandas as pd
+
+import medlex.accessor  # noqa: F401  (registers df.medlex)
+from medlex.batch import BatchResult, process_batch
+from medlex.pipeline import build_variant_bank, process_text
+
+
+def test_batch_matches_process_text():
+    ctx, bank, ph_bank, fz = build_variant_bank("configs/example_targets.yaml")
+    df = pd.read_csv("data/examples/notes.tsv", sep="\t")
+    texts = [str(t) for t in df["text"]] + ["no insuln; metformn 500 mg", "metphormin 1 tab", ""]
+    res = process_batch(texts, ctx, bank, ph_bank, fz)
+    assert len(res) == len(texts)
+    for i, (text, spans) in enumerate(zip(texts, res.spans_json())):
+        out = process_text(text, ctx, bank, ph_bank, fz)
+        for k, col in res.flags.items():
+            assert col[i] == out[k]
+        assert json.loads(spans) == json.loads(json.dumps(out["spans"]))
+
+
+def test_accessor_keys_by_index():
+    df = pd.DataFrame({"text": ["no metformin", "Lantus 10 units"]}, index=[10, 20])
+    flags, spans = df.medlex.spot("text", targets="configs/example_targets.yaml")
+    assert list(flags.index) == [10, 20]
+    assert flags.dtypes.eq("int8").all()
+    assert flags.loc[20, "has_insulin"] == 1 and flags.loc[10, "has_metformin"] == 0
+    assert set(spans["row"]) == {10, 20}
+
+
+def test_spans_are_compact_and_context_is_sliced_on_demand():
+    banks = build_variant_bank("configs/example_targets.yaml")
+    texts = ["no insulin; metformin 500 mg", "Lantus 10 units", "", "metformin tab"]
+    res = process_batch(texts, *banks)
+    sp = res.spans
+    assert sp["matched"] == [texts[r][s:e] for r, s, e in zip(sp.row, sp.start, sp.end)]
+    assert sp["context"][0] == process_text(texts[0], *banks)["spans"][0]["context"]
+
+    # split, drop the texts, stitch back with them: same result
+    parts = [process_batch(texts[:2], *banks).detach(), process_batch(texts[2:], *banks).detach()]
+    assert BatchResult.concat(parts, texts).spans == sp
+
+    _, spans_df = res.to_pandas(context=False)
+    assert "context" not in spans_df and list(spans_df["source"].astype(str)) == sp["source"]
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from medlex.batch import STATUS, process_batch
+from medlex.cli import main
+from medlex.config import PatternWarning, backtracking_risks
+from medlex.pipeline import build_variant_bank
+
+CFG = "configs/example_targets.yaml"
+GOOD = ["Started metformin 500 mg daily", "no insulin", "metfromin 1 tab", ""]
+# (a|aa)+c backtracks exponentially over a run of a's with no c after it
+BAD = "metformin 500 mg. " + "x " * 40 + "a" * 40
+
+
+def _slow_cfg(tmp_path):
+    cfg = tmp_path / "slow.yaml"
+    with open(CFG) as fh:
+        cfg.write_text(fh.read().replace('patterns: ["', 'patterns: ["(a|aa)+c", "'))
+    return str(cfg)
+
+
+def test_lint_flags_backtracking_shapes(tmp_path):
+    assert backtracking_risks(r"\b(no|not|without|denies?)\b") == []
+    assert backtracking_risks(r"(?:tab(?:let)?s?|xr|er)") == []
+    assert backtracking_risks(r"\bno\s+(?:\w+\s+){0,3}") == []
+    assert backtracking_risks(r"(\w+\s?)+$") and backtracking_risks(r"(a|aa)+c")
+    with pytest.warns(PatternWarning, match="negation"):
+        build_variant_bank(_slow_cfg(tmp_path))
+
+
+@pytest.mark.filterwarnings("ignore::medlex.config.PatternWarning")
+def test_budget_degrades_only_the_bad_note(tmp_path):
+    ctx, bank, ph_bank, fz = build_variant_bank(_slow_cfg(tmp_path))
+    expected = process_batch(GOOD, ctx, bank, ph_bank, fz).records()
+
+    res = process_batch(GOOD + [BAD], ctx, bank, ph_bank, fz, budget=0.05)
+    assert [STATUS[s] for s in res.status] == ["ok"] * 4 + ["degraded"]
+    assert res.records()[:4] == expected
+    # exact-only retry, with cues searched near the hit
+    (bad,) = res.row_hits()[4]
+    assert bad[0] == "METFORMIN" and bad[5] == "exact" and not bad[4] and bad[6] == 1
+
+    res = process_batch([BAD] + GOOD, ctx, bank, ph_bank, fz, budget=0.05, degrade=False)
+    assert [STATUS[s] for s in res.status] == ["timeout"] + ["ok"] * 4
+    assert res.row_hits()[0] == [] and res.records()[1:] == expected
+
+
+@pytest.mark.filterwarnings("ignore::medlex.config.PatternWarning")
+def test_cli_status_column(tmp_path):
+    notes = tmp_path / "notes.csv"
+    pd.DataFrame({"note_id": range(5), "text": GOOD + [BAD]}).to_csv(notes, index=False)
+    out = tmp_path / "out.csv"
+    main(str(notes), _slow_cfg(tmp_path), str(out), note_timeout=0.05, chunksize=2)
+    df = pd.read_csv(out)
+    assert list(df.columns) == ["note_id", "has_metformin", "has_insulin", "status", "spans"]
+    assert list(df["status"]) == ["ok"] * 4 + ["degraded"]
+    assert df.loc[4, "has_metformin"] == 1
@@ -0,0 +1,76 @@
+import json
+
+import pandas as pd
+import pytest
+
+import medlex.cli
+from medlex.cli import main
+
+NOTES = "data/examples/notes.tsv"
+CFG = "configs/example_targets.yaml"
+_process_batch = medlex.cli.process_batch
+
+
+def _notes(tmp_path) -> str:
+    df = pd.read_csv(NOTES, sep="\t")
+    df = pd.concat([df] * 5, ignore_index=True).sample(frac=1, random_state=0)
+    df["note_id"] = range(len(df), 0, -1)
+    path = tmp_path / "notes.tsv"
+    df.to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+class Preempted(Exception):
+    pass
+
+
+def _fail_after(monkeypatch, n):
+    """process_batch that raises on its (n+1)-th call; returns the call log."""
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(len(args[0]))
+        if len(calls) > n:
+            raise Preempted
+        return _process_batch(*args, **kwargs)
+
+    monkeypatch.setattr(medlex.cli, "process_batch", flaky)
+    return calls
+
+
+@pytest.mark.parametrize("sort", [True, False])
+def test_resume_after_crash_matches_uninterrupted_run(tmp_path, monkeypatch, sort):
+    notes = _notes(tmp_path)
+    main(notes, CFG, str(tmp_path / "expected.csv"), chunksize=4, sort=sort)
+
+    ckpt = tmp_path / "ckpt"
+    out = tmp_path / "out.csv"
+    _fail_after(monkeypatch, 5)
+    with pytest.raises(Preempted):
+        main(notes, CFG, str(out), chunksize=4, sort=sort, checkpoint_dir=str(ckpt))
+    manifest = json.loads((ckpt / "manifest.json").read_text())
+    assert [p["file"] for p in manifest["parts"]] == [f"part-{i:06d}.csv" for i in range(5)]
+
+    # a plain restart refuses to clobber the checkpoint
+    with pytest.raises(SystemExit):
+        main(notes, CFG, str(out), chunksize=4, sort=sort, checkpoint_dir=str(ckpt))
+
+    calls = _fail_after(monkeypatch, 100)
+    main(notes, CFG, str(out), chunksize=4, sort=sort, checkpoint_dir=str(ckpt), resume=True)
+    assert calls == [4, 4, 2]  # only the chunks after the last committed one
+    assert out.read_text() == (tmp_path / "expected.csv").read_text()
+
+    # a finished checkpoint is neither restarted nor merged again
+    assert json.loads((ckpt / "manifest.json").read_text())["complete"]
+    opts = {"chunksize": 4, "sort": sort, "checkpoint_dir": str(ckpt)}
+    for resume in (False, True):
+        with pytest.raises(SystemExit, match="finished run"):
+            main(notes, CFG, str(out), resume=resume, **opts)
+
+
+def test_resume_refuses_changed_settings(tmp_path):
+    notes = _notes(tmp_path)
+    ckpt = str(tmp_path / "ckpt")
+    main(notes, CFG, str(tmp_path / "out.csv"), chunksize=4, checkpoint_dir=ckpt)
+    with pytest.raises(SystemExit, match="chunksize"):
+        main(notes, CFG, str(tmp_path / "out.csv"), chunksize=5, checkpoint_dir=ckpt, resume=True)
@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+
+from medlex.cli import main
+
+NOTES = "data/examples/notes.tsv"
+CFG = "configs/example_targets.yaml"
+
+
+def _shuffled_notes(tmp_path) -> str:
+    df = pd.read_csv(NOTES, sep="\t")
+    df = pd.concat([df] * 5, ignore_index=True).sample(frac=1, random_state=0)
+    path = tmp_path / "notes.tsv"
+    df.to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+def test_stream_matches_in_memory(tmp_path):
+    notes = _shuffled_notes(tmp_path)
+    main(notes, CFG, str(tmp_path / "full.csv"))
+    main(notes, CFG, str(tmp_path / "stream.csv"), chunksize=4)
+    assert (tmp_path / "full.csv").read_text() == (tmp_path / "stream.csv").read_text()
+
+
+def test_stream_no_sort_keeps_input_order(tmp_path):
+    notes = _shuffled_notes(tmp_path)
+    main(notes, CFG, str(tmp_path / "out.csv"), chunksize=4, sort=False)
+    out = pd.read_csv(tmp_path / "out.csv")
+    assert list(out["note_id"]) == list(pd.read_csv(notes, sep="\t")["note_id"])
+
+
+def test_workers_match_serial(tmp_path):
+    notes = _shuffled_notes(tmp_path)
+    main(notes, CFG, str(tmp_path / "serial.csv"))
+    main(notes, CFG, str(tmp_path / "parallel.csv"), workers=2)
+    main(notes, CFG, str(tmp_path / "parallel_stream.csv"), chunksize=7, workers=2)
+    expected = (tmp_path / "serial.csv").read_text()
+    assert (tmp_path / "parallel.csv").read_text() == expected
+    assert (tmp_path / "parallel_stream.csv").read_text() == expected
+
+
+def test_stats_report(tmp_path):
+    notes = _shuffled_notes(tmp_path)
+    main(notes, CFG, str(tmp_path / "out.csv"), stats_path=str(tmp_path / "stats.json"))
+    main(notes, CFG, str(tmp_path / "out2.csv"), workers=2, stats_path=str(tmp_path / "w.json"))
+    stats = json.loads((tmp_path / "stats.json").read_text())
+    out = pd.read_csv(tmp_path / "out.csv")
+    spans = [s for row in out["spans"] for s in json.loads(row)]
+    c = stats["counters"]
+    assert c["notes"] == len(out)
+    assert c["matches"] == len(spans)
+    assert c["matches.negated"] == sum(s["is_negated"] for s in spans)
+    assert sum(c[f"matches.{st}"] for st in ("exact", "fuzzy", "phonetic")) == c["matches"]
+    for stage in ("read", "process", "serialize", "frame", "write", "total"):
+        assert stage in stats["timers_s"]
+    for tier in ("fuzzy.stubs", "fuzzy.tokens", "phonetic.cues"):
+        assert stats["prefilter"][tier]["notes"] > 0
+        assert 0 <= stats["prefilter"][tier]["rejection_rate"] <= 1
+    # worker counters are collected in the children and summed
+    assert json.loads((tmp_path / "w.json").read_text())["counters"]["matches"] == c["matches"]
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from medlex.batch import process_batch
+from medlex.cli import run
+from medlex.evaluate import generate_candidates, predict, sweep
+from medlex.pipeline import build_variant_bank
+
+CFG = "configs/example_targets.yaml"
+TEXTS = [
+    "Started metfromin 500 mg tab nightly",
+    "metphormin daily, insuline 10 units qhs",
+    "no metformn since March",
+    "glucofage xr 750 mg bid",
+    "lantos pen 12 units",
+    "methformin recommended, no dose yet",
+    "metphormin was recommended",
+    "insulin glargine 20 u; stopped metformin",
+    "Met with family to discuss results.",
+    "",
+]
+
+
+def _flags(res, bank):
+    return np.column_stack([np.asarray(res.flags[f"has_{c.lower()}"], dtype=bool) for c in bank])
+
+
+def test_predictions_match_pipeline(tmp_path):
+    ctx, bank, ph_bank, fz = build_variant_bank(CFG)
+    cands = generate_candidates(TEXTS, ctx, bank, ph_bank, fz, fuzzy_floor=70)
+    assert set(cands.frame["stage"]) == {0, 1, 2}
+    # the YAML's own settings reproduce the pipeline's flags
+    expected = _flags(process_batch(TEXTS, ctx, bank, ph_bank, fz), bank)
+    assert (predict(cands, fuzzy=85, phonetic=1) == expected).all()
+
+    # and so does a lower threshold, as if it were written in the YAML
+    low = tmp_path / "low.yaml"
+    with open(CFG) as fh:
+        low.write_text(fh.read().replace("fuzzy: 85", "fuzzy: 72"))
+    ctx2, bank2, ph2, fz2 = build_variant_bank(str(low))
+    expected = _flags(process_batch(TEXTS, ctx2, bank2, ph2, fz2), bank2)
+    assert (predict(cands, fuzzy=72, phonetic=1) == expected).all()
+
+    exact_only = _flags(process_batch(TEXTS, ctx, bank), bank)
+    assert (predict(cands) == exact_only).all()
+
+
+def test_sweep_and_cli(tmp_path, capsys):
+    ctx, bank, ph_bank, fz = build_variant_bank(CFG)
+    cands = generate_candidates(TEXTS, ctx, bank, ph_bank, fz, fuzzy_floor=80)
+    gold = np.zeros((len(TEXTS), 2), dtype=bool)
+    gold[[0, 1, 3, 5, 6], 0] = True
+    gold[[1, 4, 7], 1] = True
+    curves = sweep(cands, gold, fuzzy=[None, 80, 90], phonetic=[None, 1], negation=[True, False])
+    assert len(curves) == 3 * 2 * 2 * 3
+    off = curves[(curves["fuzzy"] == "off") & (curves["phonetic"] == "off")]
+    on = curves[(curves["fuzzy"] == "80") & (curves["phonetic"] == "1")]
+    # typos are only found with fuzzy/phonetic matching switched on
+    assert (on["recall"].to_numpy() >= off["recall"].to_numpy()).all()
+    assert on.query("target == 'ALL' and negation == 'on'")["recall"].item() > 0.5
+
+    notes = tmp_path / "notes.csv"
+    pd.DataFrame({"note_id": range(len(TEXTS)), "text": TEXTS}).to_csv(notes, index=False)
+    labels = tmp_path / "labels.tsv"
+    pd.DataFrame(
+        {"note_id": range(len(TEXTS)), "METFORMIN": gold[:, 0], "has_insulin": gold[:, 1]}
+    ).astype(int).to_csv(labels, sep="\t", index=False)
+    out = tmp_path / "curves.csv"
+    cand_out = tmp_path / "candidates.csv"
+    args = ["eval", "--in", str(notes), "--labels", str(labels), "--targets", CFG]
+    args += ["--out", str(out), "--fuzzy", "off", "80", "90", "--phonetic", "off", "1"]
+    args += ["--negation", "on", "off", "--candidates", str(cand_out)]
+    run(args)
+    got = pd.read_csv(out, dtype={"fuzzy": str, "phonetic": str})
+    pd.testing.assert_frame_equal(got[curves.columns[4:]], curves[curves.columns[4:]])
+    assert set(pd.read_csv(cand_out)["stage"]) == {"exact", "fuzzy", "phonetic"}
+    assert "best METFORMIN" in capsys.readouterr().err
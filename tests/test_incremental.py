@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pandas as pd
+
+from medlex import incremental
+from medlex.cli import main
+
+CFG = "configs/example_targets.yaml"
+
+
+def _write(path, df):
+    df.to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+def test_incremental_matches_full_run(tmp_path, capsys):
+    base = pd.read_csv("data/examples/notes.tsv", sep="\t")
+    state = str(tmp_path / "state")
+
+    notes = _write(tmp_path / "n1.tsv", base)
+    main(notes, CFG, str(tmp_path / "inc1.csv"), incremental_dir=state)
+    assert f"{len(base)} new, 0 changed" in capsys.readouterr().err
+
+    # next night: one note edited, one removed, one added
+    edited = base.copy()
+    edited.loc[0, "text"] = "Stopped metformin; started Lantus 10 units nightly"
+    edited = edited.drop(index=1)
+    new_id = int(base["note_id"].max()) + 1
+    edited = pd.concat([edited, pd.DataFrame({"note_id": [new_id], "text": ["insulin pen"]})])
+    notes = _write(tmp_path / "n2.tsv", edited)
+    main(notes, CFG, str(tmp_path / "inc2.csv"), incremental_dir=state, chunksize=3)
+    err = capsys.readouterr().err
+    assert f"1 new, 1 changed, {len(base) - 2} unchanged, 1 removed" in err
+
+    main(notes, CFG, str(tmp_path / "full2.csv"))
+    assert (tmp_path / "inc2.csv").read_text() == (tmp_path / "full2.csv").read_text()
+
+
+def test_incremental_config_change_reprocesses(tmp_path, capsys):
+    notes = "data/examples/notes.tsv"
+    state = str(tmp_path / "state")
+    main(notes, CFG, str(tmp_path / "a.csv"), incremental_dir=state)
+    cfg2 = tmp_path / "targets.yaml"
+    cfg2.write_text(Path(CFG).read_text() + "\n# edited\n")
+    capsys.readouterr()
+    main(notes, str(cfg2), str(tmp_path / "b.csv"), incremental_dir=state)
+    assert "config changed" in capsys.readouterr().err
+
+
+def test_incremental_results_format_change_reprocesses(tmp_path, capsys, monkeypatch):
+    notes = "data/examples/notes.tsv"
+    n = len(pd.read_csv(notes, sep="\t"))
+    state = str(tmp_path / "state")
+    main(notes, CFG, str(tmp_path / "a.csv"), incremental_dir=state)
+    # same YAML and hash, newer matching code: nothing stored is reused
+    monkeypatch.setattr(incremental, "RESULTS_FORMAT", incremental.RESULTS_FORMAT + 1)
+    capsys.readouterr()
+    main(notes, CFG, str(tmp_path / "b.csv"), incremental_dir=state)
+    err = capsys.readouterr().err
+    assert f"{n} new, 0 changed, 0 unchanged" in err and "config changed" in err
+    main(notes, CFG, str(tmp_path / "c.csv"), incremental_dir=state)
+    assert f"0 new, 0 changed, {n} unchanged" in capsys.readouterr().err
@@ -0,0 +1,158 @@
+from medlex import pipeline
+from medlex.pipeline import TermIndex, _compile_term_regex, build_variant_bank, process_text
+from medlex.preprocess import phonetic_cache_info
+from medlex.stats import Stats
+
+
+def _write_cfg(tmp_path, body: str) -> str:
+    path = tmp_path / "targets.yaml"
+    path.write_text(body, encoding="utf-8")
+    return str(path)
+
+
+def test_single_pass_matches_per_target_scan():
+    ctx, bank, ph_bank, fz = build_variant_bank("configs/example_targets.yaml")
+    text = "Glucophage XR 750 mg; no insulin. Lantus pen 10 units, metf. 500mg, ins pen"
+    single = process_text(text, ctx, bank, ph_bank, fz)
+    legacy = process_text(text, ctx, dict(bank), ph_bank, fz)
+    assert single == legacy
+
+
+def test_shared_term_flags_every_owner(tmp_path):
+    cfg = _write_cfg(
+        tmp_path,
+        """
+targets:
+  - canonical: A
+    terms: ["alpha", "shared"]
+  - canonical: B
+    terms: ["Shared", "beta"]
+""",
+    )
+    ctx, bank, ph_bank, fz = build_variant_bank(cfg)
+    out = process_text("took SHARED dose", ctx, bank, ph_bank, fz)
+    assert out["has_a"] == 1 and out["has_b"] == 1
+    assert [s["source"] for s in out["spans"]] == ["A", "B"]
+
+
+def test_overlapping_terms_of_two_targets_both_match(tmp_path, monkeypatch):
+    cfg = _write_cfg(
+        tmp_path,
+        """
+targets:
+  - canonical: INSULIN
+    terms: ["insulin"]
+  - canonical: GLARGINE
+    terms: ["insulin glargine", "glargine u100"]
+  - canonical: U100
+    terms: ["u100", "glargine u100 pen"]
+""",
+    )
+    text = "started insulin glargine u100 pen 10 units; insulin glargine u100 daily"
+    for limit in (pipeline.TERM_INDEX_MIN_TERMS, 0):
+        monkeypatch.setattr(pipeline, "TERM_INDEX_MIN_TERMS", limit)
+        ctx, bank, ph_bank, fz = build_variant_bank(cfg)
+        out = process_text(text, ctx, bank, ph_bank, fz)
+        assert out == process_text(text, ctx, dict(bank), ph_bank, fz)
+        assert out["has_insulin"] == out["has_glargine"] == out["has_u100"] == 1
+        assert [s["matched"] for s in out["spans"]] == [
+            "insulin",
+            "insulin",
+            "insulin glargine",
+            "insulin glargine",
+            "glargine u100 pen",
+            "u100",
+        ]
+
+
+def test_fuzzy_stage_uses_target_threshold(tmp_path):
+    ctx, bank, ph_bank, fz = build_variant_bank("configs/example_targets.yaml")
+    out = process_text("on insuln glargin 10 units", ctx, bank, ph_bank, fz)
+    assert out["has_insulin"] == 1
+    assert [(s["matched"], s["stage"]) for s in out["spans"]] == [
+        ("insuln", "fuzzy"),
+        ("glargin", "fuzzy"),
+    ]
+
+    # no threshold -> no fuzzy stage; short variants are never fuzzy-matched
+    cfg = _write_cfg(
+        tmp_path,
+        """
+targets:
+  - canonical: INSULIN
+    terms: ["insulin", "ins"]
+""",
+    )
+    ctx, bank, ph_bank, fz = build_variant_bank(cfg)
+    assert not fz
+    assert process_text("insuln inz", ctx, bank, ph_bank, fz)["has_insulin"] == 0
+
+
+def test_phonetic_stage_needs_context():
+    ctx, bank, ph_bank, fz = build_variant_bank("configs/example_targets.yaml")
+    before = phonetic_cache_info()
+    out = process_text("started metphormin 500 mg", ctx, bank, ph_bank, fz)
+    assert out["has_metformin"] == 1
+    assert out["spans"][0]["stage"] == "phonetic"
+    # same sound-alike with no dose/form nearby is not trusted
+    assert process_text("metphormin", ctx, bank, ph_bank, fz)["has_metformin"] == 0
+    after = phonetic_cache_info()
+    assert after["hits"] > before["hits"] and 0 < after["hit_rate"] <= 1
+
+
+def test_cues_counted_once_per_note_and_whole_words_only():
+    ctx, bank, ph_bank, fz = build_variant_bank("configs/example_targets.yaml")
+    out = process_text("metformin 500 mg tab", ctx, bank, ph_bank, fz)
+    assert out["spans"][0]["context_score"] == 2
+
+    # "stopped" straddles the negation window: its "stop" prefix alone is not a cue
+    # (padded with a word: whitespace runs collapse to one space before matching)
+    text = "metformin " + "x" * (ctx.window - 6) + " stopped"
+    assert text.index("stopped") + 4 == len("metformin") + ctx.window
+    assert process_text(text, ctx, bank, ph_bank, fz)["has_metformin"] == 1
+
+
+def test_term_index_matches_regex():
+    terms = ["met", "Metformin", "metformin xr", "insulin", "insulin glargine", "5-FU", "ΣΙΓΜΑΣ"]
+    text = "METFORMIN XR, met-formin; insulin glargine/insulin. 5-fu 5-FUs σιγμας metformin"
+    regex_spans = [m.span() for m in _compile_term_regex(terms).finditer(text)]
+    assert list(TermIndex(terms).spans(text)) == regex_spans
+    assert [text[s:e] for s, e in regex_spans][:3] == ["METFORMIN", "met", "insulin"]
+
+    # each target is scanned on its own: its hits may overlap another target's
+    groups = {"INSULIN": ["insulin"], "GLARGINE": ["insulin glargine", "glargine"], "ALL": terms}
+    index = TermIndex(groups)
+    got = sorted((index.targets[ti], s, e) for ti, s, e in index.hits(text))
+    per_target = [
+        (canon, *m.span())
+        for canon, ts in groups.items()
+        for m in _compile_term_regex(ts).finditer(text)
+    ]
+    assert got == sorted(per_target)
+    assert ("GLARGINE", 26, 42) in got and ("INSULIN", 26, 33) in got
+
+
+def test_large_lexicon_uses_term_index(monkeypatch):
+    ctx, bank, ph_bank, fz = build_variant_bank("configs/example_targets.yaml")
+    text = "Glucophage XR 750 mg; no insulin. Lantus pen 10 units, metf. 500mg, ins pen"
+    expected = process_text(text, ctx, bank, ph_bank, fz)
+    monkeypatch.setattr(pipeline, "TERM_INDEX_MIN_TERMS", 0)
+    ctx, bank, ph_bank, fz = build_variant_bank("configs/example_targets.yaml")
+    assert isinstance(bank.matcher, TermIndex)
+    assert process_text(text, ctx, bank, ph_bank, fz) == expected
+
+
+def test_prefilter_rejects_only_notes_that_cannot_match():
+    ctx, bank, ph_bank, fz = build_variant_bank("configs/example_targets.yaml")
+    texts = ["insuln glargin 10 units", "nsulin pen", "metformn 500 mg", "bp stable, follow up"]
+    texts += ["metphormin 1 tab", "metphormin", "zzz"]
+    stats = Stats()
+    with_tiers = [process_text(t, ctx, bank, ph_bank, fz, stats=stats) for t in texts]
+    assert not fz.may_match("zzz") and fz.may_match("nsulin")
+    # same results with every note scored by the fuzzy stage
+    fz.stub_re = None
+    assert [process_text(t, ctx, bank, ph_bank, fz) for t in texts] == with_tiers
+    report = stats.prefilter_report()
+    assert report["fuzzy.stubs"]["notes"] == len(texts)
+    assert report["fuzzy.stubs"]["rejected"] >= 1
+    assert report["phonetic.cues"]["rejected"] >= 3
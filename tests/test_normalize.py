@@ -0,0 +1,69 @@
+import random
+
+from medlex.batch import process_batch
+from medlex.pipeline import build_variant_bank, process_text
+from medlex.preprocess import clean_text, normalize
+
+CFG = "configs/example_targets.yaml"
+
+
+def test_normalized_text_maps_back_to_original():
+    text = "Ｍｅｔｆｏｒｍｉｎ  10㎎\n\nﬁne... Straße -- done"
+    norm = normalize(text)
+    assert norm.text == "metformin 10mg fine. strasse - done"
+    assert not norm.identity
+    for word in ("metformin", "10mg", "fine", "strasse", "done"):
+        s = norm.text.index(word)
+        lo, hi = norm.span(s, s + len(word))
+        assert normalize(text[lo:hi]).text == word
+    assert text[slice(*norm.span(0, 9))] == "Ｍｅｔｆｏｒｍｉｎ"
+    # "mg" came from a single "㎎": each of its characters maps to the whole of it
+    s = norm.text.index("mg")
+    assert text[slice(*norm.span(s, s + 1))] == "㎎"
+
+    plain = normalize("Metformin 500 mg")
+    assert plain.identity and plain.text == "metformin 500 mg"
+    assert normalize(norm) is norm
+    assert clean_text("  Glucophage\tXR ") == "glucophage xr"
+
+
+def test_normalizing_twice_changes_nothing():
+    rng = random.Random(0)
+    alphabet = list("ab Mx.-\n\t") + [
+        "  ",
+        "é",
+        "é",
+        "ﬁ",
+        "½",
+        "㎎",
+        "ß",
+        "İ",
+        "Σ",
+        "…",
+        "\xa0",
+        "Ｍ",
+    ]
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        norm = normalize(text)
+        again = normalize(norm.text)
+        assert again.text == norm.text and again.identity
+        starts = [norm.span(i, i + 1)[0] for i in range(len(norm.text))]
+        assert starts == sorted(starts) and all(0 <= s < len(text) for s in starts)
+
+
+def test_every_stage_sees_the_normalized_note():
+    ctx, bank, ph_bank, fz = build_variant_bank(CFG)
+    text = "No   insulin..\n\nFollow-up in three months with labs. Pt on ＧＬＵＣＯＰＨＡＧＥ  XR 500 MG"
+    out = process_text(text, ctx, bank, ph_bank, fz)
+    spans = {s["source"]: s for s in out["spans"]}
+    # fullwidth letters match the term, reported in original offsets; cues are caseless
+    met = spans["METFORMIN"]
+    assert met["matched"] == "ＧＬＵＣＯＰＨＡＧＥ" and text[slice(*met["span"])] == met["matched"]
+    assert met["context_score"] == 2 and not met["is_negated"]
+    assert spans["INSULIN"]["matched"] == "insulin" and spans["INSULIN"]["is_negated"]
+    assert out["has_metformin"] == 1 and out["has_insulin"] == 0
+
+    res = process_batch([text, text.upper()], ctx, bank, ph_bank, fz)
+    assert res.records()[0] == out
+    assert res.spans["start"].tolist() == res.spans["start"].tolist()[:2] * 2
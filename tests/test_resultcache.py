@@ -0,0 +1,84 @@
+import pandas as pd
+
+from medlex import pipeline
+from medlex.batch import process_batch
+from medlex.cli import main
+from medlex.pipeline import build_variant_bank, process_text
+from medlex.resultcache import ResultCache
+from medlex.stats import Stats
+
+CFG = "configs/example_targets.yaml"
+
+
+def _texts():
+    df = pd.read_csv("data/examples/notes.tsv", sep="\t")
+    return [str(t) for t in df["text"]] * 3 + ["no insuln; metformn 500 mg", "metphormin 1 tab"]
+
+
+def test_cached_batch_matches_uncached(tmp_path):
+    banks = build_variant_bank(CFG)
+    texts = _texts()
+    expected = process_batch(texts, *banks)
+    db = str(tmp_path / "results.sqlite")
+
+    with ResultCache(maxsize=4, path=db) as cache:
+        stats = Stats()
+        for _ in range(2):
+            res = process_batch(texts, *banks, stats=stats, cache=cache)
+            assert res.flags == expected.flags and res.spans == expected.spans
+        n_unique = len(set(texts))
+        assert stats.counters["cache.miss"] == n_unique
+        assert stats.counters["cache.hit"] == 2 * len(texts) - n_unique
+
+    # a new process / run reads the SQLite store
+    with ResultCache(path=db) as cache:
+        res = process_batch(texts, *banks, cache=cache)
+        assert res.spans == expected.spans
+        assert cache.misses == 0 and cache.disk_hits == len(set(texts))
+        out = process_text(texts[-1], *banks, cache=cache)
+        assert out == process_text(texts[-1], *banks)
+
+
+def test_results_format_bump_skips_stored_results(tmp_path, monkeypatch):
+    db = str(tmp_path / "results.sqlite")
+    texts = _texts()
+    with ResultCache(path=db) as cache:
+        process_batch(texts, *build_variant_bank(CFG), cache=cache)
+    monkeypatch.setattr(pipeline, "RESULTS_FORMAT", pipeline.RESULTS_FORMAT + 1)
+    banks = build_variant_bank(CFG)
+    with ResultCache(path=db) as cache:
+        process_batch(texts, *banks, cache=cache)
+        assert cache.disk_hits == 0 and cache.misses == len(set(texts))
+
+
+def test_cli_result_cache(tmp_path, capsys):
+    notes = tmp_path / "notes.tsv"
+    pd.DataFrame({"note_id": range(len(_texts())), "text": _texts()}).to_csv(
+        notes, sep="\t", index=False
+    )
+    main(str(notes), CFG, str(tmp_path / "plain.csv"))
+    db = {"maxsize": 100, "path": str(tmp_path / "r.sqlite")}
+    main(str(notes), CFG, str(tmp_path / "cached.csv"), workers=2, result_cache=db)
+    main(str(notes), CFG, str(tmp_path / "again.csv"), result_cache=db)
+    expected = (tmp_path / "plain.csv").read_text()
+    assert (tmp_path / "cached.csv").read_text() == expected
+    assert (tmp_path / "again.csv").read_text() == expected
+    assert f"{len(_texts())} hits, 0 misses" in capsys.readouterr().err
+
+
+def test_repeats_in_a_batch_are_matched_once():
+    banks = build_variant_bank(CFG)
+    texts = ["no insuln; metformn 500 mg"] * 3 + ["metphormin 1 tab"] * 2
+    stats = Stats()
+    res = process_batch(texts, *banks, stats=stats, cache=ResultCache())
+    assert res.spans == process_batch(texts, *banks).spans
+    # only the first copy is normalized and goes through the fuzzy prefilter
+    assert stats.counters["prefilter.fuzzy.stubs"] == 2
+    assert stats.counters["cache.miss"] == 2 and stats.counters["cache.hit"] == 3
+
+    # a first copy that ran out of time is not stored: its repeats are misses
+    stats = Stats()
+    res = process_batch(texts, *banks, stats=stats, cache=ResultCache(), budget=0, degrade=False)
+    assert list(res.status) == [2] * len(texts)
+    assert stats.counters["cache.miss"] == len(texts) and stats.counters["cache.hit"] == 0
+    assert stats.counters["notes.timeout"] == 2
@@ -0,0 +1,79 @@
+import random
+
+from medlex.batch import process_batch
+from medlex.parallel import WorkerPool
+from medlex.pipeline import _note_hits, build_variant_bank
+from medlex.segment import plan_segments
+
+CFG = "configs/example_targets.yaml"
+PIECES = [
+    "Started metformin 500 mg tab nightly.",
+    "Patient stopped insulin last year; no insulin since.",
+    "Glucophage XR 750 mg bid;",
+    "Met with family to discuss results.",
+    "Will initiate Lantus pen 10 units qhs.",
+    "metfromin 1 tab daily",
+    "metphormin 500 mg, insuline 10 units",
+    "denies glucophage xr",
+]
+
+
+def _long_note(rng, n):
+    return "".join(rng.choice(PIECES) + rng.choice([" ", "\n", "  ", "\t"]) for _ in range(n))
+
+
+def test_plan_tiles_the_text_at_whitespace():
+    text = _long_note(random.Random(0), 400)
+    plan = plan_segments(text, 500, 120)
+    assert plan[0][0] == 0 and plan[-1][1] == len(text)
+    for (_, hi, _, _), (lo, _, _, _) in zip(plan, plan[1:]):
+        assert hi == lo and text[lo - 1].isspace()
+    assert all(slo <= lo - 120 or slo == 0 for lo, _, slo, _ in plan)
+    assert plan_segments(text, len(text), 120) == [(0, len(text), 0, len(text))]
+
+
+def test_segmented_hits_match_unsplit():
+    ctx, bank, ph_bank, fz = build_variant_bank(CFG)
+    rng = random.Random(1)
+    for _ in range(40):
+        text = _long_note(rng, rng.randint(10, 80))
+        expected = _note_hits(text, ctx, bank, fz, ph_bank=ph_bank, segment_chars=None)
+        got = _note_hits(text, ctx, bank, fz, ph_bank=ph_bank, segment_chars=rng.randint(20, 300))
+        assert got == expected
+
+
+def test_workers_spread_long_notes():
+    ctx, bank, ph_bank, fz = build_variant_bank(CFG)
+    rng = random.Random(2)
+    texts = [_long_note(rng, 300), "no insulin", _long_note(rng, 5), _long_note(rng, 200), None]
+    expected = process_batch(texts, ctx, bank, ph_bank, fz, segment_chars=None).records()
+    with WorkerPool(CFG, 2, segment_chars=400) as pool:
+        res = pool.process(texts)
+    assert res.records() == expected and list(res.status) == [0] * 5
+
+
+def test_segments_split_the_note_budget(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from medlex import parallel
+
+    banks = build_variant_bank(CFG)
+    seen = []
+
+    def fake_batch(texts, *args, budget=None, **kw):
+        if len(texts) == 1 and texts[0]:
+            seen.append(budget)
+        return process_batch(texts, *args, **kw)
+
+    # the pool's tasks run in this process, so the budgets they get can be seen
+    monkeypatch.setattr(parallel, "_BANKS", banks)
+    monkeypatch.setattr(parallel, "_BUDGET", {"budget": 2.0, "degrade": True})
+    monkeypatch.setattr(parallel, "process_batch", fake_batch)
+    text = _long_note(random.Random(3), 200)
+    pool = WorkerPool(CFG, 1, segment_chars=400, budget=2.0)
+    pool.close()
+    pool._pool = ThreadPoolExecutor(1)
+    with pool:
+        res = pool.process([text])
+    assert res.records() == process_batch([text], *banks, segment_chars=None).records()
+    assert len(seen) > 1 and abs(sum(seen) - 2.0) < 1e-9
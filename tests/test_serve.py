@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import signal
+
+from medlex.pipeline import build_variant_bank, process_text
+from medlex.serve import Service, start_server
+
+CFG = "configs/example_targets.yaml"
+TEXTS = ["Started metformin 500 mg daily", "no insulin", "metfromin 1 tab", ""]
+
+
+async def _post(port, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload or {}).encode()
+    writer.write(
+        b"POST %s HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n"
+        % (path.encode(), len(body))
+        + body
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, data = raw.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+async def _raw(port, data):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, body = raw.partition(b"\r\n\r\n")
+    return head.split(b"\r\n"), json.loads(body)
+
+
+def test_service_batches_and_reloads(tmp_path):
+    cfg = tmp_path / "targets.yaml"
+    cfg.write_text(open(CFG).read())
+    banks = build_variant_bank(CFG)
+    expected = [json.loads(json.dumps(process_text(t, *banks))) for t in TEXTS]
+
+    async def scenario():
+        service = Service(str(cfg), max_batch=16, max_wait_ms=20)
+        server = await start_server(service, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            # concurrent single-note requests are coalesced into micro-batches
+            replies = await asyncio.gather(*(_post(port, "/extract", {"text": t}) for t in TEXTS))
+            assert [r[1]["result"] for r in replies] == expected
+            status, many = await _post(port, "/extract", {"texts": TEXTS})
+            assert status == 200 and many["results"] == expected
+            assert (await _post(port, "/extract", {"nope": 1}))[0] == 400
+            for bad in (b"GARBAGE\r\n", b"POST /extract HTTP/1.1\r\nContent-Length: abc\r\n\r\n"):
+                head, payload = await _raw(port, bad)
+                assert head[0].split()[1] == b"400" and b"Connection: close" in head
+                assert payload["error"].startswith("bad request")
+
+            metrics = service.metrics.snapshot()
+            assert metrics["notes"] == 2 * len(TEXTS)
+            assert metrics["batches"] < len(TEXTS) + 1
+
+            before = service.config_hash
+            cfg.write_text(open(CFG).read() + "\n# edited\n")
+            status, info = await _post(port, "/reload")
+            assert status == 200 and info["changed"] and service.config_hash != before
+            cfg.write_text("targets: oops")
+            status, _ = await _post(port, "/reload")
+            assert status == 500 and service.config_hash == info["config_hash"]
+            assert (await _post(port, "/extract", {"texts": TEXTS}))[1]["results"] == expected
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    asyncio.run(scenario())
+
+
+def test_workers_run_the_reloaded_bank(tmp_path):
+    cfg = tmp_path / "targets.yaml"
+    cfg.write_text(open(CFG).read())
+    expected = [json.loads(json.dumps(process_text(t, *build_variant_bank(CFG)))) for t in TEXTS]
+
+    async def scenario():
+        service = Service(str(cfg), workers=2, max_batch=16, max_wait_ms=20)
+        server = await start_server(service, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            cfg.write_text(open(CFG).read() + "\n# edited\n")
+            status, info = await _post(port, "/reload")
+            assert status == 200 and info["changed"]
+            # edited again before any batch: the workers still run the reloaded bank
+            cfg.write_text("targets: oops")
+            status, many = await _post(port, "/extract", {"texts": TEXTS})
+            assert status == 200 and many["results"] == expected
+            assert service._engine.pool.config_hash() == info["config_hash"]
+            assert service.config_hash == info["config_hash"]
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    asyncio.run(scenario())
+
+
+def test_dead_worker_is_replaced(tmp_path):
+    expected = [json.loads(json.dumps(process_text(t, *build_variant_bank(CFG)))) for t in TEXTS]
+
+    async def scenario():
+        service = Service(CFG, workers=2, max_batch=16, max_wait_ms=20)
+        server = await start_server(service, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            assert (await _post(port, "/extract", {"texts": TEXTS}))[0] == 200
+            os.kill(next(iter(service._engine.pool._pool._processes)), signal.SIGKILL)
+            for _ in range(100):  # the pool notices the death on its own thread
+                status, health = await _post(port, "/healthz")
+                if status != 200:
+                    break
+                await asyncio.sleep(0.05)
+            assert status == 503 and health["status"] == "worker pool broken"
+
+            status, many = await _post(port, "/extract", {"texts": TEXTS})
+            assert status == 200 and many["results"] == expected
+            assert (await _post(port, "/healthz"))[0] == 200
+            assert service.metrics.snapshot()["restarts"] == 1
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    asyncio.run(scenario())
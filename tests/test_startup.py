@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from medlex.cli import main
+
+CFG = "configs/example_targets.yaml"
+HEAVY = ("pandas", "numpy", "yaml", "rapidfuzz", "metaphone")
+# cumulative ``-X importtime`` of medlex.cli; generous, since without cached
+# bytecode the sources are compiled on every import (about 90 ms otherwise)
+IMPORT_BUDGET_MS = 500
+
+
+def _run(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+
+
+def _loaded(proc) -> list:
+    return proc.stdout.split()
+
+
+def test_import_is_lean_and_within_budget():
+    proc = _run(f"import sys, medlex.cli; print(*[m for m in {HEAVY!r} if m in sys.modules])")
+    assert _loaded(proc) == []
+    (line,) = [ln for ln in proc.stderr.splitlines() if ln.endswith("| medlex.cli")]
+    assert int(line.split("|")[1]) / 1000 < IMPORT_BUDGET_MS
+
+
+def test_csv_run_skips_pandas_and_writes_the_same_bytes(tmp_path):
+    notes = tmp_path / "notes.csv"
+    texts = ['Pt on "metformin" 500 mg, bid', "", "no insulin\n\nfollow up", "metfromin 1 tab"]
+    pd.DataFrame({"note_id": [3, 1, 2, 0], "text": texts, "extra": "x"}).to_csv(notes, index=False)
+    out = tmp_path / "out.csv"
+    code = (
+        "import sys; from medlex.cli import main; "
+        f"main({str(notes)!r}, {CFG!r}, {str(out)!r}, bank_cache=False); "
+        "print(*[m for m in ('pandas', 'numpy') if m in sys.modules])"
+    )
+    assert _loaded(_run(code)) == []
+    main(str(notes), CFG, str(tmp_path / "stream.csv"), chunksize=3, bank_cache=False)
+    assert out.read_text() == (tmp_path / "stream.csv").read_text()
+    assert list(pd.read_csv(out)["note_id"]) == [0, 1, 2, 3]
+
+
+def test_csv_reader_rejects_bad_input(tmp_path):
+    notes = tmp_path / "notes.csv"
+    notes.write_text("id,text\n1,metformin\n")
+    with pytest.raises(SystemExit, match="missing: note_id"):
+        main(str(notes), CFG, str(tmp_path / "out.csv"))
+    notes.write_text("note_id,text\nabc,metformin\n")
+    with pytest.raises(SystemExit, match="line 2"):
+        main(str(notes), CFG, str(tmp_path / "out.csv"))
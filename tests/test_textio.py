@@ -0,0 +1,52 @@
+import json
+
+import pandas as pd
+
+from medlex.cli import main
+from medlex.textio import read_text_notes
+
+CFG = "configs/example_targets.yaml"
+LINES = [
+    "Started metformin 500 mg daily.",
+    "",
+    "Patient prefers café; no insulin.\r",
+    "Lantus 10 units at night",
+]
+
+
+def test_lines_spans_seek_back_into_the_file(tmp_path):
+    path = tmp_path / "export.txt"
+    path.write_bytes("\n".join(LINES).encode("utf-8"))
+    out = tmp_path / "out.csv"
+    main(str(path), CFG, str(out), chunksize=2)
+
+    df = pd.read_csv(out)
+    assert list(df["note_id"]) == [0, 2, 3]  # line numbers; the blank line is skipped
+    assert list(df["has_insulin"]) == [0, 0, 1] and df.loc[0, "has_metformin"] == 1
+    raw = path.read_bytes()
+    spans = [s for row in df["spans"] for s in json.loads(row)]
+    assert len(spans) == 3
+    for s in spans:
+        start, end = s["bytes"]
+        assert raw[start:end].decode("utf-8") == s["matched"]
+
+
+def test_txtdir_reads_one_note_per_file(tmp_path):
+    root = tmp_path / "notes"
+    (root / "b").mkdir(parents=True)
+    (root / "a.txt").write_text("no metformin", encoding="utf-8")
+    (root / "b" / "c.txt").write_text("½ tab metformin 500 mg", encoding="utf-8")
+    (root / "skip.md").write_text("metformin", encoding="utf-8")
+    (root / "empty.txt").write_bytes(b"")
+
+    chunks = list(read_text_notes(str(root), "txtdir", chunksize=10))
+    assert chunks[0]["file"] == ["a.txt", "b/c.txt", "empty.txt"]
+
+    out = tmp_path / "out.csv"
+    main(str(root), CFG, str(out))
+    df = pd.read_csv(out, keep_default_na=False)
+    assert list(df["file"]) == ["a.txt", "b/c.txt", "empty.txt"]
+    assert list(df["has_metformin"]) == [0, 1, 0]
+    (span,) = json.loads(df.loc[1, "spans"])
+    raw = (root / "b" / "c.txt").read_bytes()
+    assert raw[span["bytes"][0] : span["bytes"][1]] == b"metformin"